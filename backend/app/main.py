@@ -1,15 +1,72 @@
 import os
 print("GEMINI_API_KEY loaded:", "GEMINI_API_KEY" in os.environ)
 
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from app.middleware import RequestSizeLimitMiddleware
 from app.routes.generate import router as generate_router
-from app.routes.upload import router as upload_router
+from app.routes.upload import router as upload_router, MAX_REQUEST_SIZE, MAX_BATCH_REQUEST_SIZE
 from app.routes.download import router as download_router
+from app.routes.jobs import router as jobs_router
+from app.routes.metrics import router as metrics_router
+from app.services.aws_clients import close_clients
+from app.services.dynamodb_service import ensure_tables, warm_dynamodb_connections
+from app.services.executors import dynamodb_executor, pdf_executor, s3_executor, run_in_executor, shutdown_executors
+from app.services.gemini_service import warm_up_gemini
+from app.services.pdf_service import shutdown_process_pool, warm_process_pool
+from app.services.s3_service import test_s3_connection, warm_s3_connections
+from app.services.token_accounting import flush_token_usage
 
-app = FastAPI(title="TestCaseAI")
+# Pre-open AWS/Gemini connections and start the PDF workers before serving
+STARTUP_WARMUP_ENABLED = os.getenv("STARTUP_WARMUP_ENABLED", "true").lower() == "true"
 
-# Enable CORS
+
+async def _warm_up() -> None:
+    results = await asyncio.gather(
+        run_in_executor(dynamodb_executor, warm_dynamodb_connections),
+        run_in_executor(s3_executor, warm_s3_connections),
+        run_in_executor(pdf_executor, warm_process_pool),
+        warm_up_gemini(),
+        return_exceptions=True
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"Warning: Startup warm-up failed: {str(result)}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Tables and bucket are checked once here instead of on every request
+    await asyncio.gather(
+        run_in_executor(dynamodb_executor, ensure_tables),
+        run_in_executor(s3_executor, test_s3_connection)
+    )
+    if STARTUP_WARMUP_ENABLED:
+        await _warm_up()
+    
+    yield
+    
+    # Drain background writes before the executors and clients they use go away
+    await flush_token_usage()
+    shutdown_process_pool()
+    shutdown_executors()
+    close_clients()
+
+
+app = FastAPI(title="TestCaseAI", lifespan=lifespan)
+
+# Reject oversized uploads while they stream in
+app.add_middleware(
+    RequestSizeLimitMiddleware,
+    limits={
+        "/upload-pdf": MAX_REQUEST_SIZE,
+        "/upload-pdfs/batch": MAX_BATCH_REQUEST_SIZE,
+    },
+)
+
+# Enable CORS (added last so it also wraps early rejections)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Allow all origins for development
@@ -21,6 +78,8 @@ app.add_middleware(
 app.include_router(generate_router)
 app.include_router(upload_router)
 app.include_router(download_router)
+app.include_router(jobs_router)
+app.include_router(metrics_router)
 
 @app.get("/")
 def root():
@@ -0,0 +1,88 @@
+import json
+
+
+class RequestTooLarge(Exception):
+    pass
+
+
+class RequestSizeLimitMiddleware:
+    """
+    Reject request bodies that exceed a per-path size limit while they stream in.
+
+    Requests announcing a larger Content-Length are answered with 413 before the
+    body is read. Otherwise received bytes are counted and reading stops with a
+    413 as soon as the limit is passed, so oversized uploads are never fully
+    buffered or parsed.
+    """
+
+    def __init__(self, app, limits: dict):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT"):
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.limits.get(scope["path"])
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            await self._send_too_large(send, limit)
+            return
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    exceeded = True
+                    raise RequestTooLarge()
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            # Whatever the app answers after the limit tripped, the client gets a 413
+            if exceeded:
+                if not response_started:
+                    response_started = True
+                    await self._send_too_large(send, limit)
+                return
+            response_started = response_started or message["type"] == "http.response.start"
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except RequestTooLarge:
+            pass
+        except Exception:
+            if not exceeded:
+                raise
+
+        if exceeded and not response_started:
+            await self._send_too_large(send, limit)
+
+    @staticmethod
+    async def _send_too_large(send, limit: int):
+        body = json.dumps({
+            "detail": f"Request body exceeds the maximum limit of {limit // (1024 * 1024)}MB"
+        }).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
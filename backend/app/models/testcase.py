@@ -0,0 +1,233 @@
+import re
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field, field_validator, model_validator
+
+PRIORITIES = ("P0-Critical", "P1-High", "P2-Medium", "P3-Low")
+
+# Requested analysis depth; see gemini_service.route_model
+GENERATION_DEPTHS = ("quick", "standard", "thorough")
+GenerationDepth = Literal[GENERATION_DEPTHS]
+
+TESTCASE_ID_PATTERN = r"^TC-\d{3,}$"
+
+# Most test cases one partial regeneration may add
+MAX_ADDED_TESTCASES = 10
+
+_HEADING_PATTERN = re.compile(r"(?m)^### (TC-\d+):?\s*(.*)$")
+_LABEL_PATTERN = re.compile(r"^\*\*(.+?)\*\*:\s*(.*)$")
+_LIST_ITEM_PATTERN = re.compile(r"^\s*(?:[-*]|\d+\.)\s+(?:✓\s*)?(.*)$")
+
+# Markdown section labels (as written by the model or by to_markdown) -> field
+_TESTCASE_LISTS = {
+    "input conditions": "inputs",
+    "expected decision/action": "expected_action",
+    "expected system behavior": "expected_action",
+    "validation points": "validation_points",
+    "edge cases to test": "validation_points",
+}
+_SUITE_LISTS = {
+    "key decision points from guideline": "key_decision_points",
+    "test data requirements": "test_data_requirements",
+    "compliance checks": "compliance_checks",
+}
+
+
+class TestCase(BaseModel):
+    """
+    One CDSS test case.
+    """
+    id: str = Field(..., pattern=TESTCASE_ID_PATTERN, description="Test case ID, e.g. TC-001")
+    title: str
+    priority: Literal[PRIORITIES] = "P2-Medium"
+    type: str = Field(..., description="e.g. Decision Path Validation, Threshold Validation")
+    scenario: str
+    inputs: List[str] = Field(default_factory=list, description="Input conditions (patient data, vitals, ...)")
+    expected_action: List[str] = Field(default_factory=list, description="Expected decision, alert or action")
+    validation_points: List[str] = Field(default_factory=list)
+
+    def to_markdown(self) -> str:
+        lines = [
+            f"### {self.id}: {self.title}",
+            f"**Priority**: {self.priority}",
+            f"**Type**: {self.type}",
+            "",
+            f"**Scenario**: {self.scenario}",
+        ]
+        for label, items, bullet in (("Input Conditions", self.inputs, "- "),
+                                     ("Expected Decision/Action", self.expected_action, "- "),
+                                     ("Validation Points", self.validation_points, "- ✓ ")):
+            if items:
+                lines += ["", f"**{label}**:"] + [f"{bullet}{item}" for item in items]
+        return "\n".join(lines)
+
+
+class TestSuite(BaseModel):
+    """
+    Generated test suite for one clinical guideline.
+
+    Stored as-is alongside the rendered markdown (see to_markdown), so
+    consumers can read individual test cases without parsing text.
+    """
+    title: str
+    guideline_type: str = ""
+    criticality: str = "Critical"
+    focus: str = "CDSS Decision Logic Validation"
+    test_cases: List[TestCase] = Field(default_factory=list)
+    key_decision_points: List[str] = Field(default_factory=list)
+    test_data_requirements: List[str] = Field(default_factory=list)
+    compliance_checks: List[str] = Field(default_factory=list)
+
+    def to_markdown(self) -> str:
+        """
+        Render the suite in the markdown layout of the generation prompt.
+        """
+        sections = [
+            f"# Test Suite: {self.title}\n\n"
+            f"## Overview\n"
+            f"**Guideline Type**: {self.guideline_type}\n"
+            f"**Criticality**: {self.criticality}\n"
+            f"**Focus**: {self.focus}",
+            "## Test Cases\n\n" + "\n\n---\n\n".join(test_case.to_markdown() for test_case in self.test_cases),
+        ]
+
+        notes = []
+        if self.key_decision_points:
+            notes.append("**Key Decision Points from Guideline**:\n" + "\n".join(
+                f"{number}. {item}" for number, item in enumerate(self.key_decision_points, start=1)))
+        if self.test_data_requirements:
+            notes.append("**Test Data Requirements**:\n" + "\n".join(f"- {item}" for item in self.test_data_requirements))
+        if self.compliance_checks:
+            notes.append("**Compliance Checks**:\n" + "\n".join(f"- {item}" for item in self.compliance_checks))
+        if notes:
+            sections.append("## Implementation Notes\n\n" + "\n\n".join(notes))
+
+        return "\n\n---\n\n".join(sections) + "\n"
+
+    @classmethod
+    def from_markdown(cls, text: str) -> "TestSuite":
+        """
+        Best-effort parse of markdown test cases (files generated before
+        structured output, or with it disabled).
+
+        Args:
+            text: Markdown in the generation prompt's layout
+
+        Returns:
+            TestSuite; sections that cannot be recognised are skipped
+        """
+        headings = list(_HEADING_PATTERN.finditer(text or ""))
+        header = text[:headings[0].start()] if headings else (text or "")
+        title = re.search(r"(?m)^# Test Suite:\s*(.*)$", header)
+        suite = {"title": title.group(1).strip() if title else "Test Suite"}
+
+        test_cases = []
+        for index, heading in enumerate(headings):
+            end = headings[index + 1].start() if index + 1 < len(headings) else len(text)
+            block = text[heading.end():end]
+            notes = re.search(r"(?m)^## ", block)
+            if notes:
+                # The last test case runs into the suite's closing sections
+                _parse_sections(block[notes.start():], suite, _SUITE_LISTS)
+                block = block[:notes.start()]
+
+            fields = {"id": f"TC-{int(heading.group(1)[3:]):03d}", "title": heading.group(2).strip()}
+            _parse_sections(block, fields, _TESTCASE_LISTS)
+            fields["priority"] = _normalize_priority(fields.get("priority", ""))
+            fields.setdefault("type", "Functional Test")
+            fields.setdefault("scenario", "")
+            test_cases.append(TestCase(**fields))
+
+        _parse_sections(header, suite, {})
+        return cls(test_cases=test_cases, **suite)
+
+    def next_testcase_ids(self, count: int) -> List[str]:
+        """
+        IDs for count new test cases, numbered after the highest existing one.
+        """
+        start = max((int(test_case.id[3:]) for test_case in self.test_cases), default=0) + 1
+        return [f"TC-{number:03d}" for number in range(start, start + count)]
+
+    def revise(self, replacements: List[TestCase], additions: List[TestCase]) -> "TestSuite":
+        """
+        Copy of the suite with test cases replaced (matched by ID, keeping
+        their position) and new test cases appended.
+        """
+        by_id = {test_case.id: test_case for test_case in replacements}
+        test_cases = [by_id.get(test_case.id, test_case) for test_case in self.test_cases]
+        return self.model_copy(update={"test_cases": test_cases + list(additions)})
+
+
+def _parse_sections(block: str, fields: dict, list_fields: dict) -> None:
+    """
+    Collect '**Label**: value' lines and the bullet lists under '**Label**:'
+    headers into fields.
+    """
+    scalar_fields = {"priority", "type", "scenario", "guideline type", "criticality", "focus"}
+    current = None
+    for line in block.splitlines():
+        label = _LABEL_PATTERN.match(line.strip())
+        if label:
+            name = label.group(1).strip().lower()
+            value = label.group(2).strip()
+            current = list_fields.get(name)
+            if value and name in scalar_fields:
+                fields.setdefault(name.replace(" ", "_"), value)
+            continue
+        item = _LIST_ITEM_PATTERN.match(line)
+        if item and current and item.group(1).strip():
+            fields.setdefault(current, []).append(item.group(1).strip())
+        elif not item and line.strip():
+            # Any other text (or a --- rule) ends the list
+            current = None
+
+
+def _normalize_priority(priority: str) -> str:
+    level = re.search(r"P([0-3])", priority.upper())
+    return PRIORITIES[int(level.group(1))] if level else "P2-Medium"
+
+
+class RegenerateRequest(BaseModel):
+    """
+    Generation overrides for POST /file/{file_id}/regenerate.
+
+    Fields left unset use the service defaults.
+    """
+    model: Optional[str] = Field(None, min_length=1, description="Gemini model name (skips model routing)")
+    depth: GenerationDepth = Field("standard", description="Analysis depth used to route the model")
+    temperature: Optional[float] = Field(None, ge=0.0, le=2.0, description="Sampling temperature")
+    max_output_tokens: Optional[int] = Field(None, ge=1, le=65536, description="Output token limit")
+    bypass_cache: bool = Field(False, description="Call Gemini even if an identical request is cached")
+
+
+class PartialRegenerateRequest(BaseModel):
+    """
+    Test cases to rewrite or add for POST /file/{file_id}/testcases/regenerate.
+
+    Only the named test cases are generated; the rest of the suite is kept.
+    """
+    replace: List[str] = Field(default_factory=list, description="IDs of test cases to rewrite, e.g. ['TC-004']")
+    add: int = Field(0, ge=0, le=MAX_ADDED_TESTCASES, description="Number of new test cases to add")
+    instructions: Optional[str] = Field(None, max_length=2000,
+                                        description="Reviewer guidance, e.g. 'pediatric edge cases'")
+    model: Optional[str] = Field(None, min_length=1, description="Gemini model name (skips model routing)")
+    depth: GenerationDepth = Field("standard", description="Analysis depth used to route the model")
+    temperature: Optional[float] = Field(None, ge=0.0, le=2.0, description="Sampling temperature")
+    bypass_cache: bool = Field(False, description="Call Gemini even if an identical request is cached")
+
+    @field_validator("replace")
+    @classmethod
+    def normalize_ids(cls, ids: List[str]) -> List[str]:
+        normalized = []
+        for testcase_id in ids:
+            match = re.fullmatch(r"TC-?(\d+)", testcase_id.strip().upper())
+            if not match:
+                raise ValueError(f"invalid test case ID: {testcase_id}")
+            if f"TC-{int(match.group(1)):03d}" not in normalized:
+                normalized.append(f"TC-{int(match.group(1)):03d}")
+        return normalized
+
+    @model_validator(mode="after")
+    def require_changes(self) -> "PartialRegenerateRequest":
+        if not self.replace and not self.add:
+            raise ValueError("name test cases to replace or a number of test cases to add")
+        return self
@@ -1,7 +1,14 @@
-from fastapi import APIRouter, HTTPException
+import base64
+import binascii
+import json
+from datetime import date
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
 from fastapi.responses import Response, JSONResponse
-from app.services.s3_service import get_file_from_s3, list_files_from_s3, delete_file_from_s3
-from app.services.dynamodb_service import get_metadata, list_all_files, delete_metadata
+from app.models.testcase import TestSuite
+from app.services.s3_service import get_file_from_s3_async, delete_file_from_s3_async
+from app.services.dynamodb_service import get_metadata_async, list_all_files_async, delete_metadata_async
+from app.services.cache_service import invalidate_cached_result
 
 router = APIRouter()
 
@@ -19,7 +26,7 @@ async def download_testcases_json(file_id: str):
     """
     try:
         # Get metadata to find S3 key
-        metadata_result = get_metadata(file_id)
+        metadata_result = await get_metadata_async(file_id)
         
         if not metadata_result["success"]:
             raise HTTPException(status_code=404, detail="File not found")
@@ -33,7 +40,7 @@ async def download_testcases_json(file_id: str):
         s3_key = testcases_url.replace(f"s3://{metadata_result['metadata'].get('filename', '')}/", "").split('/', 1)[1]
         
         # Download from S3
-        file_result = get_file_from_s3(s3_key)
+        file_result = await get_file_from_s3_async(s3_key)
         
         if not file_result["success"]:
             raise HTTPException(status_code=500, detail=file_result.get("error"))
@@ -63,7 +70,7 @@ async def download_testcases_markdown(file_id: str):
     """
     try:
         # Get metadata
-        metadata_result = get_metadata(file_id)
+        metadata_result = await get_metadata_async(file_id)
         
         if not metadata_result["success"]:
             raise HTTPException(status_code=404, detail="File not found")
@@ -77,7 +84,7 @@ async def download_testcases_markdown(file_id: str):
         s3_key = testcases_url.split('/', 3)[3]  # Get everything after bucket name
         
         # Download from S3
-        file_result = get_file_from_s3(s3_key)
+        file_result = await get_file_from_s3_async(s3_key)
         
         if not file_result["success"]:
             raise HTTPException(status_code=500, detail=file_result.get("error"))
@@ -107,7 +114,7 @@ async def download_original_pdf(file_id: str):
     """
     try:
         # Get metadata
-        metadata_result = get_metadata(file_id)
+        metadata_result = await get_metadata_async(file_id)
         
         if not metadata_result["success"]:
             raise HTTPException(status_code=404, detail="File not found")
@@ -122,7 +129,7 @@ async def download_original_pdf(file_id: str):
         s3_key = pdf_url.split('/', 3)[3]
         
         # Download from S3
-        file_result = get_file_from_s3(s3_key)
+        file_result = await get_file_from_s3_async(s3_key)
         
         if not file_result["success"]:
             raise HTTPException(status_code=500, detail=file_result.get("error"))
@@ -139,34 +146,73 @@ async def download_original_pdf(file_id: str):
         raise HTTPException(status_code=500, detail=f"Download failed: {str(e)}")
 
 
+def _encode_cursor(last_key: Optional[dict]) -> Optional[str]:
+    if not last_key:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(last_key, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> dict:
+    try:
+        last_key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(last_key, dict) or "file_id" not in last_key:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return last_key
+
+
 @router.get("/history")
-async def get_upload_history(limit: int = 50):
+async def get_upload_history(
+    limit: int = 50,
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    status: Optional[str] = Query(None, description="e.g. success or partial_success"),
+    created_from: Optional[date] = Query(None, description="Earliest upload date (inclusive)"),
+    created_to: Optional[date] = Query(None, description="Latest upload date (inclusive)"),
+    filename_prefix: Optional[str] = Query(None, min_length=1, description="Case-sensitive filename prefix")
+):
     """
-    Get history of all uploaded files.
+    Get uploaded files, newest first, one page at a time.
     
     Args:
         limit: Maximum number of items to return (default: 50, max: 100)
+        cursor: Opaque cursor returned as next_cursor by the previous page
+        status: Only files with this status
+        created_from: Only files uploaded on or after this date
+        created_to: Only files uploaded on or before this date
+        filename_prefix: Only files whose name starts with this
         
     Returns:
-        List of uploaded files with metadata
+        One page of uploaded files with summary metadata, and next_cursor
+        (None on the last page)
     """
+    start_key = _decode_cursor(cursor) if cursor else None
     try:
         if limit > 100:
             limit = 100
         
-        result = list_all_files(limit)
+        result = await list_all_files_async(
+            max(limit, 1),
+            start_key,
+            status=status,
+            created_from=created_from.isoformat() if created_from else None,
+            created_to=created_to.isoformat() if created_to else None,
+            filename_prefix=filename_prefix
+        )
         
         if not result["success"]:
             # If table doesn't exist or other error, return empty list
             print(f"History error: {result.get('error')}")
             return {
                 "count": 0,
-                "files": []
+                "files": [],
+                "next_cursor": None
             }
         
         return {
             "count": result["count"],
-            "files": result["files"]
+            "files": result["files"],
+            "next_cursor": _encode_cursor(result["last_key"])
         }
         
     except Exception as e:
@@ -174,7 +220,8 @@ async def get_upload_history(limit: int = 50):
         # Return empty list instead of error for better UX
         return {
             "count": 0,
-            "files": []
+            "files": [],
+            "next_cursor": None
         }
 
 
@@ -187,10 +234,10 @@ async def get_file_info(file_id: str):
         file_id: Unique file identifier
         
     Returns:
-        File metadata and S3 locations
+        File metadata, S3 locations and the generated test cases
     """
     try:
-        result = get_metadata(file_id)
+        result = await get_metadata_async(file_id, include_test_cases=True)
         
         if not result["success"]:
             raise HTTPException(status_code=404, detail="File not found")
@@ -213,6 +260,81 @@ async def get_file_info(file_id: str):
         raise HTTPException(status_code=500, detail=f"Failed to retrieve file info: {str(e)}")
 
 
+async def _load_test_suite(file_id: str) -> TestSuite:
+    """
+    Get a file's test suite records, parsing the markdown of files generated
+    without structured output.
+    """
+    metadata_result = await get_metadata_async(file_id, include_test_cases=True)
+    if not metadata_result["success"]:
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    metadata = metadata_result["metadata"]
+    if metadata.get("test_suite"):
+        return TestSuite(**metadata["test_suite"])
+    if metadata.get("test_cases"):
+        return TestSuite.from_markdown(metadata["test_cases"])
+    raise HTTPException(status_code=404, detail="Test cases not found for this file")
+
+
+@router.get("/file/{file_id}/testcases")
+async def list_file_testcases(
+    file_id: str,
+    priority: Optional[str] = Query(None, description="e.g. P0 or P0-Critical"),
+    type: Optional[str] = Query(None, description="Case-insensitive substring of the test case type"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """
+    List a file's test cases as records, with optional filters and paging.
+    
+    Args:
+        file_id: Unique file identifier
+        priority: Only test cases with this priority (prefix match)
+        type: Only test cases whose type contains this text
+        offset: Number of matching test cases to skip
+        limit: Maximum test cases to return
+        
+    Returns:
+        Suite overview, total matching count and one page of test cases
+    """
+    suite = await _load_test_suite(file_id)
+    
+    test_cases = suite.test_cases
+    if priority:
+        test_cases = [tc for tc in test_cases if tc.priority.lower().startswith(priority.lower())]
+    if type:
+        test_cases = [tc for tc in test_cases if type.lower() in tc.type.lower()]
+    
+    return {
+        "file_id": file_id,
+        "suite": suite.model_dump(exclude={"test_cases"}),
+        "total": len(test_cases),
+        "offset": offset,
+        "limit": limit,
+        "test_cases": [tc.model_dump() for tc in test_cases[offset:offset + limit]]
+    }
+
+
+@router.get("/file/{file_id}/testcases/{testcase_id}")
+async def get_file_testcase(file_id: str, testcase_id: str):
+    """
+    Get a single test case record by ID (e.g. TC-003).
+    
+    Args:
+        file_id: Unique file identifier
+        testcase_id: Test case ID
+        
+    Returns:
+        Test case record
+    """
+    suite = await _load_test_suite(file_id)
+    for test_case in suite.test_cases:
+        if test_case.id.lower() == testcase_id.lower():
+            return test_case.model_dump()
+    raise HTTPException(status_code=404, detail=f"Test case {testcase_id} not found")
+
+
 @router.delete("/file/{file_id}")
 async def delete_file(file_id: str):
     """
@@ -226,7 +348,7 @@ async def delete_file(file_id: str):
     """
     try:
         # Get metadata first to find S3 keys
-        metadata_result = get_metadata(file_id)
+        metadata_result = await get_metadata_async(file_id)
         
         if not metadata_result["success"]:
             raise HTTPException(status_code=404, detail="File not found")
@@ -248,14 +370,26 @@ async def delete_file(file_id: str):
         if metadata.get("testcases_md_url"):
             s3_keys_to_delete.append(metadata["testcases_md_url"].split('/', 3)[3])
         
+        # Extracted text and earlier regenerated versions
+        if metadata.get("extracted_text_url"):
+            s3_keys_to_delete.append(metadata["extracted_text_url"].split('/', 3)[3])
+        for previous in metadata.get("result_versions", []):
+            for url in (previous.get("testcases_json_url"), previous.get("testcases_md_url")):
+                if url:
+                    s3_keys_to_delete.append(url.split('/', 3)[3])
+        
         # Delete each S3 object
         for s3_key in s3_keys_to_delete:
-            delete_result = delete_file_from_s3(s3_key)
+            delete_result = await delete_file_from_s3_async(s3_key)
             if not delete_result["success"]:
                 print(f"Warning: Failed to delete S3 key {s3_key}: {delete_result.get('error')}")
         
+        # Identical re-uploads must not resolve to the deleted file
+        if metadata.get("cache_key"):
+            await invalidate_cached_result(metadata["cache_key"])
+        
         # Delete from DynamoDB
-        delete_db_result = delete_metadata(file_id)
+        delete_db_result = await delete_metadata_async(file_id)
         
         if not delete_db_result["success"]:
             raise HTTPException(status_code=500, detail=delete_db_result.get("error"))
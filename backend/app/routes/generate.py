@@ -1,10 +1,296 @@
-from fastapi import APIRouter
-from app.services.gemini_service import generate_testcases_with_retry
+import asyncio
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional
+from fastapi import APIRouter, HTTPException
+from app.models.testcase import RegenerateRequest, PartialRegenerateRequest, TestCase, TestSuite
+from app.services.gemini_service import (
+    generate_testcases_with_retry,
+    generate_healthcare_testcases_chunked,
+    regenerate_testcases_async,
+    DEFAULT_TEMPERATURE,
+    DEFAULT_MAX_OUTPUT_TOKENS,
+)
+from app.services.s3_service import (
+    get_extracted_text_from_s3_async,
+    get_file_from_s3_async,
+    upload_testcases_to_s3_async,
+)
+from app.services.dynamodb_service import get_metadata_async, update_metadata_async
+from app.services.cache_service import invalidate_cached_result
+from app.services.token_accounting import usage_attributes
 
 router = APIRouter()
 
 @router.post("/generate-testcases")
-def generate_testcases():
-    return generate_testcases_with_retry(
-        "Generate test cases for login using email and password"
+async def generate_testcases(bypass_cache: bool = False):
+    return await generate_testcases_with_retry(
+        "Generate test cases for login using email and password",
+        use_cache=not bypass_cache
     )
+
+
+@router.post("/file/{file_id}/regenerate")
+async def regenerate_testcases(file_id: str, request: Optional[RegenerateRequest] = None):
+    """
+    Generate a new version of a file's test cases from its stored extracted text.
+
+    The PDF is never downloaded or re-parsed: the gzip text artifact written at
+    upload time is sent to Gemini with the requested overrides, and the result
+    is stored as a new versioned JSON/Markdown pair. Earlier versions are kept
+    and listed in the file's result_versions.
+
+    Args:
+        file_id: Unique file identifier
+        request: Optional depth, model, temperature and max_output_tokens overrides
+
+    Returns:
+        New version number, S3 locations and generated test cases
+    """
+    request = request or RegenerateRequest()
+
+    metadata_result = await get_metadata_async(file_id)
+    if not metadata_result["success"]:
+        raise HTTPException(status_code=404, detail="File not found")
+    metadata = metadata_result["metadata"]
+
+    extracted_text_url = metadata.get("extracted_text_url")
+    if not extracted_text_url:
+        raise HTTPException(
+            status_code=409,
+            detail="No stored extracted text for this file. Re-upload the PDF to regenerate test cases."
+        )
+
+    text_result = await get_extracted_text_from_s3_async(extracted_text_url.split('/', 3)[3])
+    if not text_result["success"]:
+        raise HTTPException(status_code=500, detail=text_result.get("error"))
+
+    test_cases_result = await generate_healthcare_testcases_chunked(
+        text_result["text"],
+        model=request.model,
+        temperature=request.temperature,
+        max_output_tokens=request.max_output_tokens,
+        use_cache=not request.bypass_cache,
+        depth=request.depth
+    )
+    if "error" in test_cases_result:
+        raise HTTPException(status_code=502, detail=test_cases_result["error"])
+
+    version = int(metadata.get("result_version", 1)) + 1
+    filename = metadata.get("filename", "document.pdf")
+    json_result, md_result = await asyncio.gather(
+        upload_testcases_to_s3_async(test_cases_result, filename, file_id, format_type="json", version=version),
+        upload_testcases_to_s3_async(test_cases_result, filename, file_id, format_type="markdown", version=version)
+    )
+    for upload_result in (json_result, md_result):
+        if not upload_result["success"]:
+            raise HTTPException(status_code=500, detail=upload_result.get("error"))
+
+    generation_config = {
+        "temperature": Decimal(str(DEFAULT_TEMPERATURE if request.temperature is None else request.temperature)),
+        "max_output_tokens": test_cases_result.get("max_output_tokens") or request.max_output_tokens
+                             or DEFAULT_MAX_OUTPUT_TOKENS,
+        "depth": request.depth
+    }
+
+    # Keep the previous version's artifacts reachable (and deletable)
+    result_versions = list(metadata.get("result_versions", []))
+    if metadata.get("testcases_json_url") or metadata.get("testcases_md_url"):
+        result_versions.append({
+            "version": int(metadata.get("result_version", 1)),
+            "model_used": metadata.get("model_used"),
+            "model_tier": metadata.get("model_tier"),
+            "testcases_json_url": metadata.get("testcases_json_url"),
+            "testcases_md_url": metadata.get("testcases_md_url")
+        })
+
+    update_result = await update_metadata_async(file_id, {
+        "testcases_json_url": json_result["s3_url"],
+        "testcases_md_url": md_result["s3_url"],
+        "result_version": version,
+        "result_versions": result_versions,
+        "test_cases": test_cases_result.get("text", ""),
+        # None clears records left by an earlier structured version
+        "test_suite": test_cases_result.get("test_suite"),
+        "model_used": test_cases_result.get("model"),
+        "model_tier": test_cases_result.get("tier"),
+        "fallback_from": test_cases_result.get("fallback_from"),
+        "token_usage": test_cases_result.get("usage", {}),
+        **usage_attributes(test_cases_result.get("usage")),
+        "generation_config": generation_config,
+        # Partial regenerations of the previous version's test cases must not apply
+        "testcase_revision": int(metadata.get("testcase_revision", 0)) + 1,
+        "regenerated_at": datetime.now().isoformat()
+    })
+    if not update_result["success"]:
+        raise HTTPException(status_code=500, detail=update_result.get("error"))
+    
+    # Identical re-uploads must not be served the previous version's result
+    if metadata.get("cache_key"):
+        await invalidate_cached_result(metadata["cache_key"])
+
+    return {
+        "file_id": file_id,
+        "filename": filename,
+        "version": version,
+        "model_used": test_cases_result.get("model"),
+        "model_tier": test_cases_result.get("tier"),
+        "generation_config": generation_config,
+        "s3_locations": {
+            "testcases_json_url": json_result["s3_url"],
+            "testcases_md_url": md_result["s3_url"]
+        },
+        "test_cases": test_cases_result,
+        "status": "success"
+    }
+
+
+@router.post("/file/{file_id}/testcases/regenerate")
+async def regenerate_selected_testcases(file_id: str, request: PartialRegenerateRequest):
+    """
+    Rewrite or add individual test cases, keeping the rest of the suite.
+    
+    Only the guideline sections relevant to the affected test cases are sent
+    to Gemini (see gemini_service.regenerate_testcases_async). Rewritten test
+    cases keep their IDs and positions, added ones are numbered after the last
+    test case, and the current version's JSON/Markdown artifacts and metadata
+    are updated in place; the change is listed in the file's testcase_revisions.
+    
+    The metadata update is conditional on the file's testcase_revision counter,
+    so when two requests revise the same suite concurrently the later one gets
+    a 409 instead of overwriting the other's changes.
+    
+    Args:
+        file_id: Unique file identifier
+        request: Test case IDs to replace, number to add, reviewer instructions
+            and generation overrides
+        
+    Returns:
+        Replaced and added test case records and the S3 locations
+    """
+    metadata_result = await get_metadata_async(file_id, include_test_cases=True)
+    if not metadata_result["success"]:
+        raise HTTPException(status_code=404, detail="File not found")
+    metadata = metadata_result["metadata"]
+    revision_number = int(metadata.get("testcase_revision", 0))
+    
+    if metadata.get("test_suite"):
+        suite = TestSuite(**metadata["test_suite"])
+    elif metadata.get("test_cases"):
+        suite = TestSuite.from_markdown(metadata["test_cases"])
+    else:
+        raise HTTPException(status_code=404, detail="Test cases not found for this file")
+    
+    unknown = [testcase_id for testcase_id in request.replace
+               if all(test_case.id != testcase_id for test_case in suite.test_cases)]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Test cases not found: {', '.join(unknown)}")
+    
+    extracted_text_url = metadata.get("extracted_text_url")
+    if not extracted_text_url:
+        raise HTTPException(
+            status_code=409,
+            detail="No stored extracted text for this file. Re-upload the PDF to regenerate test cases."
+        )
+    
+    text_result = await get_extracted_text_from_s3_async(extracted_text_url.split('/', 3)[3])
+    if not text_result["success"]:
+        raise HTTPException(status_code=500, detail=text_result.get("error"))
+    
+    result = await regenerate_testcases_async(
+        text_result["text"],
+        suite,
+        request.replace,
+        add=request.add,
+        instructions=request.instructions,
+        model=request.model,
+        temperature=request.temperature,
+        use_cache=not request.bypass_cache,
+        depth=request.depth
+    )
+    if "error" in result:
+        raise HTTPException(status_code=502, detail=result["error"])
+    
+    replaced = result["test_cases"][:len(request.replace)]
+    added = result["test_cases"][len(request.replace):]
+    suite = suite.revise([TestCase(**test_case) for test_case in replaced],
+                         [TestCase(**test_case) for test_case in added])
+    
+    revision = {
+        "replaced": request.replace,
+        "added": [test_case["id"] for test_case in added],
+        "instructions": request.instructions,
+        "model_used": result.get("model"),
+        "model_tier": result.get("tier"),
+        "token_usage": result.get("usage", {}),
+        "revised_at": datetime.now().isoformat()
+    }
+    revisions = list(metadata.get("testcase_revisions", [])) + [revision]
+    
+    # Claim the revision before touching the artifacts, so a request that lost
+    # the race leaves them alone
+    update_result = await update_metadata_async(file_id, {
+        "test_cases": suite.to_markdown(),
+        "test_suite": suite.model_dump(),
+        "testcase_revisions": revisions,
+        "testcase_revision": revision_number + 1
+    }, expected={"testcase_revision": revision_number or None})
+    if not update_result["success"]:
+        if update_result.get("conflict"):
+            raise HTTPException(
+                status_code=409,
+                detail="The test cases were changed by another request. Reload them and try again."
+            )
+        raise HTTPException(status_code=500, detail=update_result.get("error"))
+    
+    # Rewrite the current version's artifacts, keeping the rest of the stored JSON
+    testcases_data = {"model": metadata.get("model_used"), "status": "success"}
+    json_url = metadata.get("testcases_json_url")
+    md_url = metadata.get("testcases_md_url")
+    if json_url:
+        stored = await get_file_from_s3_async(json_url.split('/', 3)[3])
+        if stored["success"]:
+            try:
+                testcases_data = json.loads(stored["content"])
+            except ValueError:
+                print(f"Warning: Stored test cases JSON for {file_id} is unreadable; rewriting it")
+    testcases_data.update({"text": suite.to_markdown(), "test_suite": suite.model_dump(), "revisions": revisions})
+    
+    filename = metadata.get("filename", "document.pdf")
+    json_result, md_result = await asyncio.gather(
+        upload_testcases_to_s3_async(testcases_data, filename, file_id, format_type="json",
+                                     s3_key=json_url.split('/', 3)[3] if json_url else None),
+        upload_testcases_to_s3_async(testcases_data, filename, file_id, format_type="markdown",
+                                     s3_key=md_url.split('/', 3)[3] if md_url else None)
+    )
+    for upload_result in (json_result, md_result):
+        if not upload_result["success"]:
+            raise HTTPException(status_code=500, detail=upload_result.get("error"))
+    
+    if (json_result["s3_url"], md_result["s3_url"]) != (json_url, md_url):
+        update_result = await update_metadata_async(file_id, {
+            "testcases_json_url": json_result["s3_url"],
+            "testcases_md_url": md_result["s3_url"]
+        })
+        if not update_result["success"]:
+            raise HTTPException(status_code=500, detail=update_result.get("error"))
+    
+    # Identical re-uploads must not be served the pre-revision test cases
+    if metadata.get("cache_key"):
+        await invalidate_cached_result(metadata["cache_key"])
+    
+    return {
+        "file_id": file_id,
+        "replaced": replaced,
+        "added": added,
+        "total": len(suite.test_cases),
+        "model_used": result.get("model"),
+        "model_tier": result.get("tier"),
+        "token_usage": result.get("usage", {}),
+        "s3_locations": {
+            "testcases_json_url": json_result["s3_url"],
+            "testcases_md_url": md_result["s3_url"]
+        },
+        "status": "success"
+    }
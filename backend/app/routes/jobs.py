@@ -0,0 +1,95 @@
+import asyncio
+import json
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from app.services.job_service import get_job, get_job_events
+
+router = APIRouter()
+
+# How often the SSE stream checks for new progress events
+EVENT_POLL_INTERVAL = 0.5  # seconds
+# Comment line sent to keep proxies from closing an idle stream
+KEEPALIVE_INTERVAL = 15  # seconds
+
+
+@router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """
+    Get the current status of an upload job.
+
+    Args:
+        job_id: Job identifier returned by POST /upload-pdf?async_mode=true
+
+    Returns:
+        Job state including current stage, progress events and final result
+    """
+    job = get_job(job_id)
+
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return job
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """
+    Stream job progress as Server-Sent Events.
+
+    Each pipeline stage (extracting, stored, generating, persisted) is sent as a
+    'progress' event. While test cases are generated, the markdown is streamed
+    as 'chunk' events. The stream ends with a 'completed' or 'failed' event.
+
+    Args:
+        job_id: Job identifier
+
+    Returns:
+        text/event-stream response
+    """
+    if get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        sent = 0
+        idle = 0.0
+
+        while True:
+            state = get_job_events(job_id, sent)
+            if state is None:
+                yield _format_sse("failed", {"stage": "failed", "error": "Job expired"})
+                return
+
+            events, finished = state
+            for event in events:
+                if "chunk" in event:
+                    name = "chunk"
+                elif event["stage"] in ("completed", "failed"):
+                    name = event["stage"]
+                else:
+                    name = "progress"
+                if name == "completed":
+                    event = {**event, "job": get_job(job_id)}
+                yield _format_sse(name, event)
+            sent += len(events)
+
+            if finished:
+                return
+
+            if events:
+                idle = 0.0
+            elif idle >= KEEPALIVE_INTERVAL:
+                yield ": keep-alive\n\n"
+                idle = 0.0
+
+            await asyncio.sleep(EVENT_POLL_INTERVAL)
+            idle += EVENT_POLL_INTERVAL
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def _format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Query
+from app.services.cache_service import get_cache_stats
+from app.services.pdf_service import get_page_cache_stats
+from app.services.gemini_governor import get_governor_stats
+from app.services.gemini_hedging import get_hedging_stats
+from app.services.token_accounting import get_token_rollups
+
+router = APIRouter()
+
+
+@router.get("/metrics/cache")
+async def get_cache_metrics():
+    """
+    Get hit/miss statistics for the application caches.
+    
+    Returns:
+        Cache statistics for PDF page extraction and upload results
+    """
+    return {
+        "pdf_pages": get_page_cache_stats(),
+        **get_cache_stats()
+    }
+
+
+@router.get("/metrics/gemini")
+async def get_gemini_metrics():
+    """
+    Get the node-wide Gemini quota state (rate buckets, in-flight calls, cooldown)
+    and this worker's hedged request statistics.
+    """
+    return {**get_governor_stats(), "hedging": get_hedging_stats()}
+
+
+@router.get("/metrics/tokens")
+async def get_token_metrics(days: int = Query(7, ge=1, le=90)):
+    """
+    Get Gemini token usage rolled up per day and per model.
+    
+    Args:
+        days: Number of days to include, counting today
+    
+    Returns:
+        Per-day/per-model rows, per-model totals and averages, and overall totals
+    """
+    return await get_token_rollups(days)
@@ -1,24 +1,93 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from app.services.pdf_service import extract_text_from_pdf, validate_pdf_content
-from app.services.gemini_service import generate_healthcare_testcases
-from app.services.s3_service import upload_pdf_to_s3, upload_testcases_to_s3
-from app.services.dynamodb_service import save_metadata
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+from typing import List
+from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from app.services.pdf_service import extract_text_from_pdf_async, validate_pdf_content, preflight_pdf_async
+from app.services.gemini_service import (
+    generate_healthcare_testcases_async,
+    generate_healthcare_testcases_streaming,
+    generate_healthcare_testcases_chunked,
+    PROMPT_VERSION,
+    PROMPT_CHAR_BUDGET,
+    MAX_GENERATION_CHUNKS,
+    model_route_key,
+)
+from app.models.testcase import GenerationDepth
+from app.services.s3_service import upload_pdf_to_s3_async, upload_testcases_to_s3_async, upload_extracted_text_to_s3_async
+from app.services.dynamodb_service import save_metadata_async, get_metadata_async, batch_save_metadata_async
+from app.services.executors import pdf_executor, run_in_executor
+from app.services.cache_service import (
+    result_cache_key,
+    get_cached_result,
+    store_cached_result,
+    invalidate_cached_result,
+    get_cached_extraction,
+    store_cached_extraction,
+)
+from app.services.token_accounting import usage_attributes
+from app.services.job_service import create_job, get_job, update_job_stage, append_job_output, complete_job, fail_job
 
 router = APIRouter()
 
 # Maximum file size: 10MB
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB in bytes
+# Request body limit enforced while streaming (file plus multipart framing)
+MAX_REQUEST_SIZE = MAX_FILE_SIZE + 64 * 1024
+# Uploads are read in chunks and spooled to disk above this size
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+SPOOL_MAX_MEMORY = 2 * 1024 * 1024  # 2MB
+
+# Batch upload limits
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "500"))
+MAX_BATCH_REQUEST_SIZE = int(os.getenv("MAX_BATCH_REQUEST_SIZE", str(512 * 1024 * 1024)))  # 512MB
+# Batch files are many and processed gradually, so they go to disk sooner
+BATCH_SPOOL_MAX_MEMORY = 256 * 1024  # 256KB
+# Default per-stage concurrency for batch uploads
+BATCH_EXTRACT_CONCURRENCY = int(os.getenv("BATCH_EXTRACT_CONCURRENCY", "4"))
+BATCH_STORAGE_CONCURRENCY = int(os.getenv("BATCH_STORAGE_CONCURRENCY", "8"))
+BATCH_GENERATION_CONCURRENCY = int(os.getenv("BATCH_GENERATION_CONCURRENCY", "2"))
+MAX_STAGE_CONCURRENCY = 32
+# DynamoDB BatchWriteItem accepts at most 25 items per call
+METADATA_BATCH_SIZE = 25
+METADATA_BATCH_MAX_DELAY = 0.5  # seconds
+# Documents longer than one prompt are generated chunk by chunk and merged
+CHUNKED_GENERATION_ENABLED = os.getenv("CHUNKED_GENERATION_ENABLED", "true").lower() == "true"
+# Stop extracting once the text fills every prompt; later pages would be cut off anyway.
+# Large documents still use the PDF process pool (see extract_text_from_pdf).
+EXTRACTION_BUDGET_ENABLED = os.getenv("EXTRACTION_BUDGET_ENABLED", "true").lower() == "true"
+# Stage failures that still leave the upload usable (see _run_upload_pipeline)
+OPTIONAL_STAGES = {"extracted_text_upload"}
 
 @router.post("/upload-pdf")
-async def upload_pdf(file: UploadFile = File(...)):
+async def upload_pdf(background_tasks: BackgroundTasks, file: UploadFile = File(...), async_mode: bool = False,
+                     force_regenerate: bool = False, depth: GenerationDepth = "standard"):
     """
     Upload a PDF file, generate healthcare test cases, and store in AWS S3.
     
+    With async_mode=true the request returns 202 with a job id right after
+    validation and the pipeline runs in the background. Progress can be
+    followed via GET /jobs/{job_id} or the SSE stream at GET /jobs/{job_id}/events.
+    
+    Results are cached by a SHA-256 of the PDF bytes plus the model routing
+    and prompt version. Re-uploading an identical PDF returns the stored result (marked
+    "cached": true) without extraction or generation, unless force_regenerate
+    is set.
+    
     Args:
         file: PDF file to upload
+        async_mode: Run the pipeline in the background and return a job id
+        force_regenerate: Ignore any cached result and run the full pipeline
+        depth: Analysis depth ('quick', 'standard' or 'thorough') used with the
+            document size to pick the Gemini model
         
     Returns:
         JSON response with extracted text, generated test cases, and S3 locations
+        (or the job id and status URLs in async mode)
     """
     # Validate file type
     if not file.filename.endswith('.pdf'):
@@ -27,135 +96,651 @@ async def upload_pdf(file: UploadFile = File(...)):
             detail="Only PDF files are allowed. Please upload a file with .pdf extension."
         )
     
+    pdf_file = None
     try:
-        # Read file content
-        pdf_bytes = await file.read()
-        
-        # Validate file size
-        if len(pdf_bytes) > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=400,
-                detail=f"File size exceeds the maximum limit of {MAX_FILE_SIZE // (1024 * 1024)}MB"
-            )
+        # Stream file content into a bounded spool, rejecting oversized files early
+        pdf_file, content_hash = await _spool_upload(file)
         
-        # Extract text from PDF
-        extraction_result = extract_text_from_pdf(pdf_bytes)
+        # Identical PDF already processed with the same model and prompt
+        cache_key = result_cache_key(content_hash, model_route_key(depth), PROMPT_VERSION)
+        cached_result = None if force_regenerate else await _lookup_cached_upload(cache_key)
         
-        if not extraction_result["success"]:
-            raise HTTPException(
-                status_code=400,
-                detail=extraction_result.get("error", "Failed to extract text from PDF")
-            )
-        
-        extracted_text = extraction_result["text"]
-        num_pages = extraction_result["pages"]
-        
-        # Validate content
-        if not validate_pdf_content(extracted_text):
-            raise HTTPException(
-                status_code=400,
-                detail="PDF does not contain sufficient text content. Minimum 50 characters required."
-            )
+        if cached_result is not None:
+            if async_mode:
+                job = create_job(file.filename, cached_result["file_id"])
+                complete_job(job["job_id"], cached_result)
+                return _job_accepted_response(get_job(job["job_id"]))
+            return cached_result
         
+        # Reject encrypted, scanned and corrupt PDFs before any expensive work
+        await _preflight_or_reject(pdf_file)
         
         # Generate unique file ID
         import uuid
         file_id = str(uuid.uuid4())
         
-        # Upload original PDF to S3
-        s3_upload_result = upload_pdf_to_s3(pdf_bytes, file.filename, file_id)
+        if async_mode:
+            job = create_job(file.filename, file_id)
+            # The background job takes ownership of the spooled file
+            background_tasks.add_task(
+                _run_upload_job, job["job_id"], pdf_file, file.filename, file_id, content_hash, cache_key,
+                use_llm_cache=not force_regenerate, depth=depth
+            )
+            pdf_file = None
+            
+            return _job_accepted_response(job)
+        
+        return await _run_upload_pipeline(
+            pdf_file, file.filename, file_id, content_hash, cache_key, use_llm_cache=not force_regenerate,
+            depth=depth
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"An unexpected error occurred: {str(e)}"
+        )
+    finally:
+        if pdf_file is not None:
+            pdf_file.close()
+
+
+@router.post("/upload-pdfs/batch")
+async def upload_pdf_batch(
+    files: List[UploadFile] = File(...),
+    extract_concurrency: int = Query(BATCH_EXTRACT_CONCURRENCY, ge=1, le=MAX_STAGE_CONCURRENCY),
+    storage_concurrency: int = Query(BATCH_STORAGE_CONCURRENCY, ge=1, le=MAX_STAGE_CONCURRENCY),
+    generation_concurrency: int = Query(BATCH_GENERATION_CONCURRENCY, ge=1, le=MAX_STAGE_CONCURRENCY),
+    force_regenerate: bool = False,
+    depth: GenerationDepth = "standard"
+):
+    """
+    Upload many PDFs (or zip archives of PDFs) and process them concurrently.
+    
+    Every file goes through the same extraction -> storage -> generation
+    pipeline as /upload-pdf, with per-stage concurrency limits shared across
+    the batch. Metadata is written with DynamoDB batch writes.
+    
+    Args:
+        files: PDF files and/or .zip archives containing PDF files
+        extract_concurrency: Maximum concurrent PDF extractions
+        storage_concurrency: Maximum concurrent S3 uploads
+        generation_concurrency: Maximum concurrent Gemini generations
+        force_regenerate: Ignore cached results for identical PDFs
+        depth: Analysis depth used to pick the Gemini model (see /upload-pdf)
+        
+    Returns:
+        NDJSON stream with one manifest line per file as it completes,
+        followed by a summary line
+    """
+    entries = []
+    try:
+        for upload in files:
+            name = upload.filename or ""
+            if name.lower().endswith('.zip'):
+                zip_file, _ = await _spool_upload(upload, max_size=MAX_BATCH_REQUEST_SIZE, max_memory=0)
+                try:
+                    entries.extend(await run_in_executor(pdf_executor, _spool_zip_members, zip_file, name))
+                finally:
+                    zip_file.close()
+            elif name.endswith('.pdf'):
+                try:
+                    pdf_file, content_hash = await _spool_upload(upload, max_memory=BATCH_SPOOL_MAX_MEMORY)
+                    entries.append({"filename": name, "file": pdf_file, "content_hash": content_hash})
+                except HTTPException as e:
+                    entries.append({"filename": name, "error": e.detail, "status_code": e.status_code})
+            else:
+                entries.append({
+                    "filename": name,
+                    "error": "Only PDF files and zip archives of PDF files are allowed.",
+                    "status_code": 400
+                })
+            
+            if len(entries) > MAX_BATCH_FILES:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Batch exceeds the maximum of {MAX_BATCH_FILES} files"
+                )
+    except BaseException:
+        _close_batch_entries(entries)
+        raise
+    
+    stage_limits = {
+        "extract": asyncio.Semaphore(extract_concurrency),
+        "storage": asyncio.Semaphore(storage_concurrency),
+        "generation": asyncio.Semaphore(generation_concurrency)
+    }
+    
+    async def manifest_stream():
+        metadata_writer = _MetadataBatchWriter()
+        tasks = [
+            asyncio.create_task(_process_batch_entry(entry, stage_limits, metadata_writer, force_regenerate, depth))
+            for entry in entries
+        ]
+        counts = {}
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                manifest_entry = await next_done
+                counts[manifest_entry["status"]] = counts.get(manifest_entry["status"], 0) + 1
+                yield json.dumps(manifest_entry, default=str) + "\n"
+            await metadata_writer.close()
+            yield json.dumps({"summary": {"total": len(entries), **counts}}) + "\n"
+        finally:
+            # Client went away: stop outstanding work and release spooled files
+            for task in tasks:
+                task.cancel()
+            await metadata_writer.close()
+            _close_batch_entries(entries)
+    
+    return StreamingResponse(manifest_stream(), media_type="application/x-ndjson")
+
+
+async def _process_batch_entry(entry: dict, stage_limits: dict, metadata_writer, force_regenerate: bool,
+                               depth: str = "standard") -> dict:
+    """
+    Run one batch file through the upload pipeline and build its manifest entry.
+    """
+    filename = entry["filename"]
+    if "error" in entry:
+        return {"filename": filename, "status": "failed", "error": entry["error"], "status_code": entry["status_code"]}
+    
+    try:
+        cache_key = result_cache_key(entry["content_hash"], model_route_key(depth), PROMPT_VERSION)
+        result = None if force_regenerate else await _lookup_cached_upload(cache_key)
         
-        if not s3_upload_result["success"]:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to upload PDF to S3: {s3_upload_result.get('error')}"
+        if result is None:
+            await _preflight_or_reject(entry["file"])
+            import uuid
+            result = await _run_upload_pipeline(
+                entry["file"], filename, str(uuid.uuid4()), entry["content_hash"], cache_key,
+                stage_limits=stage_limits, metadata_writer=metadata_writer.save, use_llm_cache=not force_regenerate,
+                depth=depth
             )
         
-        pdf_s3_url = s3_upload_result["s3_url"]
+        manifest_entry = {
+            "filename": filename,
+            "file_id": result["file_id"],
+            "status": result["status"],
+            "cached": result.get("cached", False),
+            "pages": result.get("pages"),
+            "s3_locations": result.get("s3_locations")
+        }
+        if result.get("error"):
+            manifest_entry["error"] = result["error"]
+        if result.get("stage_errors"):
+            manifest_entry["stage_errors"] = result["stage_errors"]
+        return manifest_entry
         
-        # Generate healthcare test cases using Gemini AI
-        test_cases_result = generate_healthcare_testcases(extracted_text)
-        
-        # Check for errors in AI generation
-        if "error" in test_cases_result:
-            # Still save metadata even if test case generation failed
-            metadata = {
-                "filename": file.filename,
-                "pages": num_pages,
-                "extracted_text_length": len(extracted_text),
-                "pdf_s3_url": pdf_s3_url,
-                "status": "partial_success",
-                "error": test_cases_result["error"]
-            }
-            save_metadata(file_id, metadata)
+    except HTTPException as e:
+        return {"filename": filename, "status": "failed", "error": e.detail, "status_code": e.status_code}
+    except Exception as e:
+        return {"filename": filename, "status": "failed", "error": f"An unexpected error occurred: {str(e)}", "status_code": 500}
+    finally:
+        entry["file"].close()
+
+
+def _spool_zip_members(zip_file, archive_name: str) -> list:
+    """
+    Spool every PDF member of a zip archive into its own temporary file.
+    
+    Declared and actual member sizes are both checked against MAX_FILE_SIZE,
+    so a compressed bomb cannot expand past the per-file limit.
+    
+    Returns:
+        List of batch entries (spooled file + content hash, or an error)
+    """
+    entries = []
+    try:
+        archive = zipfile.ZipFile(zip_file)
+    except zipfile.BadZipFile as e:
+        return [{"filename": archive_name, "error": f"Invalid zip archive: {str(e)}", "status_code": 400}]
+    
+    with archive:
+        for info in archive.infolist():
+            name = os.path.basename(info.filename)
+            if info.is_dir() or not name.endswith('.pdf') or name.startswith('.'):
+                continue
             
-            return {
-                "file_id": file_id,
-                "filename": file.filename,
-                "pages": num_pages,
-                "extracted_text_length": len(extracted_text),
-                "s3_locations": {
-                    "pdf_url": pdf_s3_url
-                },
-                "test_cases": None,
-                "error": test_cases_result["error"],
-                "status": "partial_success"
+            if len(entries) >= MAX_BATCH_FILES:
+                entries.append({
+                    "filename": name,
+                    "error": f"Batch exceeds the maximum of {MAX_BATCH_FILES} files",
+                    "status_code": 400
+                })
+                break
+            
+            too_large = {
+                "filename": name,
+                "error": f"File size exceeds the maximum limit of {MAX_FILE_SIZE // (1024 * 1024)}MB",
+                "status_code": 413
             }
+            if info.file_size > MAX_FILE_SIZE:
+                entries.append(too_large)
+                continue
+            
+            spool = tempfile.SpooledTemporaryFile(max_size=BATCH_SPOOL_MAX_MEMORY)
+            digest = hashlib.sha256()
+            size = 0
+            with archive.open(info) as member:
+                while True:
+                    chunk = member.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > MAX_FILE_SIZE:
+                        break
+                    spool.write(chunk)
+                    digest.update(chunk)
+            
+            if size > MAX_FILE_SIZE:
+                spool.close()
+                entries.append(too_large)
+                continue
+            
+            spool.seek(0)
+            entries.append({"filename": name, "file": spool, "content_hash": digest.hexdigest()})
+    
+    return entries
+
+
+def _close_batch_entries(entries: list) -> None:
+    for entry in entries:
+        if "file" in entry:
+            entry["file"].close()
+
+
+class _MetadataBatchWriter:
+    """
+    Coalesce metadata saves from concurrent pipelines into DynamoDB batch writes.
+    
+    save() has the same signature as save_metadata_async and resolves once the
+    batch containing the item has been written. A batch is flushed when it
+    reaches METADATA_BATCH_SIZE items or METADATA_BATCH_MAX_DELAY seconds after
+    its first item arrived.
+    """
+    
+    def __init__(self):
+        self._pending = []
+        self._timer = None
+        self._flushes = set()
+    
+    async def save(self, file_id: str, metadata: dict) -> dict:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((file_id, metadata, future))
         
-        # Upload test cases to S3 (JSON format)
-        testcases_json_result = upload_testcases_to_s3(
-            test_cases_result,
-            file.filename,
-            file_id,
-            format_type="json"
-        )
+        if len(self._pending) >= METADATA_BATCH_SIZE:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(METADATA_BATCH_MAX_DELAY, self._flush)
         
-        # Upload test cases to S3 (Markdown format)
-        testcases_md_result = upload_testcases_to_s3(
-            test_cases_result,
-            file.filename,
-            file_id,
-            format_type="markdown"
-        )
+        return await future
+    
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
         
-        # Save metadata to DynamoDB
-        metadata = {
-            "filename": file.filename,
-            "pages": num_pages,
-            "extracted_text_length": len(extracted_text),
-            "pdf_s3_url": pdf_s3_url,
-            "testcases_json_url": testcases_json_result.get("s3_url"),
-            "testcases_md_url": testcases_md_result.get("s3_url"),
-            "test_cases": test_cases_result.get("text", ""),  # Add test cases text
-            "model_used": test_cases_result.get("model", "gemini-2.5-flash"),
-            "token_usage": str(test_cases_result.get("usage", {})),
-            "status": "success"
+        batch, self._pending = self._pending, []
+        task = asyncio.create_task(self._write(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+    
+    async def _write(self, batch: list):
+        result = await batch_save_metadata_async([(file_id, metadata) for file_id, metadata, _ in batch])
+        for _, _, future in batch:
+            if not future.done():
+                future.set_result(result)
+    
+    async def close(self):
+        """
+        Flush anything still pending and wait for in-flight batch writes.
+        """
+        self._flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+
+def _job_accepted_response(job: dict) -> JSONResponse:
+    return JSONResponse(
+        status_code=202,
+        content={
+            "job_id": job["job_id"],
+            "file_id": job["file_id"],
+            "status": job["status"],
+            "status_url": f"/jobs/{job['job_id']}",
+            "events_url": f"/jobs/{job['job_id']}/events"
         }
+    )
+
+
+async def _lookup_cached_upload(cache_key: str):
+    """
+    Return a cached upload result if its file still exists, else None.
+    """
+    cached = await get_cached_result(cache_key)
+    if cached is None:
+        return None
+    
+    # Another worker may have deleted the file since the result was cached
+    metadata_result = await get_metadata_async(cached["file_id"])
+    if not metadata_result["success"]:
+        await invalidate_cached_result(cache_key)
+        return None
+    
+    return {**cached, "cached": True}
+
+
+async def _spool_upload(file: UploadFile, max_size: int = MAX_FILE_SIZE, max_memory: int = SPOOL_MAX_MEMORY):
+    """
+    Copy an uploaded file into a spooled temporary file in fixed-size chunks.
+    
+    Small uploads stay in memory; larger ones roll over to disk, so concurrent
+    uploads never hold more than max_memory each in RAM.
+    
+    Args:
+        file: Uploaded file
+        max_size: Maximum accepted size in bytes
+        max_memory: Size above which the spool rolls over to disk (0 = always on disk)
         
-        save_result = save_metadata(file_id, metadata)
-        
-        if not save_result["success"]:
-            print(f"Warning: Failed to save metadata to DynamoDB: {save_result.get('error')}")
-        
-        # Return successful response
-        return {
-            "file_id": file_id,
-            "filename": file.filename,
-            "pages": num_pages,
-            "extracted_text_length": len(extracted_text),
-            "s3_locations": {
-                "pdf_url": pdf_s3_url,
-                "testcases_json_url": testcases_json_result.get("s3_url"),
-                "testcases_md_url": testcases_md_result.get("s3_url")
-            },
-            "test_cases": test_cases_result,
-            "status": "success"
-        }
+    Returns:
+        tuple of (spooled file positioned at the start, SHA-256 hex digest of the content)
         
-    except HTTPException:
+    Raises:
+        HTTPException: 413 as soon as the upload passes max_size
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=max_memory) if max_memory else tempfile.TemporaryFile()
+    digest = hashlib.sha256()
+    size = 0
+    
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            
+            size += len(chunk)
+            if size > max_size:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"File size exceeds the maximum limit of {max_size // (1024 * 1024)}MB"
+                )
+            spool.write(chunk)
+            digest.update(chunk)
+    except BaseException:
+        spool.close()
         raise
+    
+    spool.seek(0)
+    return spool, digest.hexdigest()
+
+
+async def _run_upload_job(job_id: str, pdf_file, filename: str, file_id: str,
+                          content_hash: str = None, cache_key: str = None, use_llm_cache: bool = True,
+                          depth: str = "standard"):
+    """
+    Run the upload pipeline for a background job and record the outcome.
+    """
+    def report(stage, **details):
+        update_job_stage(job_id, stage, **details)
+    
+    try:
+        result = await _run_upload_pipeline(
+            pdf_file, filename, file_id, content_hash, cache_key, report,
+            on_chunk=lambda text: append_job_output(job_id, text), use_llm_cache=use_llm_cache, depth=depth
+        )
+        complete_job(job_id, result)
+    except HTTPException as e:
+        fail_job(job_id, e.detail, e.status_code)
     except Exception as e:
+        fail_job(job_id, f"An unexpected error occurred: {str(e)}")
+    finally:
+        pdf_file.close()
+
+
+async def _run_upload_pipeline(pdf_file, filename: str, file_id: str, content_hash: str = None,
+                               cache_key: str = None, report=None, stage_limits: dict = None,
+                               metadata_writer=None, on_chunk=None, use_llm_cache: bool = True,
+                               depth: str = "standard") -> dict:
+    """
+    Extract, store, generate and persist test cases for an uploaded PDF.
+    
+    The same spooled file is handed to the PDF reader and the S3 upload, so the
+    document is never copied into an in-memory bytes buffer.
+    
+    Args:
+        pdf_file: Seekable binary file with the PDF content
+        filename: Original filename
+        file_id: Unique file identifier
+        content_hash: SHA-256 of the PDF bytes, used to reuse cached extraction results
+        cache_key: Result cache key under which a successful result is stored
+        report: Optional callback invoked as report(stage, **details) when a stage is reached
+        stage_limits: Optional semaphores bounding the 'extract', 'storage' and
+            'generation' stages across concurrent pipelines
+        metadata_writer: Coroutine function used to persist the metadata item
+            (defaults to save_metadata_async)
+        on_chunk: Optional callback receiving generated markdown as it streams;
+            when set, generation uses the Gemini streaming API
+        use_llm_cache: Answer identical Gemini requests from the LLM response cache
+        depth: Requested analysis depth, used to route the Gemini model
+        
+    Returns:
+        Upload response payload
+        
+    Raises:
+        HTTPException: If extraction or validation fails, or if neither the PDF
+            archive nor test case generation succeeded
+    """
+    if report is None:
+        report = lambda stage, **details: None
+    if metadata_writer is None:
+        metadata_writer = save_metadata_async
+    
+    # Extract text from PDF
+    report("extracting")
+    max_chars = None
+    if EXTRACTION_BUDGET_ENABLED:
+        max_chars = PROMPT_CHAR_BUDGET * (MAX_GENERATION_CHUNKS if CHUNKED_GENERATION_ENABLED else 1)
+    extraction_key = f"{content_hash}:{max_chars}" if content_hash and max_chars else content_hash
+    extraction_result = get_cached_extraction(extraction_key) if extraction_key else None
+    if extraction_result is None:
+        extraction_result = await _limited(
+            stage_limits, "extract", extract_text_from_pdf_async, pdf_file, max_chars=max_chars
+        )
+    
+    if not extraction_result["success"]:
+        raise HTTPException(
+            status_code=400,
+            detail=extraction_result.get("error", "Failed to extract text from PDF")
+        )
+    
+    if extraction_key:
+        store_cached_extraction(extraction_key, extraction_result)
+    
+    extracted_text = extraction_result["text"]
+    num_pages = extraction_result["pages"]
+    pages_extracted = extraction_result.get("pages_extracted", num_pages)
+    text_truncated = extraction_result.get("truncated", False)
+    
+    # Validate content
+    if not validate_pdf_content(extracted_text):
+        raise HTTPException(
+            status_code=400,
+            detail="PDF does not contain sufficient text content. Minimum 50 characters required."
+        )
+    
+    # The PDF archive put does not depend on generation, so it runs concurrently
+    # with the Gemini call instead of ahead of it
+    async def store_pdf():
+        result = await _limited(stage_limits, "storage", upload_pdf_to_s3_async, pdf_file, filename, file_id)
+        if result["success"]:
+            report("stored", pdf_url=result["s3_url"], pages=num_pages)
+        return result
+    
+    pdf_upload_task = asyncio.create_task(store_pdf())
+    # Extracted text is kept so test cases can be regenerated without re-parsing
+    text_upload_task = asyncio.create_task(
+        _limited(stage_limits, "storage", upload_extracted_text_to_s3_async, extracted_text, file_id)
+    )
+    
+    try:
+        # Generate healthcare test cases using Gemini AI
+        report("generating")
+        if CHUNKED_GENERATION_ENABLED and len(extracted_text) > PROMPT_CHAR_BUDGET:
+            test_cases_result = await _limited(
+                stage_limits, "generation", generate_healthcare_testcases_chunked, extracted_text,
+                on_chunk=on_chunk, use_cache=use_llm_cache, depth=depth
+            )
+        elif on_chunk is not None:
+            test_cases_result = await _limited(
+                stage_limits, "generation", generate_healthcare_testcases_streaming, extracted_text, on_chunk,
+                use_cache=use_llm_cache, depth=depth
+            )
+        else:
+            test_cases_result = await _limited(
+                stage_limits, "generation", generate_healthcare_testcases_async, extracted_text,
+                use_cache=use_llm_cache, depth=depth
+            )
+        
+        testcases_json_result = testcases_md_result = None
+        if "error" not in test_cases_result:
+            # Upload test cases to S3 in JSON and Markdown format in parallel
+            testcases_json_result, testcases_md_result = await asyncio.gather(
+                _limited(stage_limits, "storage", upload_testcases_to_s3_async,
+                         test_cases_result, filename, file_id, format_type="json"),
+                _limited(stage_limits, "storage", upload_testcases_to_s3_async,
+                         test_cases_result, filename, file_id, format_type="markdown")
+            )
+    finally:
+        # The spooled PDF must not be closed while the archive put is still reading it
+        s3_upload_result = await pdf_upload_task
+        text_upload_result = await text_upload_task
+    
+    # Record failures per stage; whatever did succeed is still persisted
+    stage_errors = {}
+    if not s3_upload_result["success"]:
+        stage_errors["pdf_upload"] = s3_upload_result.get("error")
+    if not text_upload_result["success"]:
+        stage_errors["extracted_text_upload"] = text_upload_result.get("error")
+    if "error" in test_cases_result:
+        stage_errors["generation"] = test_cases_result["error"]
+    else:
+        if not testcases_json_result["success"]:
+            stage_errors["testcases_json_upload"] = testcases_json_result.get("error")
+        if not testcases_md_result["success"]:
+            stage_errors["testcases_md_upload"] = testcases_md_result.get("error")
+    
+    if "pdf_upload" in stage_errors and "generation" in stage_errors:
         raise HTTPException(
             status_code=500,
-            detail=f"An unexpected error occurred: {str(e)}"
+            detail=f"Failed to upload PDF to S3: {s3_upload_result.get('error')}; {test_cases_result['error']}"
+        )
+    
+    # The extracted text artifact is only read by regeneration, which answers
+    # 409 without it, so losing it alone does not make the upload partial
+    status = "partial_success" if set(stage_errors) - OPTIONAL_STAGES else "success"
+    pdf_s3_url = _stage_url(s3_upload_result)
+    testcases_json_url = _stage_url(testcases_json_result)
+    testcases_md_url = _stage_url(testcases_md_result)
+    
+    # Save metadata to DynamoDB
+    metadata = {
+        "filename": filename,
+        "pages": num_pages,
+        "extracted_text_length": len(extracted_text),
+        "pages_extracted": pages_extracted,
+        "text_truncated": text_truncated,
+        "pdf_s3_url": pdf_s3_url,
+        "extracted_text_url": _stage_url(text_upload_result),
+        "status": status
+    }
+    if "error" in test_cases_result:
+        # Still save metadata even if test case generation failed
+        metadata["error"] = test_cases_result["error"]
+    else:
+        metadata.update({
+            "testcases_json_url": testcases_json_url,
+            "testcases_md_url": testcases_md_url,
+            "result_version": 1,
+            "test_cases": test_cases_result.get("text", ""),  # Add test cases text
+            "test_suite": test_cases_result.get("test_suite"),
+            "model_used": test_cases_result.get("model", "gemini-2.5-flash"),
+            "model_tier": test_cases_result.get("tier"),
+            "fallback_from": test_cases_result.get("fallback_from"),
+            "token_usage": test_cases_result.get("usage", {}),
+            **usage_attributes(test_cases_result.get("usage"))
+        })
+    if stage_errors:
+        metadata["stage_errors"] = stage_errors
+    if cache_key:
+        metadata["content_hash"] = content_hash
+        metadata["cache_key"] = cache_key
+    metadata = {key: value for key, value in metadata.items() if value is not None}
+    
+    save_result = await metadata_writer(file_id, metadata)
+    
+    if not save_result["success"]:
+        print(f"Warning: Failed to save metadata to DynamoDB: {save_result.get('error')}")
+        stage_errors["metadata"] = save_result.get("error")
+    report("persisted", status=status)
+    
+    response = {
+        "file_id": file_id,
+        "filename": filename,
+        "pages": num_pages,
+        "extracted_text_length": len(extracted_text),
+        "pages_extracted": pages_extracted,
+        "text_truncated": text_truncated,
+        "s3_locations": {
+            "pdf_url": pdf_s3_url,
+            "testcases_json_url": testcases_json_url,
+            "testcases_md_url": testcases_md_url
+        },
+        "test_cases": None if "error" in test_cases_result else test_cases_result,
+        "status": status,
+        "cached": False
+    }
+    if "error" in test_cases_result:
+        response["error"] = test_cases_result["error"]
+    if stage_errors:
+        response["stage_errors"] = stage_errors
+    
+    # Only complete, persisted results are reused for identical uploads (a
+    # re-upload is also how a missing text artifact gets written)
+    if cache_key and not stage_errors:
+        cache_result = await store_cached_result(cache_key, response)
+        if not cache_result["success"]:
+            print(f"Warning: Failed to cache upload result: {cache_result.get('error')}")
+    
+    return response
+
+
+async def _preflight_or_reject(pdf_file) -> None:
+    """
+    Run the PDF preflight and raise a 400 unless the verdict is 'ok'.
+    """
+    preflight = await preflight_pdf_async(pdf_file)
+    if preflight["verdict"] != "ok":
+        raise HTTPException(
+            status_code=400,
+            detail=f"PDF rejected ({preflight['verdict']}): {preflight['reason']}"
         )
+
+
+async def _limited(stage_limits, stage: str, func, *args, **kwargs):
+    """
+    Await func(*args, **kwargs) while holding the stage's semaphore, if any.
+    """
+    if not stage_limits or stage not in stage_limits:
+        return await func(*args, **kwargs)
+    async with stage_limits[stage]:
+        return await func(*args, **kwargs)
+
+
+def _stage_url(stage_result):
+    if stage_result and stage_result.get("success"):
+        return stage_result.get("s3_url")
+    return None
@@ -0,0 +1,78 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import boto3
+from botocore.config import Config
+from dotenv import load_dotenv
+from app.services.executors import S3_EXECUTOR_WORKERS, DYNAMODB_EXECUTOR_WORKERS
+
+load_dotenv()
+
+# AWS Configuration
+AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
+AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
+AWS_REGION = os.getenv("AWS_REGION")
+
+# Retries use botocore's adaptive mode, which also rate-limits the client
+# when AWS starts throttling
+AWS_MAX_ATTEMPTS = int(os.getenv("AWS_MAX_ATTEMPTS", "5"))
+AWS_CONNECT_TIMEOUT = int(os.getenv("AWS_CONNECT_TIMEOUT", "5"))  # seconds
+AWS_READ_TIMEOUT = int(os.getenv("AWS_READ_TIMEOUT", "30"))  # seconds
+# Connections each client opens at startup so the first requests skip TLS setup
+AWS_WARM_CONNECTIONS = int(os.getenv("AWS_WARM_CONNECTIONS", "4"))
+# Each S3 executor thread may run a multipart transfer with this many parts in flight
+S3_TRANSFER_CONCURRENCY = 4
+
+
+def _client_config(max_pool_connections: int) -> Config:
+    return Config(
+        region_name=AWS_REGION,
+        retries={"mode": "adaptive", "max_attempts": AWS_MAX_ATTEMPTS},
+        max_pool_connections=max_pool_connections,
+        tcp_keepalive=True,
+        connect_timeout=AWS_CONNECT_TIMEOUT,
+        read_timeout=AWS_READ_TIMEOUT,
+    )
+
+
+# One session and one client per service for the whole process; boto3 clients
+# are thread-safe, and each connection pool is sized to the executor that uses it
+session = boto3.session.Session(
+    aws_access_key_id=AWS_ACCESS_KEY_ID,
+    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+    region_name=AWS_REGION
+)
+s3_client = session.client('s3', config=_client_config(S3_EXECUTOR_WORKERS * S3_TRANSFER_CONCURRENCY))
+dynamodb = session.resource('dynamodb', config=_client_config(DYNAMODB_EXECUTOR_WORKERS + 2))
+dynamodb_client = dynamodb.meta.client
+
+
+def warm_connections(call, count: int = AWS_WARM_CONNECTIONS) -> None:
+    """
+    Make `count` concurrent calls so the client's pool holds that many open
+    connections. Failures are logged; the first real requests then simply
+    connect themselves.
+
+    Args:
+        call: Zero-argument function making one cheap request
+        count: Connections to open
+    """
+    if count < 1:
+        return
+    with ThreadPoolExecutor(max_workers=count, thread_name_prefix="warmup") as pool:
+        for future in [pool.submit(call) for _ in range(count)]:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Warning: Connection warm-up failed: {str(e)}")
+                return
+
+
+def close_clients() -> None:
+    """
+    Close the shared clients' connection pools.
+    """
+    for client in (s3_client, dynamodb_client):
+        try:
+            client.close()
+        except Exception as e:
+            print(f"Warning: Failed to close AWS client: {str(e)}")
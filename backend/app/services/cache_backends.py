@@ -0,0 +1,231 @@
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+
+class LRUCache:
+    """
+    Thread-safe in-memory LRU cache with hit/miss counters.
+
+    Bounded by entry count and, optionally, by the total len() of the values.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: Optional[int] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def set(self, key, value) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._sizeof(self._entries[key])
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._size += self._sizeof(value)
+            while self._entries and (
+                len(self._entries) > self.max_entries
+                or (self.max_bytes is not None and self._size > self.max_bytes)
+            ):
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= self._sizeof(evicted)
+
+    def delete(self, key) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._sizeof(self._entries.pop(key))
+
+    def _sizeof(self, value) -> int:
+        if self.max_bytes is None:
+            return 0
+        return len(value)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+            if self.max_bytes is not None:
+                stats["bytes"] = self._size
+                stats["max_bytes"] = self.max_bytes
+            return stats
+
+
+class DiskCache:
+    """
+    Size-bounded on-disk cache of bytes values, shared by every process on the host.
+
+    Each entry is a file named after its key. Reads refresh the file's access
+    time, and once the directory grows past max_bytes the least recently used
+    files are deleted until it is back under 90% of the limit.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as cache_file:
+                value = cache_file.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: bytes) -> None:
+        path = self._path(key)
+        try:
+            # An overwritten entry's bytes are freed by the rename below
+            old_size = os.stat(path).st_size
+        except OSError:
+            old_size = 0
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so concurrent readers never see a partial file
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+            with os.fdopen(fd, "wb") as temp_file:
+                temp_file.write(value)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Warning: Disk cache write failed for {key}: {str(e)}")
+            return
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan()[1]
+            else:
+                self._size = max(0, self._size + len(value) - old_size)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def delete(self, key: str) -> None:
+        path = self._path(key)
+        try:
+            size = os.stat(path).st_size
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            if self._size is not None:
+                self._size = max(0, self._size - size)
+
+    def _scan(self) -> tuple:
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.startswith(".tmp-"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_atime, stat.st_size, os.path.join(root, name)))
+                total += stat.st_size
+        return entries, total
+
+    def _evict(self) -> None:
+        # Other processes write to the same directory, so re-measure before evicting
+        entries, total = self._scan()
+        target = int(self.max_bytes * 0.9)
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                continue
+        self._size = total
+
+    def stats(self) -> dict:
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan()[1]
+            lookups = self.hits + self.misses
+            return {
+                "directory": self.directory,
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+class TieredCache:
+    """
+    In-memory LRU tier in front of an on-disk tier.
+
+    Values are stored on disk through encode/decode; disk hits are promoted to
+    the memory tier.
+    """
+
+    def __init__(self, memory: LRUCache, disk: DiskCache, encode, decode):
+        self.memory = memory
+        self.disk = disk
+        self.encode = encode
+        self.decode = decode
+
+    def get(self, key: str):
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+
+        data = self.disk.get(key)
+        if data is None:
+            return None
+
+        try:
+            value = self.decode(data)
+        except ValueError:
+            return None
+        self.memory.set(key, value)
+        return value
+
+    def set(self, key: str, value) -> None:
+        self.memory.set(key, value)
+        self.disk.set(key, self.encode(value))
+
+    def delete(self, key: str) -> None:
+        self.memory.delete(key)
+        self.disk.delete(key)
+
+    def stats(self) -> dict:
+        return {
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats()
+        }
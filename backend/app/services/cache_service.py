@@ -0,0 +1,204 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+from app.services.cache_backends import LRUCache, DiskCache, TieredCache
+from app.services.s3_service import get_file_from_s3_async, upload_json_to_s3_async, delete_file_from_s3_async
+
+# Cache configuration
+EXTRACTION_CACHE_ENTRIES = int(os.getenv("EXTRACTION_CACHE_ENTRIES", "32"))
+RESULT_CACHE_ENTRIES = int(os.getenv("RESULT_CACHE_ENTRIES", "256"))
+RESULT_CACHE_PREFIX = "cache/results"
+
+# Gemini responses keyed by model + prompt + generation config (memory tier per
+# process, disk tier shared by all)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(24 * 60 * 60)))  # seconds
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256"))
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", os.path.join(tempfile.gettempdir(), "testcaseai-cache", "llm-responses"))
+LLM_CACHE_DISK_BYTES = int(os.getenv("LLM_CACHE_DISK_BYTES", str(128 * 1024 * 1024)))
+
+# Extraction results keyed by PDF content hash (per worker process)
+_extraction_cache = LRUCache(EXTRACTION_CACHE_ENTRIES)
+# Upload results keyed by content hash + model + prompt version; backed by S3 so
+# all workers share hits
+_result_cache = LRUCache(RESULT_CACHE_ENTRIES)
+# Entries are {"expires_at": ..., "result": ...}; expired entries count as misses
+_llm_response_cache = TieredCache(
+    LRUCache(LLM_CACHE_MEMORY_ENTRIES),
+    DiskCache(LLM_CACHE_DIR, LLM_CACHE_DISK_BYTES),
+    encode=lambda entry: json.dumps(entry).encode("utf-8"),
+    decode=lambda data: json.loads(data.decode("utf-8"))
+)
+_llm_stats = {"hits": 0, "misses": 0, "expired": 0, "bypassed": 0, "stores": 0}
+_llm_stats_lock = threading.Lock()
+
+
+def result_cache_key(content_hash: str, model: str, prompt_version: str) -> str:
+    """
+    Build the result cache key for a PDF and generation configuration.
+
+    Args:
+        content_hash: SHA-256 hex digest of the PDF bytes
+        model: Gemini model name
+        prompt_version: Version of the generation prompt
+
+    Returns:
+        Hex digest identifying the cached result
+    """
+    return hashlib.sha256(f"{content_hash}:{model}:{prompt_version}".encode("utf-8")).hexdigest()
+
+
+def get_cached_extraction(content_hash: str) -> Optional[dict]:
+    """
+    Get a previous extraction result for identical PDF bytes.
+
+    Args:
+        content_hash: SHA-256 hex digest of the PDF bytes
+
+    Returns:
+        Extraction result dict, or None on a miss
+    """
+    return _extraction_cache.get(content_hash)
+
+
+def store_cached_extraction(content_hash: str, extraction_result: dict) -> None:
+    """
+    Remember a successful extraction result for identical PDF bytes.
+    """
+    _extraction_cache.set(content_hash, extraction_result)
+
+
+async def get_cached_result(cache_key: str) -> Optional[dict]:
+    """
+    Look up a cached upload result in memory, then in the shared S3 index.
+
+    Args:
+        cache_key: Key from result_cache_key
+
+    Returns:
+        Cached upload response payload, or None on a miss
+    """
+    cached = _result_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    file_result = await get_file_from_s3_async(f"{RESULT_CACHE_PREFIX}/{cache_key}.json")
+    if not file_result["success"]:
+        return None
+
+    try:
+        cached = json.loads(file_result["content"])
+    except ValueError:
+        return None
+
+    _result_cache.set(cache_key, cached)
+    return cached
+
+
+async def store_cached_result(cache_key: str, payload: dict) -> dict:
+    """
+    Store an upload result in memory and in the shared S3 index.
+
+    Args:
+        cache_key: Key from result_cache_key
+        payload: Upload response payload
+
+    Returns:
+        dict with success status
+    """
+    payload = {**payload, "cached_at": datetime.now().isoformat()}
+    _result_cache.set(cache_key, payload)
+    return await upload_json_to_s3_async(payload, f"{RESULT_CACHE_PREFIX}/{cache_key}.json")
+
+
+async def invalidate_cached_result(cache_key: str) -> None:
+    """
+    Drop a cached upload result (e.g. when its file is deleted).
+    """
+    _result_cache.delete(cache_key)
+    await delete_file_from_s3_async(f"{RESULT_CACHE_PREFIX}/{cache_key}.json")
+
+
+def llm_response_cache_key(model: str, prompt: str, config: dict) -> str:
+    """
+    Build the response cache key for a Gemini request.
+    
+    Args:
+        model: Gemini model name
+        prompt: Full prompt text
+        config: Generation parameters that affect the output (temperature,
+            max_output_tokens, system instruction, ...)
+    
+    Returns:
+        Hex digest of the canonical JSON encoding of the request
+    """
+    canonical = json.dumps({"model": model, "prompt": prompt, "config": config},
+                           sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def get_cached_llm_response(cache_key: str) -> Optional[dict]:
+    """
+    Look up a Gemini response in memory, then on disk.
+    
+    Args:
+        cache_key: Key from llm_response_cache_key
+    
+    Returns:
+        Stored generation result, or None on a miss or expired entry
+    """
+    if not LLM_CACHE_ENABLED:
+        return None
+    
+    entry = _llm_response_cache.get(cache_key)
+    if entry is not None and entry.get("expires_at", 0) <= time.time():
+        _llm_response_cache.delete(cache_key)
+        _count_llm("expired")
+        entry = None
+    
+    _count_llm("hits" if entry is not None else "misses")
+    return entry["result"] if entry is not None else None
+
+
+def store_cached_llm_response(cache_key: str, result: dict) -> None:
+    """
+    Remember a successful Gemini generation result for LLM_CACHE_TTL seconds.
+    """
+    if not LLM_CACHE_ENABLED or "error" in result:
+        return
+    _llm_response_cache.set(cache_key, {"expires_at": time.time() + LLM_CACHE_TTL, "result": result})
+    _count_llm("stores")
+
+
+def record_llm_cache_bypass() -> None:
+    """
+    Count a request that skipped the response cache on purpose.
+    """
+    _count_llm("bypassed")
+
+
+def _count_llm(counter: str) -> None:
+    with _llm_stats_lock:
+        _llm_stats[counter] += 1
+
+
+def get_cache_stats() -> dict:
+    """
+    Get hit/miss statistics for the extraction, result and LLM response caches.
+    """
+    with _llm_stats_lock:
+        llm_stats = dict(_llm_stats)
+    lookups = llm_stats["hits"] + llm_stats["misses"]
+    llm_stats["hit_rate"] = round(llm_stats["hits"] / lookups, 4) if lookups else 0.0
+    llm_stats["ttl_seconds"] = LLM_CACHE_TTL
+    
+    return {
+        "extraction": _extraction_cache.stats(),
+        "result": _result_cache.stats(),
+        "llm_response": {**llm_stats, "tiers": _llm_response_cache.stats()}
+    }
@@ -1,41 +1,133 @@
-import boto3
+import gzip
+import json
 import os
+import time
 from datetime import datetime
-from dotenv import load_dotenv
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+from app.models.testcase import TestSuite
+from app.services.aws_clients import dynamodb, dynamodb_client, warm_connections
+from app.services.executors import dynamodb_executor, run_in_executor
 
-load_dotenv()
-
-# AWS Configuration
-AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
-AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-AWS_REGION = os.getenv("AWS_REGION")
 DYNAMODB_TABLE_NAME = "TestCaseAI-Metadata"
+# History is read newest-first from global secondary indexes instead of table
+# scans. File items carry a constant 'entity' partition key for the all-files
+# index; the status index is partitioned by 'status'. Both sort by created_at.
+FILE_ENTITY = "file"
+HISTORY_INDEX_NAME = "entity-created_at-index"
+STATUS_INDEX_NAME = "status-created_at-index"
+# Index name -> partition key attribute
+HISTORY_INDEXES = {HISTORY_INDEX_NAME: "entity", STATUS_INDEX_NAME: "status"}
+HISTORY_INDEX_ATTRIBUTES = [
+    {'AttributeName': 'entity', 'AttributeType': 'S'},
+    {'AttributeName': 'status', 'AttributeType': 'S'},
+    {'AttributeName': 'created_at', 'AttributeType': 'S'}
+]
+# Attributes copied into the indexes (what the History and Dashboard pages show;
+# an index's own key is projected anyway). An index's projection cannot be
+# changed in place: indexes missing any of these are dropped and rebuilt (see
+# update_history_indexes).
+HISTORY_ATTRIBUTES = [
+    "status", "filename", "pages", "extracted_text_length", "text_truncated", "model_used", "model_tier",
+    "result_version", "prompt_tokens", "completion_tokens", "total_tokens", "test_case_count", "error",
+    "updated_at"
+]
+# Index pages read per history request when filters discard most items
+HISTORY_MAX_PAGES = 10
+# The generated test cases are kept out of the file item, which stays a small
+# summary: they are stored gzip-compressed in a companion item under
+# '{file_id}#testcases'. That item has no entity/status, so it never appears
+# in the history indexes.
+TESTCASE_BODY_ATTRIBUTES = ("test_cases", "test_suite")
+TESTCASE_BODY_SUFFIX = "#testcases"
+# Gemini token usage rolled up per day (partition key) and model (sort key)
+TOKEN_USAGE_TABLE_NAME = os.getenv("TOKEN_USAGE_TABLE_NAME", "TestCaseAI-TokenUsage")
+
+
+def _history_index(name: str) -> dict:
+    return {
+        'IndexName': name,
+        'KeySchema': [
+            {'AttributeName': HISTORY_INDEXES[name], 'KeyType': 'HASH'},
+            {'AttributeName': 'created_at', 'KeyType': 'RANGE'}
+        ],
+        'Projection': {'ProjectionType': 'INCLUDE', 'NonKeyAttributes': _history_index_attributes(name)}
+    }
+
 
-# Initialize DynamoDB client
-dynamodb = boto3.resource(
-    'dynamodb',
-    aws_access_key_id=AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-    region_name=AWS_REGION
-)
+def _history_index_attributes(name: str) -> list:
+    # Key attributes are projected anyway and may not be listed again
+    return [attribute for attribute in HISTORY_ATTRIBUTES if attribute != HISTORY_INDEXES[name]]
+
+
+def _update_history_indexes(table: dict) -> bool:
+    """
+    Take the next step towards current history indexes on an existing table.
+    
+    A missing index is created; an index whose projection lacks some of
+    HISTORY_ATTRIBUTES (other than its key) is deleted, to be created again
+    by a later call. DynamoDB runs one index change at a time, so at most one
+    is requested per call; history reads fall back to a scan until the
+    indexes are active.
+    
+    Returns:
+        True if every history index exists, is active and is current
+    """
+    indexes = {index['IndexName']: index for index in table.get('GlobalSecondaryIndexes', [])}
+    if any(index['IndexStatus'] != 'ACTIVE' for index in indexes.values()):
+        return False
+    for name in HISTORY_INDEXES:
+        if name not in indexes:
+            print(f"Creating DynamoDB index {name} on {DYNAMODB_TABLE_NAME}")
+            dynamodb_client.update_table(
+                TableName=DYNAMODB_TABLE_NAME,
+                AttributeDefinitions=HISTORY_INDEX_ATTRIBUTES,
+                GlobalSecondaryIndexUpdates=[{'Create': _history_index(name)}]
+            )
+            return False
+        projected = indexes[name].get('Projection', {}).get('NonKeyAttributes', [])
+        if not set(_history_index_attributes(name)) <= set(projected):
+            print(f"Rebuilding DynamoDB index {name} on {DYNAMODB_TABLE_NAME} (projection changed)")
+            dynamodb_client.update_table(
+                TableName=DYNAMODB_TABLE_NAME,
+                GlobalSecondaryIndexUpdates=[{'Delete': {'IndexName': name}}]
+            )
+            return False
+    return True
+
+
+def update_history_indexes(wait: bool = False, poll_interval: float = 20) -> bool:
+    """
+    Create missing and rebuild outdated history indexes on the metadata table.
+    
+    Args:
+        wait: Keep stepping (see _update_history_indexes) until every index is
+            current, instead of returning after one step
+        poll_interval: Seconds between checks while waiting
+        
+    Returns:
+        True if every history index is current
+    """
+    while True:
+        table = dynamodb_client.describe_table(TableName=DYNAMODB_TABLE_NAME)['Table']
+        current = _update_history_indexes(table)
+        if current or not wait:
+            return current
+        time.sleep(poll_interval)
 
 
 def create_table_if_not_exists():
     """
     Create DynamoDB table if it doesn't exist.
+    
+    Called once at startup (see ensure_tables), not per request.
     """
     try:
-        dynamodb_client = boto3.client(
-            'dynamodb',
-            aws_access_key_id=AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-            region_name=AWS_REGION
-        )
-        
         # Check if table exists
         try:
-            dynamodb_client.describe_table(TableName=DYNAMODB_TABLE_NAME)
+            table = dynamodb_client.describe_table(TableName=DYNAMODB_TABLE_NAME)['Table']
             print(f"✅ DynamoDB table already exists: {DYNAMODB_TABLE_NAME}")
+            _update_history_indexes(table)
             return True
         except dynamodb_client.exceptions.ResourceNotFoundException:
             print(f"Creating DynamoDB table: {DYNAMODB_TABLE_NAME}")
@@ -48,7 +140,8 @@ def create_table_if_not_exists():
                 ],
                 AttributeDefinitions=[
                     {'AttributeName': 'file_id', 'AttributeType': 'S'}
-                ],
+                ] + HISTORY_INDEX_ATTRIBUTES,
+                GlobalSecondaryIndexes=[_history_index(name) for name in HISTORY_INDEXES],
                 BillingMode='PAY_PER_REQUEST'  # On-demand pricing (free tier friendly)
             )
             
@@ -77,16 +170,21 @@ def save_metadata(file_id: str, metadata: dict) -> dict:
         dict with success status
     """
     try:
-        # Ensure table exists before saving
-        create_table_if_not_exists()
-        
         table = dynamodb.Table(DYNAMODB_TABLE_NAME)
         
         # Add timestamp
         metadata['file_id'] = file_id
+        metadata['entity'] = FILE_ENTITY
         metadata['created_at'] = datetime.now().isoformat()
+        body = _split_testcase_body(metadata)
         
-        table.put_item(Item=metadata)
+        if body is None:
+            table.put_item(Item=metadata)
+        else:
+            # Both puts go out in one BatchWriteItem call
+            with table.batch_writer() as batch:
+                batch.put_item(Item=metadata)
+                batch.put_item(Item=_testcase_body_item(file_id, body))
         
         return {"success": True}
         
@@ -97,25 +195,137 @@ def save_metadata(file_id: str, metadata: dict) -> dict:
         }
 
 
-def get_metadata(file_id: str) -> dict:
+def batch_save_metadata(items: list) -> dict:
     """
-    Retrieve file metadata from DynamoDB.
+    Save metadata for many files with DynamoDB batch writes.
+    
+    Puts are grouped into BatchWriteItem calls of up to 25 items and
+    unprocessed items are retried automatically.
+    
+    Args:
+        items: List of (file_id, metadata) tuples
+        
+    Returns:
+        dict with success status and number of items written
+    """
+    try:
+        table = dynamodb.Table(DYNAMODB_TABLE_NAME)
+        created_at = datetime.now().isoformat()
+        
+        with table.batch_writer(overwrite_by_pkeys=['file_id']) as batch:
+            for file_id, metadata in items:
+                metadata['file_id'] = file_id
+                metadata['entity'] = FILE_ENTITY
+                metadata['created_at'] = created_at
+                body = _split_testcase_body(metadata)
+                batch.put_item(Item=metadata)
+                if body is not None:
+                    batch.put_item(Item=_testcase_body_item(file_id, body))
+        
+        return {"success": True, "count": len(items)}
+        
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"Failed to batch save metadata: {str(e)}"
+        }
+
+
+def update_metadata(file_id: str, updates: dict, expected: dict = None) -> dict:
+    """
+    Update selected attributes of an existing file's metadata.
+    
+    Unlike save_metadata, the rest of the item (including created_at) is left
+    as is. Passing test_cases/test_suite replaces the stored test case body
+    (an omitted one is cleared) and drops any copy still inline in the item.
     
     Args:
         file_id: Unique file identifier
+        updates: Attributes to set
+        expected: Attribute values the item must still have for the update to
+            apply (None: the attribute must be absent), for optimistic locking
         
     Returns:
-        dict with metadata or error
+        dict with success status; 'conflict' is True when the item no longer
+        exists or no longer matches expected
     """
     try:
         table = dynamodb.Table(DYNAMODB_TABLE_NAME)
         
-        response = table.get_item(Key={'file_id': file_id})
+        updates = {**updates, 'updated_at': datetime.now().isoformat()}
+        body = _split_testcase_body(updates)
+        names = {f"#a{index}": key for index, key in enumerate(updates)}
+        values = {f":v{index}": value for index, value in enumerate(updates.values())}
+        expression = "SET " + ", ".join(f"#a{index} = :v{index}" for index in range(len(updates)))
+        if body is not None:
+            # Items written before the split kept the test cases inline
+            names.update({f"#r{index}": key for index, key in enumerate(TESTCASE_BODY_ATTRIBUTES)})
+            expression += " REMOVE " + ", ".join(f"#r{index}" for index in range(len(TESTCASE_BODY_ATTRIBUTES)))
         
-        if 'Item' in response:
+        condition = "attribute_exists(file_id)"
+        for index, (key, value) in enumerate((expected or {}).items()):
+            names[f"#c{index}"] = key
+            if value is None:
+                condition += f" AND attribute_not_exists(#c{index})"
+            else:
+                values[f":c{index}"] = value
+                condition += f" AND #c{index} = :c{index}"
+        
+        table.update_item(
+            Key={'file_id': file_id},
+            UpdateExpression=expression,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+            ConditionExpression=condition
+        )
+        if body is not None:
+            table.put_item(Item=_testcase_body_item(file_id, body))
+        
+        return {"success": True}
+        
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            return {
+                "success": False,
+                "error": f"Failed to update metadata: {str(e)}"
+            }
+        return {
+            "success": False,
+            "conflict": True,
+            "error": "File was deleted or changed by another request"
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"Failed to update metadata: {str(e)}"
+        }
+
+
+def get_metadata(file_id: str, include_test_cases: bool = False) -> dict:
+    """
+    Retrieve file metadata from DynamoDB.
+    
+    Args:
+        file_id: Unique file identifier
+        include_test_cases: Also read the stored test cases (test_cases and
+            test_suite); otherwise only the summary item is read
+        
+    Returns:
+        dict with metadata or error
+    """
+    try:
+        if include_test_cases:
+            items = _get_items([file_id, f"{file_id}{TESTCASE_BODY_SUFFIX}"])
+            item = items.get(file_id)
+            if item is not None and f"{file_id}{TESTCASE_BODY_SUFFIX}" in items:
+                item.update(_read_testcase_body(items[f"{file_id}{TESTCASE_BODY_SUFFIX}"]))
+        else:
+            item = dynamodb.Table(DYNAMODB_TABLE_NAME).get_item(Key={'file_id': file_id}).get('Item')
+        
+        if item is not None:
             return {
                 "success": True,
-                "metadata": response['Item']
+                "metadata": item
             }
         else:
             return {
@@ -130,28 +340,138 @@ def get_metadata(file_id: str) -> dict:
         }
 
 
-def list_all_files(limit: int = 100) -> dict:
+def _split_testcase_body(metadata: dict):
+    """
+    Move the test case attributes out of a metadata dict (in place).
+    
+    Returns:
+        The removed attributes, or None if there were none; a test_case_count
+        summary is added to the metadata in their place
+    """
+    body = {key: metadata.pop(key) for key in TESTCASE_BODY_ATTRIBUTES if key in metadata}
+    if not body:
+        return None
+    
+    if body.get("test_suite"):
+        metadata['test_case_count'] = len(body["test_suite"].get("test_cases", []))
+    elif body.get("test_cases"):
+        metadata['test_case_count'] = len(TestSuite.from_markdown(body["test_cases"]).test_cases)
+    else:
+        metadata['test_case_count'] = 0
+    return body
+
+
+def _testcase_body_item(file_id: str, body: dict) -> dict:
+    return {
+        'file_id': f"{file_id}{TESTCASE_BODY_SUFFIX}",
+        'body': gzip.compress(json.dumps(body, default=str).encode('utf-8')),
+        'encoding': "gzip"
+    }
+
+
+def _read_testcase_body(item: dict) -> dict:
+    # Binary attributes come back wrapped in boto3's Binary type
+    return json.loads(gzip.decompress(bytes(item['body'])).decode('utf-8'))
+
+
+def _get_items(file_ids: list) -> dict:
     """
-    List all files from DynamoDB.
+    Read items by key in one BatchGetItem call (retrying unprocessed keys).
+    
+    Returns:
+        dict of file_id -> item for the items that exist
+    """
+    items = {}
+    request = {DYNAMODB_TABLE_NAME: {'Keys': [{'file_id': file_id} for file_id in file_ids]}}
+    while request:
+        response = dynamodb.batch_get_item(RequestItems=request)
+        for item in response.get('Responses', {}).get(DYNAMODB_TABLE_NAME, []):
+            items[item['file_id']] = item
+        request = response.get('UnprocessedKeys')
+    return items
+
+
+def _history_projection() -> dict:
+    # Only attributes both indexes project ('entity' is not in the status index)
+    attributes = ["file_id", "created_at"] + HISTORY_ATTRIBUTES
+    return {
+        'ProjectionExpression': ", ".join(f"#p{index}" for index in range(len(attributes))),
+        'ExpressionAttributeNames': {f"#p{index}": attribute for index, attribute in enumerate(attributes)}
+    }
+
+
+def list_all_files(limit: int = 100, start_key: dict = None, status: str = None, created_from: str = None,
+                   created_to: str = None, filename_prefix: str = None) -> dict:
+    """
+    List files newest first from the history indexes.
+    
+    Status and date range filters are index key conditions; the filename
+    prefix is applied as a filter on the index items. Only HISTORY_ATTRIBUTES
+    (plus the keys) are read, from the indexes and the fallback scan alike.
+    Until the indexes are active the table is scanned page by page instead,
+    in table order (newest first within each page).
     
     Args:
         limit: Maximum number of items to return
+        start_key: 'last_key' of the previous page
+        status: Only files with this status (e.g. success, partial_success)
+        created_from: Earliest created_at (ISO date or timestamp, inclusive)
+        created_to: Latest created_at (ISO date or timestamp, inclusive)
+        filename_prefix: Only files whose name starts with this (case-sensitive)
         
     Returns:
-        dict with list of files
+        dict with list of files and 'last_key' (None on the last page)
     """
     try:
-        # Ensure table exists
-        create_table_if_not_exists()
-        
         table = dynamodb.Table(DYNAMODB_TABLE_NAME)
         
-        response = table.scan(Limit=limit)
+        if status:
+            index_name, key_condition = STATUS_INDEX_NAME, Key('status').eq(status)
+        else:
+            index_name, key_condition = HISTORY_INDEX_NAME, Key('entity').eq(FILE_ENTITY)
+        if created_to and len(created_to) == 10:
+            # A date alone includes the whole day
+            created_to = f"{created_to}T23:59:59.999999"
+        if created_from and created_to:
+            key_condition &= Key('created_at').between(created_from, created_to)
+        elif created_from:
+            key_condition &= Key('created_at').gte(created_from)
+        elif created_to:
+            key_condition &= Key('created_at').lte(created_to)
+        
+        query = {
+            'IndexName': index_name,
+            'KeyConditionExpression': key_condition,
+            'ScanIndexForward': False,
+            **_history_projection()
+        }
+        if filename_prefix:
+            query['FilterExpression'] = Attr('filename').begins_with(filename_prefix)
+        
+        try:
+            if start_key and set(start_key) == {'file_id'}:
+                # A cursor from the fallback scan: keep scanning
+                files, last_key = _scan_history(table, limit, start_key, status, created_from, created_to,
+                                                filename_prefix)
+            else:
+                files, last_key = _query_pages(table, query, limit, start_key)
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ValidationException':
+                raise
+            if start_key:
+                raise RuntimeError(
+                    f"History index {index_name} is unavailable; run backfill_history_index.py to build it "
+                    f"and start again from the first page ({str(e)})"
+                )
+            # Index not built yet (see update_history_indexes)
+            print(f"Warning: History index unavailable, scanning instead: {str(e)}")
+            files, last_key = _scan_history(table, limit, None, status, created_from, created_to, filename_prefix)
         
         return {
             "success": True,
-            "files": response.get('Items', []),
-            "count": len(response.get('Items', []))
+            "files": files,
+            "count": len(files),
+            "last_key": last_key
         }
         
     except Exception as e:
@@ -160,7 +480,111 @@ def list_all_files(limit: int = 100) -> dict:
             "success": False,
             "error": f"Failed to list files: {str(e)}",
             "files": [],
-            "count": 0
+            "count": 0,
+            "last_key": None
+        }
+
+
+def _query_pages(table, query: dict, limit: int, start_key: dict = None) -> tuple:
+    """
+    Query an index until `limit` items pass the filter, the index is
+    exhausted or HISTORY_MAX_PAGES pages have been read.
+    
+    Each page asks for at most the number of items still missing, so the
+    returned key never skips items that were not returned.
+    """
+    return _read_pages(table.query, query, limit, start_key)
+
+
+def _read_pages(read, request: dict, limit: int, start_key: dict = None) -> tuple:
+    files = []
+    for _ in range(HISTORY_MAX_PAGES):
+        if start_key:
+            request['ExclusiveStartKey'] = start_key
+        response = read(Limit=limit - len(files), **request)
+        files.extend(response.get('Items', []))
+        start_key = response.get('LastEvaluatedKey')
+        if not start_key or len(files) >= limit:
+            break
+    return files, start_key
+
+
+def _scan_history(table, limit: int, start_key: dict = None, status: str = None, created_from: str = None,
+                  created_to: str = None, filename_prefix: str = None) -> tuple:
+    """
+    Read one page of history by scanning the table, bounded like _query_pages.
+    
+    Returns:
+        (files newest first, scan key to continue from or None)
+    """
+    # created_at also leaves out the test case body items
+    filters = Attr('entity').eq(FILE_ENTITY) | (Attr('entity').not_exists() & Attr('created_at').exists())
+    if status:
+        filters &= Attr('status').eq(status)
+    if created_from:
+        filters &= Attr('created_at').gte(created_from)
+    if created_to:
+        filters &= Attr('created_at').lte(created_to)
+    if filename_prefix:
+        filters &= Attr('filename').begins_with(filename_prefix)
+    
+    scan = {'FilterExpression': filters, **_history_projection()}
+    files, last_key = _read_pages(table.scan, scan, limit, start_key)
+    return sorted(files, key=lambda item: item.get('created_at', ''), reverse=True), last_key
+
+
+def backfill_history_index() -> dict:
+    """
+    Bring file items written before the history indexes existed up to date.
+    
+    Adds the 'entity' key so they appear in the all-files index, and moves
+    test cases still stored inline into their own item, leaving the
+    test_case_count summary the indexes project.
+    
+    Returns:
+        dict with success status and number of items updated
+    """
+    try:
+        table = dynamodb.Table(DYNAMODB_TABLE_NAME)
+        
+        updated = 0
+        scan = {
+            'ProjectionExpression': ", ".join(f"#p{index}" for index in range(len(TESTCASE_BODY_ATTRIBUTES) + 2)),
+            'ExpressionAttributeNames': {
+                f"#p{index}": key for index, key in enumerate(["file_id", "entity", *TESTCASE_BODY_ATTRIBUTES])
+            },
+            'FilterExpression': Attr('created_at').exists() & (
+                Attr('entity').not_exists() | Attr('test_cases').exists() | Attr('test_suite').exists()
+            )
+        }
+        while True:
+            response = table.scan(**scan)
+            for item in response.get('Items', []):
+                updates = {'entity': FILE_ENTITY}
+                body = _split_testcase_body(item)
+                expression = "SET #entity = :entity"
+                if body is not None:
+                    # Write the body item first so an interrupted run loses nothing
+                    table.put_item(Item=_testcase_body_item(item['file_id'], body))
+                    updates['test_case_count'] = item['test_case_count']
+                    expression += ", #test_case_count = :test_case_count REMOVE " + ", ".join(TESTCASE_BODY_ATTRIBUTES)
+                table.update_item(
+                    Key={'file_id': item['file_id']},
+                    UpdateExpression=expression,
+                    ExpressionAttributeNames={f"#{key}": key for key in updates},
+                    ExpressionAttributeValues={f":{key}": value for key, value in updates.items()}
+                )
+                updated += 1
+            if 'LastEvaluatedKey' not in response:
+                break
+            scan['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        
+        return {"success": True, "updated": updated}
+        
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"Failed to backfill history index: {str(e)}"
         }
 
 
@@ -192,9 +616,9 @@ def delete_metadata(file_id: str) -> dict:
     try:
         table = dynamodb.Table(DYNAMODB_TABLE_NAME)
         
-        table.delete_item(
-            Key={'file_id': file_id}
-        )
+        with table.batch_writer() as batch:
+            batch.delete_item(Key={'file_id': file_id})
+            batch.delete_item(Key={'file_id': f"{file_id}{TESTCASE_BODY_SUFFIX}"})
         
         return {
             "success": True,
@@ -206,3 +630,187 @@ def delete_metadata(file_id: str) -> dict:
             "success": False,
             "error": f"Failed to delete metadata: {str(e)}"
         }
+
+
+def create_token_usage_table_if_not_exists() -> bool:
+    """
+    Create the token usage rollup table if it doesn't exist.
+    """
+    try:
+        try:
+            dynamodb_client.describe_table(TableName=TOKEN_USAGE_TABLE_NAME)
+            return True
+        except dynamodb_client.exceptions.ResourceNotFoundException:
+            print(f"Creating DynamoDB table: {TOKEN_USAGE_TABLE_NAME}")
+            dynamodb_client.create_table(
+                TableName=TOKEN_USAGE_TABLE_NAME,
+                KeySchema=[
+                    {'AttributeName': 'day', 'KeyType': 'HASH'},
+                    {'AttributeName': 'model', 'KeyType': 'RANGE'}
+                ],
+                AttributeDefinitions=[
+                    {'AttributeName': 'day', 'AttributeType': 'S'},
+                    {'AttributeName': 'model', 'AttributeType': 'S'}
+                ],
+                BillingMode='PAY_PER_REQUEST'
+            )
+            dynamodb_client.get_waiter('table_exists').wait(TableName=TOKEN_USAGE_TABLE_NAME)
+            print(f"✅ DynamoDB table created: {TOKEN_USAGE_TABLE_NAME}")
+            return True
+            
+    except Exception as e:
+        print(f"❌ DynamoDB table creation failed: {str(e)}")
+        return False
+
+
+_token_usage_table_ready = False
+
+
+def ensure_tables() -> bool:
+    """
+    Check (and create if missing) the metadata and token usage tables.
+    
+    Run once at application startup; request handlers assume both exist.
+    
+    Returns:
+        True if both tables are ready, False otherwise
+    """
+    global _token_usage_table_ready
+    _token_usage_table_ready = create_token_usage_table_if_not_exists()
+    return create_table_if_not_exists() and _token_usage_table_ready
+
+
+def warm_dynamodb_connections() -> None:
+    """
+    Open the shared DynamoDB client's pooled connections before the first request.
+    
+    DescribeEndpoints is free and not subject to table throughput.
+    """
+    warm_connections(dynamodb_client.describe_endpoints)
+
+
+def add_token_usage(day: str, model: str, counters: dict) -> dict:
+    """
+    Atomically add one Gemini call's token counts to a day/model rollup.
+    
+    Args:
+        day: Date (YYYY-MM-DD)
+        model: Gemini model name
+        counters: Token counts to add (e.g. prompt_tokens, completion_tokens)
+        
+    Returns:
+        dict with success status
+    """
+    global _token_usage_table_ready
+    try:
+        if not _token_usage_table_ready:
+            _token_usage_table_ready = create_token_usage_table_if_not_exists()
+        
+        table = dynamodb.Table(TOKEN_USAGE_TABLE_NAME)
+        counters = {"requests": 1, **counters}
+        names = {f"#c{index}": key for index, key in enumerate(counters)}
+        values = {f":c{index}": int(value) for index, value in enumerate(counters.values())}
+        
+        table.update_item(
+            Key={'day': day, 'model': model},
+            UpdateExpression="ADD " + ", ".join(f"#c{index} :c{index}" for index in range(len(counters)))
+                             + " SET updated_at = :now",
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues={**values, ":now": datetime.now().isoformat()}
+        )
+        
+        return {"success": True}
+        
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"Failed to record token usage: {str(e)}"
+        }
+
+
+def get_token_usage(days: list) -> dict:
+    """
+    Get the per-model token usage rollups for the given days.
+    
+    Args:
+        days: Dates (YYYY-MM-DD)
+        
+    Returns:
+        dict with the rollup items
+    """
+    try:
+        table = dynamodb.Table(TOKEN_USAGE_TABLE_NAME)
+        
+        items = []
+        for day in days:
+            response = table.query(KeyConditionExpression=Key('day').eq(day))
+            items.extend(response.get('Items', []))
+        
+        return {"success": True, "items": items}
+        
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"Failed to get token usage: {str(e)}",
+            "items": []
+        }
+
+
+async def save_metadata_async(file_id: str, metadata: dict) -> dict:
+    """
+    Async counterpart of save_metadata, run on the dedicated DynamoDB executor.
+    """
+    return await run_in_executor(dynamodb_executor, save_metadata, file_id, metadata)
+
+
+async def batch_save_metadata_async(items: list) -> dict:
+    """
+    Async counterpart of batch_save_metadata, run on the dedicated DynamoDB executor.
+    """
+    return await run_in_executor(dynamodb_executor, batch_save_metadata, items)
+
+
+async def update_metadata_async(file_id: str, updates: dict, expected: dict = None) -> dict:
+    """
+    Async counterpart of update_metadata, run on the dedicated DynamoDB executor.
+    """
+    return await run_in_executor(dynamodb_executor, update_metadata, file_id, updates, expected)
+
+
+async def get_metadata_async(file_id: str, include_test_cases: bool = False) -> dict:
+    """
+    Async counterpart of get_metadata, run on the dedicated DynamoDB executor.
+    """
+    return await run_in_executor(dynamodb_executor, get_metadata, file_id, include_test_cases)
+
+
+async def list_all_files_async(limit: int = 100, start_key: dict = None, status: str = None,
+                               created_from: str = None, created_to: str = None,
+                               filename_prefix: str = None) -> dict:
+    """
+    Async counterpart of list_all_files, run on the dedicated DynamoDB executor.
+    """
+    return await run_in_executor(
+        dynamodb_executor, list_all_files, limit, start_key, status, created_from, created_to, filename_prefix
+    )
+
+
+async def delete_metadata_async(file_id: str) -> dict:
+    """
+    Async counterpart of delete_metadata, run on the dedicated DynamoDB executor.
+    """
+    return await run_in_executor(dynamodb_executor, delete_metadata, file_id)
+
+
+async def add_token_usage_async(day: str, model: str, counters: dict) -> dict:
+    """
+    Async counterpart of add_token_usage, run on the dedicated DynamoDB executor.
+    """
+    return await run_in_executor(dynamodb_executor, add_token_usage, day, model, counters)
+
+
+async def get_token_usage_async(days: list) -> dict:
+    """
+    Async counterpart of get_token_usage, run on the dedicated DynamoDB executor.
+    """
+    return await run_in_executor(dynamodb_executor, get_token_usage, days)
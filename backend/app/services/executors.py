@@ -0,0 +1,38 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Thread pool sizes, one pool per blocking dependency so a burst of slow work
+# on one (e.g. PDF parsing) cannot starve the others (e.g. S3 I/O)
+PDF_EXECUTOR_WORKERS = int(os.getenv("PDF_EXECUTOR_WORKERS", "2"))
+S3_EXECUTOR_WORKERS = int(os.getenv("S3_EXECUTOR_WORKERS", "8"))
+DYNAMODB_EXECUTOR_WORKERS = int(os.getenv("DYNAMODB_EXECUTOR_WORKERS", "8"))
+
+pdf_executor = ThreadPoolExecutor(max_workers=PDF_EXECUTOR_WORKERS, thread_name_prefix="pdf")
+s3_executor = ThreadPoolExecutor(max_workers=S3_EXECUTOR_WORKERS, thread_name_prefix="s3")
+dynamodb_executor = ThreadPoolExecutor(max_workers=DYNAMODB_EXECUTOR_WORKERS, thread_name_prefix="dynamodb")
+
+
+async def run_in_executor(executor: ThreadPoolExecutor, func, *args, **kwargs):
+    """
+    Run a blocking function on a dedicated executor without blocking the event loop.
+
+    Args:
+        executor: Executor to run the function on
+        func: Blocking callable
+        *args, **kwargs: Arguments passed to the callable
+
+    Returns:
+        The callable's return value
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+
+def shutdown_executors(wait: bool = True) -> None:
+    """
+    Shut down all dedicated executors.
+    """
+    for executor in (pdf_executor, s3_executor, dynamodb_executor):
+        executor.shutdown(wait=wait)
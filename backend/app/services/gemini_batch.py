@@ -0,0 +1,416 @@
+import json
+import os
+import re
+from abc import ABC, abstractmethod
+import tempfile
+import time
+from datetime import datetime
+from decimal import Decimal
+from typing import List, Optional
+import requests
+from app.services.gemini_service import (
+    API_KEY,
+    CHARS_PER_TOKEN,
+    DEFAULT_TEMPERATURE,
+    MAX_GENERATION_CHUNKS,
+    PROMPT_CHAR_BUDGET,
+    build_healthcare_prompt,
+    build_rest_request,
+    merge_testcase_results,
+    output_budget,
+    parse_rest_response,
+    route_model,
+    split_document,
+)
+from app.services.s3_service import delete_file_from_s3, get_extracted_text_from_s3, upload_testcases_to_s3
+from app.services.cache_service import RESULT_CACHE_PREFIX
+from app.services.dynamodb_service import get_metadata, list_all_files, update_metadata, add_token_usage
+from app.services.token_accounting import TOKEN_COUNTERS, usage_attributes
+
+# Bulk (offline) generation through the Gemini Batch API: requests are written
+# to a JSONL file per model, submitted as one batch job each and polled until
+# they finish. Batch jobs are billed at a discount and do not count against
+# the interactive per-minute quotas.
+BATCH_API_BASE = os.getenv("GEMINI_BATCH_API_BASE", "https://generativelanguage.googleapis.com")
+BATCH_DIR = os.getenv("GEMINI_BATCH_DIR", os.path.join(tempfile.gettempdir(), "testcaseai-batches"))
+BATCH_POLL_INTERVAL = int(os.getenv("GEMINI_BATCH_POLL_INTERVAL", "60"))  # seconds
+BATCH_TIMEOUT = int(os.getenv("GEMINI_BATCH_TIMEOUT", "86400"))  # seconds
+BATCH_HTTP_TIMEOUT = 120  # seconds
+
+BATCH_SUCCEEDED = "BATCH_STATE_SUCCEEDED"
+BATCH_TERMINAL_STATES = {BATCH_SUCCEEDED, "BATCH_STATE_FAILED", "BATCH_STATE_CANCELLED", "BATCH_STATE_EXPIRED"}
+
+
+class BatchTransport(ABC):
+    """
+    How batch jobs reach Gemini.
+
+    HttpBatchTransport talks to the Gemini REST API, or to a stand-in server
+    when given another base URL. Batch jobs are described as dicts with
+    'name', 'state' and, once finished, 'responses_file' (and 'error' if
+    the job failed).
+    """
+
+    @abstractmethod
+    def upload_file(self, path: str, display_name: str) -> str:
+        """Upload a JSONL request file; returns its file name (files/...)."""
+
+    @abstractmethod
+    def create_batch(self, model: str, file_name: str, display_name: str) -> dict:
+        """Start a batch job over an uploaded request file."""
+
+    @abstractmethod
+    def get_batch(self, name: str) -> dict:
+        """Get the current state of a batch job."""
+
+    @abstractmethod
+    def download_file(self, file_name: str) -> bytes:
+        """Download a finished job's JSONL responses file."""
+
+
+class HttpBatchTransport(BatchTransport):
+    """
+    Batch transport over the Gemini REST API (Files API upload, then
+    models.batchGenerateContent and batches.get).
+    """
+
+    def __init__(self, base_url: str = BATCH_API_BASE, api_key: str = API_KEY,
+                 session: Optional[requests.Session] = None):
+        self.base_url = base_url.rstrip("/")
+        self.session = session or requests.Session()
+        self.session.headers["x-goog-api-key"] = api_key
+
+    def upload_file(self, path: str, display_name: str) -> str:
+        with open(path, "rb") as f:
+            content = f.read()
+
+        # Resumable upload: start a session, then send the bytes and finalize
+        start = self.session.post(
+            f"{self.base_url}/upload/v1beta/files",
+            headers={
+                "X-Goog-Upload-Protocol": "resumable",
+                "X-Goog-Upload-Command": "start",
+                "X-Goog-Upload-Header-Content-Length": str(len(content)),
+                "X-Goog-Upload-Header-Content-Type": "application/jsonl"
+            },
+            json={"file": {"display_name": display_name}},
+            timeout=BATCH_HTTP_TIMEOUT
+        )
+        start.raise_for_status()
+
+        upload = self.session.post(
+            start.headers["X-Goog-Upload-URL"],
+            headers={"X-Goog-Upload-Offset": "0", "X-Goog-Upload-Command": "upload, finalize"},
+            data=content,
+            timeout=BATCH_HTTP_TIMEOUT
+        )
+        upload.raise_for_status()
+        return upload.json()["file"]["name"]
+
+    def create_batch(self, model: str, file_name: str, display_name: str) -> dict:
+        response = self.session.post(
+            f"{self.base_url}/v1beta/{_model_resource(model)}:batchGenerateContent",
+            json={"batch": {"display_name": display_name, "input_config": {"file_name": file_name}}},
+            timeout=BATCH_HTTP_TIMEOUT
+        )
+        response.raise_for_status()
+        return _batch_info(response.json())
+
+    def get_batch(self, name: str) -> dict:
+        response = self.session.get(f"{self.base_url}/v1beta/{name}", timeout=BATCH_HTTP_TIMEOUT)
+        response.raise_for_status()
+        return _batch_info(response.json())
+
+    def download_file(self, file_name: str) -> bytes:
+        response = self.session.get(
+            f"{self.base_url}/download/v1beta/{file_name}:download",
+            params={"alt": "media"},
+            timeout=BATCH_HTTP_TIMEOUT
+        )
+        response.raise_for_status()
+        return response.content
+
+
+def _batch_info(operation: dict) -> dict:
+    """
+    Flatten a batch operation (name, metadata.state, output file) into a job dict.
+    """
+    batch = operation.get("metadata") or {}
+    output = batch.get("output") or operation.get("response") or {}
+    info = {
+        "name": operation.get("name") or batch.get("name"),
+        "state": batch.get("state", "BATCH_STATE_PENDING"),
+        "responses_file": output.get("responsesFile") or output.get("responses_file")
+    }
+    if operation.get("error"):
+        info["error"] = operation["error"].get("message", str(operation["error"]))
+    return info
+
+
+def prepare_batch_requests(file_ids: Optional[List[str]] = None, limit: int = 100, depth: str = "standard",
+                           model: Optional[str] = None) -> dict:
+    """
+    Build batch request lines for files with stored extracted text.
+
+    Documents longer than PROMPT_CHAR_BUDGET are split into chunks as in
+    generate_healthcare_testcases_chunked (one request per chunk, keyed
+    '{file_id}#{index}'). Each document is routed to a model once; fallback
+    tiers do not apply in batch mode.
+
+    Args:
+        file_ids: Files to regenerate (default: up to `limit` files from the history)
+        limit: Maximum files when file_ids is not given
+        depth: Requested analysis depth, one of GENERATION_DEPTHS
+        model: Explicit model override
+
+    Returns:
+        dict with 'requests' (per model, lists of JSONL lines), 'files'
+        (file_id -> metadata and chunk count) and 'skipped' (file_id -> reason)
+    """
+    if not file_ids:
+        # History items are index projections; the full items are read below
+        listing = list_all_files(limit)
+        if not listing["success"]:
+            return {"success": False, "error": listing["error"]}
+        file_ids = [item["file_id"] for item in listing["files"]]
+
+    candidates = []
+    for file_id in file_ids:
+        metadata_result = get_metadata(file_id)
+        candidates.append(metadata_result["metadata"] if metadata_result["success"] else {"file_id": file_id})
+
+    batch_requests = {}
+    files = {}
+    skipped = {}
+    for metadata in candidates:
+        file_id = metadata["file_id"]
+        if not metadata.get("extracted_text_url"):
+            skipped[file_id] = "no stored extracted text" if metadata.get("filename") else "file not found"
+            continue
+        text_result = get_extracted_text_from_s3(metadata["extracted_text_url"].split('/', 3)[3])
+        if not text_result["success"]:
+            skipped[file_id] = text_result["error"]
+            continue
+
+        text = text_result["text"]
+        chunks = split_document(text)[:MAX_GENERATION_CHUNKS] if len(text) > PROMPT_CHAR_BUDGET else [text]
+        route = route_model(len(text), depth, model)[0]
+        budgets = []
+        for index, chunk in enumerate(chunks, start=1):
+            part = (index, len(chunks)) if len(chunks) > 1 else None
+            prompt_tokens = len(build_healthcare_prompt(chunk, part)) // CHARS_PER_TOKEN
+            budgets.append(output_budget(prompt_tokens, route["max_output_tokens"]))
+            request = build_rest_request(chunk, part, max_output_tokens=budgets[-1])
+            batch_requests.setdefault(route["model"], []).append(
+                json.dumps({"key": f"{file_id}#{index}", "request": request})
+            )
+        files[file_id] = {"metadata": metadata, "chunks": len(chunks), "model": route["model"], "tier": route["tier"],
+                          "max_output_tokens": max(budgets)}
+
+    return {"success": True, "requests": batch_requests, "files": files, "skipped": skipped}
+
+
+def _model_resource(model: str) -> str:
+    # Bare names are base models; 'models/...' and 'tunedModels/...' are used as given
+    return model if "/" in model else f"models/{model}"
+
+
+def write_batch_file(model: str, lines: List[str], batch_dir: str = BATCH_DIR) -> str:
+    """
+    Write batch request lines to a JSONL file; returns its path.
+    """
+    os.makedirs(batch_dir, exist_ok=True)
+    # Model names may be resource paths ('models/...', 'tunedModels/...')
+    safe_model = re.sub(r"[^A-Za-z0-9._-]", "_", model)
+    path = os.path.join(batch_dir, f"requests-{safe_model}-{datetime.now().strftime('%Y%m%dT%H%M%S')}.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return path
+
+
+def wait_for_batch(transport: BatchTransport, name: str, poll_interval: float = BATCH_POLL_INTERVAL,
+                   timeout: float = BATCH_TIMEOUT) -> dict:
+    """
+    Poll a batch job until it reaches a terminal state or timeout expires.
+
+    Returns:
+        The last job dict seen (its state is not terminal on timeout)
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        job = transport.get_batch(name)
+        if job["state"] in BATCH_TERMINAL_STATES or time.monotonic() >= deadline:
+            return job
+        print(f"Batch {name}: {job['state']}")
+        time.sleep(poll_interval)
+
+
+def read_batch_results(content: bytes, model: str) -> dict:
+    """
+    Parse a JSONL responses file into generation results by request key.
+    """
+    results = {}
+    for line in content.decode("utf-8").splitlines():
+        if not line.strip():
+            continue
+        entry = json.loads(line)
+        key = entry.get("key")
+        if "response" in entry:
+            results[key] = parse_rest_response(entry["response"], model)
+        else:
+            error = entry.get("error") or entry.get("status") or {}
+            message = error.get("message", str(error)) if isinstance(error, dict) else str(error)
+            results[key] = {"text": f"Error: {message}", "model": model, "usage": {}, "status": "error",
+                            "error": f"Test case generation failed: {message}"}
+    return results
+
+
+def store_batch_result(file_id: str, metadata: dict, result: dict, depth: str, batch_name: str) -> dict:
+    """
+    Save one file's batch result as a new result version, as
+    POST /file/{file_id}/regenerate does (earlier versions are kept).
+
+    The file's upload result cache entry is dropped from the shared S3 index
+    so identical re-uploads are reprocessed (copies already held in running
+    API workers' memory are only evicted by their LRU).
+    """
+    version = int(metadata.get("result_version", 1)) + 1
+    filename = metadata.get("filename", "document.pdf")
+    uploads = [upload_testcases_to_s3(result, filename, file_id, format_type=format_type, version=version)
+               for format_type in ("json", "markdown")]
+    for upload_result in uploads:
+        if not upload_result["success"]:
+            return upload_result
+
+    result_versions = list(metadata.get("result_versions", []))
+    if metadata.get("testcases_json_url") or metadata.get("testcases_md_url"):
+        result_versions.append({
+            "version": int(metadata.get("result_version", 1)),
+            "model_used": metadata.get("model_used"),
+            "model_tier": metadata.get("model_tier"),
+            "testcases_json_url": metadata.get("testcases_json_url"),
+            "testcases_md_url": metadata.get("testcases_md_url")
+        })
+
+    update_result = update_metadata(file_id, {
+        "testcases_json_url": uploads[0]["s3_url"],
+        "testcases_md_url": uploads[1]["s3_url"],
+        "result_version": version,
+        "result_versions": result_versions,
+        "test_cases": result.get("text", ""),
+        "test_suite": result.get("test_suite"),
+        "model_used": result.get("model"),
+        "model_tier": result.get("tier"),
+        "fallback_from": None,
+        "token_usage": result.get("usage", {}),
+        **usage_attributes(result.get("usage")),
+        "generation_config": {
+            "temperature": Decimal(str(DEFAULT_TEMPERATURE)),
+            "max_output_tokens": result.get("max_output_tokens"),
+            "depth": depth,
+            "mode": "batch"
+        },
+        "batch_job": batch_name,
+        "testcase_revision": int(metadata.get("testcase_revision", 0)) + 1,
+        "regenerated_at": datetime.now().isoformat()
+    })
+    if update_result["success"] and metadata.get("cache_key"):
+        delete_file_from_s3(f"{RESULT_CACHE_PREFIX}/{metadata['cache_key']}.json")
+    return update_result
+
+
+def run_batch(file_ids: Optional[List[str]] = None, limit: int = 100, depth: str = "standard",
+              model: Optional[str] = None, transport: Optional[BatchTransport] = None,
+              poll_interval: float = BATCH_POLL_INTERVAL, timeout: float = BATCH_TIMEOUT,
+              batch_dir: str = BATCH_DIR) -> dict:
+    """
+    Regenerate test cases for many files through the Gemini Batch API.
+
+    Requests are collected with prepare_batch_requests, written to one JSONL
+    file per model, uploaded and submitted, and polled until every job
+    finishes. Each file's chunk results are merged (merge_testcase_results)
+    and saved as a new result version with upload_testcases_to_s3 and
+    update_metadata; token usage is added to the daily rollups per job.
+
+    Args:
+        file_ids, limit, depth, model: See prepare_batch_requests
+        transport: Batch transport (default: HttpBatchTransport)
+        poll_interval: Seconds between job status checks
+        timeout: Seconds to wait for each job
+        batch_dir: Where request and response files are kept
+
+    Returns:
+        dict with the jobs, the file IDs that were updated and the failures
+    """
+    prepared = prepare_batch_requests(file_ids, limit, depth, model)
+    if not prepared["success"]:
+        return prepared
+
+    transport = transport or HttpBatchTransport()
+    display_name = f"testcaseai-{datetime.now().strftime('%Y%m%dT%H%M%S')}"
+    jobs = []
+    job_errors = {}
+    results = {}
+    for model_name, lines in prepared["requests"].items():
+        path = write_batch_file(model_name, lines, batch_dir)
+        try:
+            file_name = transport.upload_file(path, display_name)
+            job = transport.create_batch(model_name, file_name, display_name)
+            print(f"Submitted batch {job['name']} ({len(lines)} requests to {model_name})")
+            job = wait_for_batch(transport, job["name"], poll_interval, timeout)
+            if job["state"] != BATCH_SUCCEEDED or not job.get("responses_file"):
+                raise RuntimeError(job.get("error") or f"batch ended in state {job['state']}")
+            content = transport.download_file(job["responses_file"])
+        except Exception as e:
+            error = f"Batch for {model_name} failed: {str(e)}"
+            print(f"Warning: {error}")
+            job_errors[model_name] = error
+            jobs.append({"model": model_name, "requests": len(lines), "request_file": path, "error": error})
+            continue
+
+        responses_path = os.path.join(os.path.dirname(path), "responses-" + os.path.basename(path)[len("requests-"):])
+        with open(responses_path, "wb") as f:
+            f.write(content)
+        job_results = read_batch_results(content, model_name)
+        for key, result in job_results.items():
+            results[key] = {**result, "batch_job": job["name"]}
+        _record_batch_usage(model_name, job_results.values())
+        jobs.append({"model": model_name, "requests": len(lines), "request_file": path, "name": job["name"],
+                     "state": job["state"]})
+
+    succeeded = []
+    failed = dict(prepared["skipped"])
+    for file_id, planned in prepared["files"].items():
+        chunk_results = [results.get(f"{file_id}#{index}") for index in range(1, planned["chunks"] + 1)]
+        if any(result is None for result in chunk_results):
+            failed[file_id] = job_errors.get(planned["model"], "no batch response")
+            continue
+        merged = chunk_results[0] if len(chunk_results) == 1 else merge_testcase_results(chunk_results)
+        if "error" in merged:
+            failed[file_id] = merged["error"]
+            continue
+        merged["tier"] = planned["tier"]
+        merged["max_output_tokens"] = planned["max_output_tokens"]
+
+        save_result = store_batch_result(file_id, planned["metadata"], merged, depth, chunk_results[0]["batch_job"])
+        if save_result["success"]:
+            succeeded.append(file_id)
+        else:
+            failed[file_id] = save_result["error"]
+
+    return {"success": True, "jobs": jobs, "succeeded": succeeded, "failed": failed}
+
+
+def _record_batch_usage(model: str, results) -> None:
+    counters = dict.fromkeys(TOKEN_COUNTERS, 0)
+    requests_count = 0
+    for result in results:
+        if result.get("usage"):
+            requests_count += 1
+            for name in TOKEN_COUNTERS:
+                counters[name] += int(result["usage"].get(name) or 0)
+    if requests_count:
+        usage_result = add_token_usage(datetime.now().strftime("%Y-%m-%d"), model,
+                                       {"requests": requests_count, **counters})
+        if not usage_result["success"]:
+            print(f"Warning: {usage_result['error']}")
@@ -0,0 +1,366 @@
+import asyncio
+import os
+import random
+import re
+import sqlite3
+import tempfile
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional
+
+# Node-wide Gemini quota (shared by every worker process on the host)
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "60"))
+GEMINI_TPM = int(os.getenv("GEMINI_TPM", "1000000"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+GOVERNOR_DB_PATH = os.getenv(
+    "GEMINI_GOVERNOR_DB", os.path.join(tempfile.gettempdir(), "testcaseai-cache", "gemini-governor.sqlite3")
+)
+# A lease is reclaimed after this long even if its worker died mid-call
+LEASE_SECONDS = 300
+
+# Retry configuration
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "5"))
+BACKOFF_BASE_DELAY = 2  # seconds
+BACKOFF_MAX_DELAY = 60  # seconds
+# Longest single wait while queued for a permit before re-checking the store
+MAX_PERMIT_POLL = 1.0  # seconds
+
+RETRY_DELAY_PATTERN = re.compile(r"retry(?:Delay|[ _-]after| in)['\"]?\s*[:=]?\s*['\"]?(\d+(?:\.\d+)?)\s*s", re.IGNORECASE)
+RATE_LIMIT_MARKERS = ("429", "RESOURCE_EXHAUSTED", "Resource has been exhausted", "quota")
+TRANSIENT_MARKERS = ("UNAVAILABLE", "INTERNAL", "DEADLINE_EXCEEDED", "overloaded", "timeout", "timed out", "SSL",
+                     "Connection")
+
+
+class GeminiGovernor:
+    """
+    Rate limiter and concurrency governor for Gemini calls.
+
+    Requests/min and tokens/min are token buckets, and in-flight calls are
+    leases, all kept in a small SQLite database so every uvicorn worker on
+    the node draws from the same quota. A 429 puts the whole node into a
+    cooldown for the server's retry hint (or the backoff delay).
+    """
+
+    def __init__(self, db_path: str, rpm: int, tpm: int, max_concurrency: int):
+        self.db_path = db_path
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max_concurrency
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+        if not self._initialized:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, level REAL, updated REAL)")
+            connection.execute("CREATE TABLE IF NOT EXISTS leases (id TEXT PRIMARY KEY, expires REAL)")
+            connection.execute("CREATE TABLE IF NOT EXISTS cooldown (id INTEGER PRIMARY KEY CHECK (id = 0), until REAL)")
+            self._initialized = True
+        return connection
+
+    @contextmanager
+    def _transaction(self):
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            yield connection
+            connection.execute("COMMIT")
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+    def _refill(self, connection, name: str, capacity: float, now: float) -> float:
+        row = connection.execute("SELECT level, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return capacity
+        level, updated = row
+        return min(capacity, level + max(0.0, now - updated) * capacity / 60.0)
+
+    def _store(self, connection, name: str, level: float, now: float) -> None:
+        connection.execute(
+            "INSERT INTO buckets (name, level, updated) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET level = excluded.level, updated = excluded.updated",
+            (name, level, now)
+        )
+
+    def try_acquire(self, lease_id: str, tokens: int) -> float:
+        """
+        Take one request and `tokens` tokens from the buckets plus a lease.
+
+        Returns:
+            0 if the permit was granted, otherwise seconds to wait before retrying
+        """
+        with self._transaction() as connection:
+            now = time.time()
+
+            row = connection.execute("SELECT until FROM cooldown WHERE id = 0").fetchone()
+            if row and row[0] > now:
+                return row[0] - now
+
+            connection.execute("DELETE FROM leases WHERE expires < ?", (now,))
+            active = connection.execute("SELECT COUNT(*) FROM leases").fetchone()[0]
+            if active >= self.max_concurrency:
+                return 0.1
+
+            requests_left = self._refill(connection, "rpm", self.rpm, now)
+            tokens_left = self._refill(connection, "tpm", self.tpm, now)
+            # A single request larger than the whole bucket waits for a full bucket
+            tokens_needed = min(tokens, self.tpm)
+            if requests_left < 1 or tokens_left < tokens_needed:
+                self._store(connection, "rpm", requests_left, now)
+                self._store(connection, "tpm", tokens_left, now)
+                return max(
+                    (1 - requests_left) * 60.0 / self.rpm,
+                    (tokens_needed - tokens_left) * 60.0 / self.tpm,
+                    0.01
+                )
+
+            self._store(connection, "rpm", requests_left - 1, now)
+            self._store(connection, "tpm", tokens_left - tokens, now)
+            connection.execute("INSERT INTO leases (id, expires) VALUES (?, ?)", (lease_id, now + LEASE_SECONDS))
+            return 0.0
+
+    def release(self, lease_id: str, token_adjustment: int = 0) -> None:
+        """
+        Return a lease and charge (or refund) the difference between actual and
+        estimated tokens.
+        """
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM leases WHERE id = ?", (lease_id,))
+            if token_adjustment:
+                now = time.time()
+                tokens_left = self._refill(connection, "tpm", self.tpm, now)
+                self._store(connection, "tpm", tokens_left - token_adjustment, now)
+
+    def cool_down(self, seconds: float) -> None:
+        """
+        Pause all Gemini calls on the node for `seconds`.
+        """
+        with self._transaction() as connection:
+            until = time.time() + seconds
+            connection.execute(
+                "INSERT INTO cooldown (id, until) VALUES (0, ?) "
+                "ON CONFLICT(id) DO UPDATE SET until = MAX(until, excluded.until)",
+                (until,)
+            )
+
+    def stats(self) -> dict:
+        with self._transaction() as connection:
+            now = time.time()
+            active = connection.execute("SELECT COUNT(*) FROM leases WHERE expires >= ?", (now,)).fetchone()[0]
+            row = connection.execute("SELECT until FROM cooldown WHERE id = 0").fetchone()
+            return {
+                "rpm_limit": self.rpm,
+                "tpm_limit": self.tpm,
+                "max_concurrency": self.max_concurrency,
+                "in_flight": active,
+                "requests_available": round(self._refill(connection, "rpm", self.rpm, now), 2),
+                "tokens_available": round(self._refill(connection, "tpm", self.tpm, now)),
+                "cooldown_seconds": round(max(0.0, row[0] - now), 2) if row else 0.0
+            }
+
+
+class GovernorPermit:
+    """
+    A granted Gemini call slot. Call record_usage with the response's total
+    token count so the tokens/min bucket is corrected on release.
+    """
+
+    def __init__(self, estimated_tokens: int):
+        self.estimated_tokens = estimated_tokens
+        self.actual_tokens = None
+
+    def record_usage(self, total_tokens: Optional[int]) -> None:
+        if total_tokens:
+            self.actual_tokens = total_tokens
+
+
+try:
+    os.makedirs(os.path.dirname(GOVERNOR_DB_PATH), exist_ok=True)
+except OSError as e:
+    print(f"Warning: Cannot create Gemini governor directory: {str(e)}")
+governor = GeminiGovernor(GOVERNOR_DB_PATH, GEMINI_RPM, GEMINI_TPM, GEMINI_MAX_CONCURRENCY)
+
+
+@asynccontextmanager
+async def gemini_permit(estimated_tokens: int):
+    """
+    Wait for a node-wide Gemini call slot.
+
+    Blocks (asynchronously) until the rate buckets have room, no cooldown is
+    active and fewer than GEMINI_MAX_CONCURRENCY calls are in flight. If the
+    shared store is unavailable, calls proceed ungoverned.
+
+    Args:
+        estimated_tokens: Expected prompt tokens for the call
+
+    Yields:
+        GovernorPermit for reporting actual usage
+    """
+    lease_id = str(uuid.uuid4())
+    permit = GovernorPermit(estimated_tokens)
+    governed = True
+
+    while True:
+        acquire = asyncio.ensure_future(asyncio.to_thread(governor.try_acquire, lease_id, estimated_tokens))
+        try:
+            # Shielded so a cancelled caller still learns whether a lease was granted
+            wait = await asyncio.shield(acquire)
+        except asyncio.CancelledError:
+            acquire.add_done_callback(lambda done: _release_abandoned_lease(lease_id, done))
+            raise
+        except sqlite3.Error as e:
+            print(f"Warning: Gemini governor unavailable, calling ungoverned: {str(e)}")
+            governed = False
+            break
+        if wait <= 0:
+            break
+        await asyncio.sleep(min(wait, MAX_PERMIT_POLL))
+
+    try:
+        yield permit
+    finally:
+        if governed:
+            adjustment = (permit.actual_tokens - estimated_tokens) if permit.actual_tokens else 0
+            try:
+                await asyncio.to_thread(governor.release, lease_id, adjustment)
+            except sqlite3.Error as e:
+                print(f"Warning: Failed to release Gemini governor lease: {str(e)}")
+
+
+def _release_abandoned_lease(lease_id: str, acquire: asyncio.Future) -> None:
+    # Otherwise a lease granted after its caller was cancelled holds a slot for LEASE_SECONDS
+    if acquire.cancelled() or acquire.exception() is not None or acquire.result() > 0:
+        return
+    asyncio.get_running_loop().run_in_executor(None, _release_quietly, lease_id)
+
+
+def _release_quietly(lease_id: str) -> None:
+    try:
+        governor.release(lease_id)
+    except sqlite3.Error as e:
+        print(f"Warning: Failed to release Gemini governor lease: {str(e)}")
+
+
+def retry_delay(error: Exception, attempt: int, max_retries: int = GEMINI_MAX_RETRIES) -> Optional[float]:
+    """
+    Decide whether a failed Gemini call should be retried, and after how long.
+
+    Rate limits (429) and transient server/network errors are retried. The
+    server's retry hint is used when present, otherwise full-jitter
+    exponential backoff. A rate limit also cools down the whole node.
+
+    Args:
+        error: Exception raised by the Gemini client
+        attempt: Zero-based attempt number that failed
+        max_retries: Total attempts allowed
+
+    Returns:
+        Seconds to wait before the next attempt, or None if the error is not
+        retryable or retries are exhausted
+    """
+    if attempt + 1 >= max_retries:
+        return None
+
+    rate_limited = _is_rate_limit(error)
+    if not (rate_limited or _is_transient(error)):
+        return None
+
+    hint = _retry_hint(error)
+    if hint is not None:
+        delay = hint + random.uniform(0, 1)
+    else:
+        delay = random.uniform(0, min(BACKOFF_MAX_DELAY, BACKOFF_BASE_DELAY * (2 ** attempt)))
+
+    if rate_limited:
+        try:
+            governor.cool_down(delay)
+        except sqlite3.Error as e:
+            print(f"Warning: Failed to record Gemini cooldown: {str(e)}")
+
+    kind = "Rate limit hit" if rate_limited else "Transient Gemini error"
+    print(f"{kind}. Retrying in {delay:.1f} seconds... (Attempt {attempt + 1}/{max_retries})")
+    return delay
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """
+    Whether a Gemini error is a rate limit/quota, overload, timeout or other
+    transient failure (as opposed to a bad request).
+    """
+    return _is_rate_limit(error) or _is_transient(error)
+
+
+def _is_rate_limit(error: Exception) -> bool:
+    return getattr(error, "code", None) == 429 or any(marker in str(error) for marker in RATE_LIMIT_MARKERS)
+
+
+def _is_transient(error: Exception) -> bool:
+    code = getattr(error, "code", None)
+    return (isinstance(code, int) and code >= 500) or isinstance(error, (asyncio.TimeoutError, ConnectionError)) \
+        or any(marker in str(error) for marker in TRANSIENT_MARKERS)
+
+
+def _retry_hint(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    retry_after = headers.get("Retry-After") if hasattr(headers, "get") else None
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_MAX_DELAY)
+        except ValueError:
+            pass
+
+    match = RETRY_DELAY_PATTERN.search(str(error))
+    if match:
+        return min(float(match.group(1)), BACKOFF_MAX_DELAY)
+    return None
+
+
+async def governed_call(func, *args, estimated_tokens: int = 0, max_retries: int = GEMINI_MAX_RETRIES, **kwargs):
+    """
+    Await a Gemini client call under the governor, retrying retryable failures.
+
+    Each attempt takes its own permit; the response's usage_metadata (if any)
+    corrects the tokens/min bucket.
+
+    Args:
+        func: Async Gemini client method (e.g. client.aio.models.generate_content)
+        *args, **kwargs: Arguments for func
+        estimated_tokens: Expected prompt tokens for the call
+        max_retries: Total attempts allowed
+
+    Returns:
+        The client response
+
+    Raises:
+        Exception: The last error once it is not retryable or retries run out
+    """
+    attempt = 0
+    while True:
+        try:
+            async with gemini_permit(estimated_tokens) as permit:
+                response = await func(*args, **kwargs)
+                usage = getattr(response, "usage_metadata", None)
+                permit.record_usage(getattr(usage, "total_token_count", None))
+                return response
+        except Exception as e:
+            delay = retry_delay(e, attempt, max_retries)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+def get_governor_stats() -> dict:
+    """
+    Get the current node-wide Gemini quota state.
+    """
+    try:
+        return governor.stats()
+    except sqlite3.Error as e:
+        return {"error": f"Gemini governor unavailable: {str(e)}"}
@@ -0,0 +1,188 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+# Hedged requests: if a call is still running after the HEDGE_PERCENTILE latency
+# of recent calls to the same model, an identical second call is started and
+# whichever finishes first wins
+HEDGING_ENABLED = os.getenv("GEMINI_HEDGING_ENABLED", "false").lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("GEMINI_HEDGE_PERCENTILE", "95"))
+# Hedges allowed per primary call, on average (a token bucket refilled by each call)
+HEDGE_MAX_RATE = float(os.getenv("GEMINI_HEDGE_MAX_RATE", "0.05"))
+HEDGE_BURST = 5
+# No hedging until a model has this many observed latencies
+HEDGE_MIN_SAMPLES = int(os.getenv("GEMINI_HEDGE_MIN_SAMPLES", "20"))
+# Never hedge sooner than this, however fast recent calls were
+HEDGE_MIN_DELAY = float(os.getenv("GEMINI_HEDGE_MIN_DELAY", "2"))  # seconds
+LATENCY_WINDOW = 200
+
+
+class LatencyHistory:
+    """
+    Sliding window of recent successful call latencies per model.
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(model, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, model: str, percentile: float, min_samples: int = 1) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(model, ()))
+        if not samples or len(samples) < min_samples:
+            return None
+        return _percentile(samples, percentile)
+
+    def stats(self) -> dict:
+        with self._lock:
+            models = {model: sorted(samples) for model, samples in self._samples.items()}
+        return {
+            model: {
+                "samples": len(samples),
+                "p50_ms": round(_percentile(samples, 50) * 1000),
+                f"p{HEDGE_PERCENTILE:g}_ms": round(_percentile(samples, HEDGE_PERCENTILE) * 1000)
+            }
+            for model, samples in models.items() if samples
+        }
+
+
+def _percentile(sorted_samples: list, percentile: float) -> float:
+    return sorted_samples[min(len(sorted_samples) - 1, int(len(sorted_samples) * percentile / 100))]
+
+
+class HedgeBudget:
+    """
+    Token bucket capping hedges to max_rate per primary call.
+
+    Every primary call deposits max_rate tokens (up to burst) and every hedge
+    spends one, so at most max_rate of calls are hedged no matter how slow
+    Gemini gets. Each worker caps its own calls, which also caps the node.
+    """
+
+    def __init__(self, max_rate: float, burst: int):
+        self.max_rate = max_rate
+        self.burst = burst
+        # Start empty so hedging never runs ahead of the rate cap
+        self._tokens = 0.0
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedges = 0
+        self.hedges_won = 0
+        self.hedges_denied = 0
+
+    def deposit(self) -> None:
+        with self._lock:
+            self.calls += 1
+            self._tokens = min(self.burst, self._tokens + self.max_rate)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._tokens < 1:
+                self.hedges_denied += 1
+                return False
+            self._tokens -= 1
+            self.hedges += 1
+            return True
+
+    def record_win(self) -> None:
+        with self._lock:
+            self.hedges_won += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "hedges": self.hedges,
+                "hedges_won": self.hedges_won,
+                "hedges_denied": self.hedges_denied,
+                "hedge_rate": round(self.hedges / self.calls, 4) if self.calls else 0.0,
+                "max_rate": self.max_rate,
+                "tokens": round(self._tokens, 2)
+            }
+
+
+_latencies = LatencyHistory(LATENCY_WINDOW)
+_budget = HedgeBudget(HEDGE_MAX_RATE, HEDGE_BURST)
+
+
+def hedge_delay(model: str) -> Optional[float]:
+    """
+    Seconds after which a call to model should be hedged, or None if hedging
+    is disabled or there is not enough latency history yet.
+    """
+    if not HEDGING_ENABLED:
+        return None
+    latency = _latencies.percentile(model, HEDGE_PERCENTILE, HEDGE_MIN_SAMPLES)
+    return None if latency is None else max(HEDGE_MIN_DELAY, latency)
+
+
+async def hedged(model: str, make_call):
+    """
+    Await make_call(), hedging it with a second identical call if it is slow.
+
+    The hedge starts once the primary has run for hedge_delay(model) seconds
+    and the hedge budget allows it. The first call to succeed wins and the
+    other is cancelled; if one fails, the other is still awaited. Successful
+    latencies feed the model's history.
+
+    Args:
+        model: Gemini model name (latency history key)
+        make_call: Zero-argument function returning a new call coroutine
+
+    Returns:
+        The winning call's result
+
+    Raises:
+        Exception: The primary call's error if every call failed
+    """
+    _budget.deposit()
+    delay = hedge_delay(model)
+    started = {}
+
+    def launch():
+        task = asyncio.ensure_future(make_call())
+        started[task] = time.perf_counter()
+        return task
+
+    primary = launch()
+    done, pending = set(), {primary}
+    try:
+        if delay is not None:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done and _budget.try_spend():
+                print(f"Gemini call to {model} still running after {delay:.1f}s; sending a hedged request")
+                pending.add(launch())
+
+        while True:
+            for task in done:
+                if task.exception() is None:
+                    _latencies.record(model, time.perf_counter() - started[task])
+                    if task is not primary:
+                        _budget.record_win()
+                    return task.result()
+            if not pending:
+                return primary.result()
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def get_hedging_stats() -> dict:
+    """
+    Get hedge counts, the hedge budget and recent latency percentiles per model.
+    """
+    return {
+        "enabled": HEDGING_ENABLED,
+        "percentile": HEDGE_PERCENTILE,
+        **_budget.stats(),
+        "latency": _latencies.stats()
+    }
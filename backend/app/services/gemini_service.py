@@ -1,9 +1,25 @@
+import asyncio
+import json
 import os
+import re
 import time
 import requests
+from types import SimpleNamespace
 from dotenv import load_dotenv
 from google import genai
-from google.genai.types import GenerateContentConfig, GoogleSearch
+from typing import List, Optional
+from google.genai.types import GenerateContentConfig, GoogleSearch, CreateCachedContentConfig, UpdateCachedContentConfig
+from pydantic import ValidationError
+from app.models.testcase import TestCase, TestSuite, PRIORITIES, GENERATION_DEPTHS
+from app.services.gemini_governor import gemini_permit, governed_call, retry_delay, is_retryable_error, GEMINI_MAX_RETRIES
+from app.services.gemini_hedging import hedged
+from app.services.token_accounting import record_token_usage
+from app.services.cache_service import (
+    llm_response_cache_key,
+    get_cached_llm_response,
+    store_cached_llm_response,
+    record_llm_cache_bypass,
+)
 
 load_dotenv()
 
@@ -15,80 +31,82 @@ if not API_KEY:
 
 client = genai.Client(api_key=API_KEY)
 MODEL_NAME = "gemini-2.5-flash"
+DEFAULT_TEMPERATURE = 0.7
+DEFAULT_MAX_OUTPUT_TOKENS = 8000
 
-# Retry configuration
-MAX_RETRIES = 3
-INITIAL_RETRY_DELAY = 2  # seconds
-TIMEOUT = 120  # seconds
+# Model routing: each request goes to a tier picked from the document size and
+# requested depth, then falls back along MODEL_FALLBACK_CASCADE on timeouts,
+# overload and quota errors
+MODEL_TIERS = {
+    "fast": {"model": os.getenv("GEMINI_FAST_MODEL", "gemini-2.5-flash-lite"), "max_output_tokens": 8000},
+    "standard": {"model": os.getenv("GEMINI_STANDARD_MODEL", MODEL_NAME), "max_output_tokens": DEFAULT_MAX_OUTPUT_TOKENS},
+    # Thinking tokens count against the output limit on the pro model
+    "deep": {"model": os.getenv("GEMINI_DEEP_MODEL", "gemini-2.5-pro"), "max_output_tokens": 16000},
+}
+# At standard depth, documents up to this many characters use the fast tier
+FAST_TIER_MAX_CHARS = int(os.getenv("FAST_TIER_MAX_CHARS", "8000"))
+MODEL_FALLBACK_CASCADE = [tier.strip() for tier in os.getenv("GEMINI_FALLBACK_CASCADE", "deep,standard,fast").split(",")
+                          if tier.strip() in MODEL_TIERS]
+# Attempts on a tier before falling back (the last tier gets GEMINI_MAX_RETRIES)
+FALLBACK_AFTER_ATTEMPTS = int(os.getenv("GEMINI_FALLBACK_AFTER_ATTEMPTS", "2"))
+# Reuse the static prompt instructions through Gemini context caching
+CONTEXT_CACHE_ENABLED = os.getenv("GEMINI_CONTEXT_CACHE_ENABLED", "false").lower() == "true"
+CONTEXT_CACHE_TTL = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600"))  # seconds
+# Extend the cached context's TTL once it has less than this left
+CONTEXT_CACHE_REFRESH_MARGIN = 300  # seconds
+# After a failed cache registration, send full prompts for this long before trying again
+CONTEXT_CACHE_RETRY_AFTER = 300  # seconds
+# Ask for schema-constrained JSON (validated into TestSuite) instead of free-form markdown
+STRUCTURED_OUTPUT_ENABLED = os.getenv("GEMINI_STRUCTURED_OUTPUT", "true").lower() == "true"
+# Bump whenever build_healthcare_prompt changes so cached results are not reused
+PROMPT_VERSION = ("cdss-v2" if STRUCTURED_OUTPUT_ENABLED else "cdss-v1") + ("-ctx" if CONTEXT_CACHE_ENABLED else "")
+# Characters of document text embedded in the prompt; longer documents are cut off
+PROMPT_CHAR_BUDGET = int(os.getenv("PROMPT_CHAR_BUDGET", "20000"))
 
+# Chunked (map-reduce) generation for documents longer than PROMPT_CHAR_BUDGET
+MAX_GENERATION_CHUNKS = int(os.getenv("MAX_GENERATION_CHUNKS", "8"))
+CHUNK_GENERATION_CONCURRENCY = int(os.getenv("CHUNK_GENERATION_CONCURRENCY", "4"))
 
-def generate_testcases_with_retry(pdf_content: str):
-    """
-    Generate test cases with exponential backoff retry logic.
-    """
-    for attempt in range(MAX_RETRIES):
-        try:
-            return generate_healthcare_testcases(pdf_content)
-        except Exception as e:
-            error_str = str(e)
-            
-            # Handle different error types
-            if "429" in error_str or "Resource has been exhausted" in error_str:
-                # Rate limit error
-                if attempt < MAX_RETRIES - 1:
-                    delay = INITIAL_RETRY_DELAY * (2 ** attempt)
-                    print(f"Rate limit hit. Retrying in {delay} seconds... (Attempt {attempt + 1}/{MAX_RETRIES})")
-                    time.sleep(delay)
-                    continue
-                else:
-                    raise Exception("Rate limit exceeded after all retries")
-            
-            elif "timeout" in error_str.lower() or "Timeout" in error_str:
-                # Timeout error
-                if attempt < MAX_RETRIES - 1:
-                    delay = INITIAL_RETRY_DELAY * (2 ** attempt)
-                    print(f"Request timeout. Retrying in {delay} seconds... (Attempt {attempt + 1}/{MAX_RETRIES})")
-                    time.sleep(delay)
-                    continue
-                else:
-                    raise Exception("Request timed out after all retries")
-            
-            elif "SSLEOFError" in error_str or "SSL" in error_str:
-                # SSL/Connection error
-                if attempt < MAX_RETRIES - 1:
-                    delay = INITIAL_RETRY_DELAY * (2 ** attempt)
-                    print(f"SSL error. Retrying in {delay} seconds... (Attempt {attempt + 1}/{MAX_RETRIES})")
-                    time.sleep(delay)
-                    continue
-                else:
-                    raise Exception("SSL connection failed after all retries")
-            
-            else:
-                # Unknown error - raise immediately
-                raise e
-    
-    raise Exception("Failed after all retry attempts")
+# Partial regeneration sends only the guideline sections most relevant to the
+# test cases being rewritten or added, up to PARTIAL_CONTEXT_CHARS
+PARTIAL_CONTEXT_CHARS = int(os.getenv("PARTIAL_CONTEXT_CHARS", "6000"))
+PARTIAL_SECTION_CHARS = 1500
+# Output tokens allowed per requested test case (one extra for the JSON envelope)
+PARTIAL_TOKENS_PER_TESTCASE = int(os.getenv("PARTIAL_TOKENS_PER_TESTCASE", "800"))
+# Bump whenever build_partial_prompt changes so cached responses are not reused
+PARTIAL_PROMPT_VERSION = "cdss-partial-v1"
 
+PAGE_MARKER_PATTERN = re.compile(r"(?m)^(?=--- Page \d+ ---$)")
+SECTION_BREAK_PATTERN = re.compile(r"\n\s*\n")
+TESTCASE_HEADING_PATTERN = re.compile(r"(?m)^### TC-\d+:?\s*(.*)$")
+# Words and clinical values used to match test cases to guideline sections
+CONTEXT_TERM_PATTERN = re.compile(r"[a-z]{4,}|\d+(?:\.\d+)?")
+CONTEXT_STOPWORDS = {"with", "that", "this", "from", "should", "than", "when", "test", "case", "system", "patient"}
 
-def generate_healthcare_testcases(pdf_content: str):
-    """
-    Generate comprehensive healthcare test cases from PDF content using Gemini AI.
-    
-    Args:
-        pdf_content: Extracted text content from PDF
-        
-    Returns:
-        dict with generated test cases and solutions
-    """
-    # Enhanced prompt focused on clinical guidelines and CDSS testing
-    prompt = f"""You are an expert QA engineer specializing in Clinical Decision Support Systems (CDSS) and medical software testing.
+# Cached instruction contexts per model (per worker process)
+_context_caches = {}
+_context_cache_lock = asyncio.Lock()
 
-CLINICAL GUIDELINE/PROTOCOL DOCUMENT:
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-{pdf_content[:20000]}
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# Prompts are counted with the countTokens API before sending (falling back to
+# a character estimate), and the output budget is sized from that count:
+# OUTPUT_BUDGET_BASE plus a share of the prompt, capped by the tier's limit
+TOKEN_PREFLIGHT_ENABLED = os.getenv("GEMINI_COUNT_TOKENS", "true").lower() == "true"
+COUNT_TOKENS_TIMEOUT = 5  # seconds
+OUTPUT_BUDGET_BASE = int(os.getenv("OUTPUT_BUDGET_BASE", "4000"))
+OUTPUT_BUDGET_PER_PROMPT_TOKEN = float(os.getenv("OUTPUT_BUDGET_PER_PROMPT_TOKEN", "0.5"))
+
+# Retries and rate limiting live in gemini_governor; a tier that takes longer
+# than this (retries included) is abandoned for the next one in the cascade
+TIMEOUT = int(os.getenv("GEMINI_TIMEOUT", "120"))  # seconds
+# Rough characters-per-token ratio for estimating prompt size before a call
+CHARS_PER_TOKEN = 4
+
+SYSTEM_INSTRUCTION = "You are an expert healthcare software QA engineer specializing in Clinical Decision Support Systems testing."
 
-CONTEXT:
+PROMPT_PREAMBLE = "You are an expert QA engineer specializing in Clinical Decision Support Systems (CDSS) and medical software testing."
+
+# Static part of the prompt (identical on every call); see build_healthcare_prompt
+PROMPT_INSTRUCTIONS = """CONTEXT:
 This document contains clinical guidelines, treatment protocols, diagnostic pathways, hospital SOPs, or care guidelines that define decision logic for Clinical Decision Support Systems. These guidelines contain:
 - Decision paths and branching logic
 - Clinical thresholds and boundaries
@@ -251,47 +269,1190 @@ Continue with TC-006 through TC-010 following this pattern, covering:
 **REMEMBER**: Generate exactly **8-10 concise, focused test cases** that validate the clinical decision logic. Quality over quantity!
 
 """
+
+STRUCTURED_OUTPUT_NOTE = """RESPONSE FORMAT:
+Return the test suite as JSON matching the response schema instead of markdown. Each test case is one object: put every input condition, expected decision/action and validation point (including threshold edge cases) in its own list item, without markdown bullets or ✓ marks. Put the Implementation Notes in key_decision_points, test_data_requirements and compliance_checks.
+
+"""
+
+if STRUCTURED_OUTPUT_ENABLED:
+    PROMPT_INSTRUCTIONS += STRUCTURED_OUTPUT_NOTE
+
+# Gemini response schema mirroring app.models.testcase.TestSuite (the SDK
+# cannot convert nested pydantic models itself)
+_STRING_LIST = {"type": "ARRAY", "items": {"type": "STRING"}}
+TEST_CASE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "id": {"type": "STRING", "description": "TC-001, TC-002, ..."},
+        "title": {"type": "STRING"},
+        "priority": {"type": "STRING", "enum": list(PRIORITIES)},
+        "type": {"type": "STRING", "description": "e.g. Decision Path Validation, Threshold Validation, Combined Conditions, Missing Data, Rule Conflict"},
+        "scenario": {"type": "STRING"},
+        "inputs": _STRING_LIST,
+        "expected_action": _STRING_LIST,
+        "validation_points": _STRING_LIST
+    },
+    "required": ["id", "title", "priority", "type", "scenario", "inputs", "expected_action",
+                 "validation_points"],
+    "property_ordering": ["id", "title", "priority", "type", "scenario", "inputs", "expected_action",
+                          "validation_points"]
+}
+TEST_SUITE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "title": {"type": "STRING", "description": "Clinical guideline name"},
+        "guideline_type": {"type": "STRING", "description": "Treatment Protocol / Diagnostic Pathway / ICU Protocol / Emergency Care"},
+        "criticality": {"type": "STRING"},
+        "focus": {"type": "STRING"},
+        "test_cases": {"type": "ARRAY", "items": TEST_CASE_SCHEMA},
+        "key_decision_points": _STRING_LIST,
+        "test_data_requirements": _STRING_LIST,
+        "compliance_checks": _STRING_LIST
+    },
+    "required": ["title", "guideline_type", "criticality", "focus", "test_cases"],
+    "property_ordering": ["title", "guideline_type", "criticality", "focus", "test_cases", "key_decision_points",
+                          "test_data_requirements", "compliance_checks"]
+}
+# Partial regeneration returns only the new test cases
+TEST_CASES_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {"test_cases": {"type": "ARRAY", "items": TEST_CASE_SCHEMA}},
+    "required": ["test_cases"]
+}
+
+# With context caching on, the instructions are registered once as a cached context
+CACHED_INSTRUCTIONS = (
+    f"{PROMPT_PREAMBLE}\n\nThe clinical guideline document is provided in each request under "
+    f"CLINICAL GUIDELINE/PROTOCOL DOCUMENT.\n\n{PROMPT_INSTRUCTIONS}"
+)
+
+
+def route_model(document_chars: int, depth: str = "standard", model: Optional[str] = None) -> List[dict]:
+    """
+    Pick the model tier for a request and the tiers to fall back to.
+    
+    'quick' requests use the fast tier and 'thorough' ones the deep tier; at
+    'standard' depth, documents up to FAST_TIER_MAX_CHARS use the fast tier
+    and longer ones the standard tier. Fallbacks are the tiers after the
+    routed one in MODEL_FALLBACK_CASCADE, then the ones before it (nearest
+    first). An explicitly requested model is used as-is, without fallbacks.
+    
+    Args:
+        document_chars: Length of the extracted text
+        depth: One of GENERATION_DEPTHS
+        model: Explicit model override
+        
+    Returns:
+        Routes to try in order, each {"tier", "model", "max_output_tokens"}
+    """
+    if model:
+        return [{"tier": "custom", "model": model, "max_output_tokens": DEFAULT_MAX_OUTPUT_TOKENS}]
+    
+    if depth == "quick":
+        tier = "fast"
+    elif depth == "thorough":
+        tier = "deep"
+    else:
+        tier = "fast" if document_chars <= FAST_TIER_MAX_CHARS else "standard"
+    
+    if tier in MODEL_FALLBACK_CASCADE:
+        position = MODEL_FALLBACK_CASCADE.index(tier)
+        fallbacks = MODEL_FALLBACK_CASCADE[position + 1:] + MODEL_FALLBACK_CASCADE[:position][::-1]
+    else:
+        fallbacks = MODEL_FALLBACK_CASCADE
+    
+    routes = []
+    for name in [tier] + fallbacks:
+        if all(route["model"] != MODEL_TIERS[name]["model"] for route in routes):
+            routes.append({"tier": name, **MODEL_TIERS[name]})
+    return routes
+
+
+def model_route_key(depth: str = "standard") -> str:
+    """
+    Describe the routing configuration for a depth, for use in result cache keys.
+    
+    Covers everything that decides the model and the output budget sent for a
+    given document: each tier's model and cap, the fast tier's size limit and
+    the output_budget formula (with how prompt tokens are measured).
+    """
+    tiers = ",".join(
+        f"{name}={tier['model']}/{tier['max_output_tokens']}" for name, tier in sorted(MODEL_TIERS.items())
+    )
+    counting = "counted" if TOKEN_PREFLIGHT_ENABLED else "estimated"
+    budget = f"{OUTPUT_BUDGET_BASE}+{OUTPUT_BUDGET_PER_PROMPT_TOKEN}/{counting}"
+    return f"{depth}:{tiers};fast<={FAST_TIER_MAX_CHARS};budget={budget}"
+
+
+async def generate_testcases_with_retry(pdf_content: str, use_cache: bool = True):
+    """
+    Generate test cases, retrying rate limits and transient errors.
+    
+    Backoff, retry hints and node-wide quota pacing are handled by the Gemini
+    governor (see gemini_governor.governed_call) underneath
+    generate_healthcare_testcases_async.
+    """
+    return await generate_healthcare_testcases_async(pdf_content, use_cache=use_cache)
+
+def build_healthcare_prompt(pdf_content: str, part: Optional[tuple] = None) -> str:
+    """
+    Build the CDSS test case generation prompt for a clinical guideline.
+    
+    Args:
+        pdf_content: Extracted text content from PDF
+        part: (index, total) when pdf_content is one chunk of a longer document
+        
+    Returns:
+        Prompt text
+    """
+    # Enhanced prompt focused on clinical guidelines and CDSS testing
+    return f"""{_part_note(part)}{PROMPT_PREAMBLE}
+
+{_document_section(pdf_content)}
+
+{PROMPT_INSTRUCTIONS}"""
+
+
+def build_document_prompt(pdf_content: str, part: Optional[tuple] = None) -> str:
+    """
+    Build the per-request portion of the prompt used with a cached instruction context.
+    
+    Args:
+        pdf_content: Extracted text content from PDF
+        part: (index, total) when pdf_content is one chunk of a longer document
+        
+    Returns:
+        Prompt text containing only the document (and part note)
+    """
+    return f"{_part_note(part)}{_document_section(pdf_content)}"
+
+
+def _part_note(part: Optional[tuple]) -> str:
+    if part is None:
+        return ""
+    return (
+        f"NOTE: This is part {part[0]} of {part[1]} of a longer document. Other parts are handled "
+        "separately, so generate test cases only for the decision logic found in this part.\n\n"
+    )
+
+
+def _document_section(pdf_content: str) -> str:
+    return f"""CLINICAL GUIDELINE/PROTOCOL DOCUMENT:
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+{pdf_content[:PROMPT_CHAR_BUDGET]}
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━"""
+
+
+def _generation_config(temperature: Optional[float] = None, max_output_tokens: Optional[int] = None,
+                       cached_content: Optional[str] = None) -> GenerateContentConfig:
+    return GenerateContentConfig(
+        # The system instruction is part of the cached context when one is used
+        system_instruction=None if cached_content else SYSTEM_INSTRUCTION,
+        cached_content=cached_content,
+        temperature=DEFAULT_TEMPERATURE if temperature is None else temperature,
+        top_p=0.95,
+        max_output_tokens=max_output_tokens or DEFAULT_MAX_OUTPUT_TOKENS,
+        response_modalities=["TEXT"],
+        response_mime_type="application/json" if STRUCTURED_OUTPUT_ENABLED else None,
+        response_schema=TEST_SUITE_SCHEMA if STRUCTURED_OUTPUT_ENABLED else None,
+    )
+
+
+def _parse_generation_response(response, model: str = MODEL_NAME) -> dict:
+    # Extract the generated test cases
+    test_cases_text = response.text if hasattr(response, 'text') else ""
+    
+    return _structured_result({
+        "text": test_cases_text,
+        "model": model,
+        "usage": _usage_from_metadata(getattr(response, 'usage_metadata', None)),
+        "status": "success"
+    })
+
+
+def _structured_result(result: dict) -> dict:
+    """
+    Validate a structured (JSON) response into a TestSuite.
+    
+    On success the result carries the records under 'test_suite' and their
+    markdown rendering as 'text', so text consumers are unaffected. A response
+    that does not match the schema (e.g. cut off at max_output_tokens) is
+    reported as a generation error.
+    """
+    if not STRUCTURED_OUTPUT_ENABLED:
+        return result
+    try:
+        suite = TestSuite.model_validate_json(result["text"] or "")
+    except ValidationError as e:
+        error = _generation_error(
+            ValueError(f"response did not match the test suite schema ({e.error_count()} errors): {e.errors()[0]['msg']}"),
+            result["model"]
+        )
+        return {**error, "usage": result["usage"]}
+    return {**result, "text": suite.to_markdown(), "test_suite": suite.model_dump()}
+
+
+def _usage_from_metadata(usage_metadata) -> dict:
+    """
+    Token usage with cached (context cache) and uncached prompt tokens split out.
+    """
+    if usage_metadata is None:
+        return {}
+    prompt_tokens = getattr(usage_metadata, 'prompt_token_count', 0) or 0
+    cached_tokens = getattr(usage_metadata, 'cached_content_token_count', 0) or 0
+    return {
+        "prompt_tokens": prompt_tokens,
+        "cached_prompt_tokens": cached_tokens,
+        "uncached_prompt_tokens": prompt_tokens - cached_tokens,
+        "completion_tokens": getattr(usage_metadata, 'candidates_token_count', 0) or 0,
+        "total_tokens": getattr(usage_metadata, 'total_token_count', 0) or 0
+    }
+
+
+async def _get_context_cache(model: str) -> Optional[str]:
+    """
+    Get the name of the cached instruction context for a model.
+    
+    The context (system instruction plus CACHED_INSTRUCTIONS) is created on
+    first use with CONTEXT_CACHE_TTL, and its TTL is extended once less than
+    CONTEXT_CACHE_REFRESH_MARGIN remains, so requests never hit an expired
+    cache. Returns None when caching is disabled or unavailable, in which
+    case callers send the full prompt.
+    """
+    if not CONTEXT_CACHE_ENABLED:
+        return None
+    
+    entry = _context_caches.get(model)
+    if entry and entry["expires_at"] - time.time() > CONTEXT_CACHE_REFRESH_MARGIN:
+        return entry["name"]
+    
+    async with _context_cache_lock:
+        now = time.time()
+        entry = _context_caches.get(model)
+        if entry and (entry["expires_at"] - now > CONTEXT_CACHE_REFRESH_MARGIN or
+                      (entry["name"] is None and entry["expires_at"] > now)):
+            return entry["name"]
+        
+        ttl = f"{CONTEXT_CACHE_TTL}s"
+        try:
+            if entry and entry["name"] and entry["expires_at"] > now:
+                await client.aio.caches.update(name=entry["name"], config=UpdateCachedContentConfig(ttl=ttl))
+                name = entry["name"]
+            else:
+                cached_content = await client.aio.caches.create(
+                    model=model,
+                    config=CreateCachedContentConfig(
+                        contents=[CACHED_INSTRUCTIONS],
+                        system_instruction=SYSTEM_INSTRUCTION,
+                        display_name=f"testcaseai-{PROMPT_VERSION}",
+                        ttl=ttl
+                    )
+                )
+                name = cached_content.name
+                print(f"Registered Gemini context cache {name} for {model}")
+        except Exception as e:
+            print(f"Warning: Gemini context cache unavailable, sending full prompts: {str(e)}")
+            _context_caches[model] = {"name": None, "expires_at": now + CONTEXT_CACHE_RETRY_AFTER}
+            return None
+        
+        _context_caches[model] = {"name": name, "expires_at": now + CONTEXT_CACHE_TTL}
+        return name
+
+
+async def warm_up_gemini() -> None:
+    """
+    Open the Gemini client's connection and register the instruction context
+    caches before the first request.
+    
+    Looks up each tier's model, which also catches a misconfigured model name
+    at startup. Failures are logged; requests then warm up on first use.
+    """
+    for model in dict.fromkeys(tier["model"] for tier in MODEL_TIERS.values()):
+        try:
+            await client.aio.models.get(model=model)
+        except Exception as e:
+            print(f"Warning: Gemini warm-up failed for {model}: {str(e)}")
+            continue
+        await _get_context_cache(model)
+
+
+def _invalidate_context_cache(model: str, name: str) -> None:
+    entry = _context_caches.get(model)
+    if entry and entry["name"] == name:
+        del _context_caches[model]
+
+
+def _is_context_cache_error(e: Exception) -> bool:
+    return getattr(e, 'code', None) in (403, 404) or "cachedcontent" in str(e).lower().replace(" ", "")
+
+
+async def _prepare_request(pdf_content: str, model: str, temperature: Optional[float],
+                           max_output_tokens: Optional[int], part: Optional[tuple] = None) -> tuple:
+    """
+    Build (contents, config, context cache name) for a generation call.
+    """
+    cache_name = await _get_context_cache(model)
+    if cache_name:
+        return (
+            build_document_prompt(pdf_content, part),
+            _generation_config(temperature, max_output_tokens, cached_content=cache_name),
+            cache_name
+        )
+    return build_healthcare_prompt(pdf_content, part), _generation_config(temperature, max_output_tokens), None
+
+
+def _response_cache_key(pdf_content: str, model: str, temperature: Optional[float],
+                        max_output_tokens: Optional[int], part: Optional[tuple] = None) -> str:
+    return llm_response_cache_key(model, build_healthcare_prompt(pdf_content, part), {
+        "system_instruction": SYSTEM_INSTRUCTION,
+        "prompt_version": PROMPT_VERSION,
+        "temperature": DEFAULT_TEMPERATURE if temperature is None else temperature,
+        "top_p": 0.95,
+        "max_output_tokens": max_output_tokens or DEFAULT_MAX_OUTPUT_TOKENS
+    })
+
+
+def _lookup_response_cache(cache_key: str, use_cache: bool) -> Optional[dict]:
+    if not use_cache:
+        record_llm_cache_bypass()
+        return None
+    cached = get_cached_llm_response(cache_key)
+    return {**cached, "cached_response": True} if cached is not None else None
+
+
+async def _generate_content(pdf_content: str, routes: List[dict], temperature: Optional[float],
+                            max_output_tokens: Optional[int], part: Optional[tuple] = None,
+                            use_cache: bool = True) -> dict:
+    """
+    One governed generate_content call on the routed model, with fallbacks.
+    
+    Identical requests are answered from the LLM response cache unless
+    use_cache is False. Each route gets TIMEOUT seconds and, unless it is the
+    last one, FALLBACK_AFTER_ATTEMPTS attempts; a timeout, overload or quota
+    error then moves on to the next route. Slow calls are hedged (see
+    gemini_hedging.hedged) within that time. The result records the tier that
+    served it (and 'fallback_from' if that was not the routed one); fallback
+    results are cached under the routed model's key, like any other.
+    """
+    routed = routes[0]
+    # The key holds the budget actually sent, which depends on the prompt's size
+    prompt_tokens = await count_prompt_tokens(build_healthcare_prompt(pdf_content, part), routed["model"])
+    budget = max_output_tokens or output_budget(prompt_tokens, routed["max_output_tokens"])
+    cache_key = _response_cache_key(pdf_content, routed["model"], temperature, budget, part)
+    cached = _lookup_response_cache(cache_key, use_cache)
+    if cached is not None:
+        return cached
+    
+    for index, route in enumerate(routes):
+        model = route["model"]
+        budget = max_output_tokens or output_budget(prompt_tokens, route["max_output_tokens"])
+        last = index + 1 == len(routes)
+        try:
+            result = await asyncio.wait_for(
+                hedged(model, lambda: _call_model(pdf_content, model, temperature, budget, part, prompt_tokens,
+                                                  GEMINI_MAX_RETRIES if last else FALLBACK_AFTER_ATTEMPTS)),
+                TIMEOUT
+            )
+        except Exception as e:
+            e = _timeout_error(e, model)
+            if not last and _should_fall_back(e):
+                print(f"Warning: {model} failed ({str(e)}); falling back to {routes[index + 1]['model']}")
+                continue
+            return {**_generation_error(e, model), "tier": route["tier"]}
+        
+        result["tier"] = route["tier"]
+        result["max_output_tokens"] = budget
+        result["usage"]["preflight_prompt_tokens"] = prompt_tokens
+        record_token_usage(model, result["usage"])
+        if index:
+            result["fallback_from"] = routed["model"]
+        # Kept under the routed model's key, the one lookups use
+        store_cached_llm_response(cache_key, result)
+        return result
+
+
+async def _call_model(pdf_content: str, model: str, temperature: Optional[float], max_output_tokens: int,
+                      part: Optional[tuple], prompt_tokens: int, max_retries: int) -> dict:
+    """
+    Call one model, using the context cache when available.
+    
+    If the cached context has disappeared server-side, it is dropped and the
+    call is repeated once with the full prompt (or a fresh cache).
+    """
+    for attempt in range(2):
+        contents, config, cache_name = await _prepare_request(pdf_content, model, temperature, max_output_tokens, part)
+        started = time.perf_counter()
+        try:
+            response = await governed_call(
+                client.aio.models.generate_content,
+                model=model,
+                contents=contents,
+                config=config,
+                estimated_tokens=prompt_tokens,
+                max_retries=max_retries
+            )
+        except Exception as e:
+            if cache_name and attempt == 0 and _is_context_cache_error(e):
+                _invalidate_context_cache(model, cache_name)
+                continue
+            raise
+        
+        result = _parse_generation_response(response, model)
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000)
+        return result
+
+
+def _should_fall_back(e: Exception) -> bool:
+    return isinstance(e, asyncio.TimeoutError) or is_retryable_error(e)
+
+
+def _timeout_error(e: Exception, model: str) -> Exception:
+    if isinstance(e, asyncio.TimeoutError) and not str(e):
+        return asyncio.TimeoutError(f"{model} did not respond within {TIMEOUT} seconds")
+    return e
+
+
+def _estimate_tokens(prompt: str) -> int:
+    return len(prompt) // CHARS_PER_TOKEN + 1
+
+
+async def count_prompt_tokens(prompt: str, model: str = MODEL_NAME) -> int:
+    """
+    Count a prompt's tokens (plus the system instruction) before sending it.
+    
+    Uses the countTokens API when TOKEN_PREFLIGHT_ENABLED, falling back to a
+    characters-per-token estimate if that is disabled, slow or failing.
+    
+    Args:
+        prompt: Full prompt text
+        model: Gemini model name
+        
+    Returns:
+        Prompt token count
+    """
+    # countTokens on the Gemini API does not take a system instruction
+    system_tokens = _estimate_tokens(SYSTEM_INSTRUCTION)
+    if not TOKEN_PREFLIGHT_ENABLED:
+        return _estimate_tokens(prompt) + system_tokens
+    try:
+        response = await asyncio.wait_for(
+            client.aio.models.count_tokens(model=model, contents=prompt), COUNT_TOKENS_TIMEOUT
+        )
+        return (response.total_tokens or 0) + system_tokens
+    except Exception as e:
+        print(f"Warning: Gemini token count failed, estimating instead: {str(e) or type(e).__name__}")
+        return _estimate_tokens(prompt) + system_tokens
+
+
+def output_budget(prompt_tokens: int, max_output_tokens: int) -> int:
+    """
+    Output token limit for a prompt: OUTPUT_BUDGET_BASE plus
+    OUTPUT_BUDGET_PER_PROMPT_TOKEN per prompt token, at most max_output_tokens.
+    """
+    return min(max_output_tokens, OUTPUT_BUDGET_BASE + int(prompt_tokens * OUTPUT_BUDGET_PER_PROMPT_TOKEN))
+
+
+def _generation_error(e: Exception, model: str = MODEL_NAME) -> dict:
+    error_msg = f"Test case generation failed: {str(e)}"
+    print(f"Gemini API error: {error_msg}")
+    return {
+        "text": f"Error: {error_msg}",
+        "model": model,
+        "usage": {},
+        "status": "error",
+        "error": error_msg
+    }
+
+
+def build_rest_request(pdf_content: str, part: Optional[tuple] = None, temperature: Optional[float] = None,
+                       max_output_tokens: Optional[int] = None) -> dict:
+    """
+    Build a generation request in the Gemini REST (JSON) format, as used in
+    batch job files.
+    
+    Args:
+        pdf_content: Extracted text content from PDF
+        part: (index, total) when pdf_content is one chunk of a longer document
+        temperature: Sampling temperature override
+        max_output_tokens: Output token limit
+        
+    Returns:
+        GenerateContentRequest body (without the model)
+    """
+    config = {
+        "temperature": DEFAULT_TEMPERATURE if temperature is None else temperature,
+        "topP": 0.95,
+        "maxOutputTokens": max_output_tokens or DEFAULT_MAX_OUTPUT_TOKENS,
+        "responseModalities": ["TEXT"]
+    }
+    if STRUCTURED_OUTPUT_ENABLED:
+        config.update({"responseMimeType": "application/json", "responseSchema": TEST_SUITE_SCHEMA})
+    return {
+        "contents": [{"role": "user", "parts": [{"text": build_healthcare_prompt(pdf_content, part)}]}],
+        "systemInstruction": {"parts": [{"text": SYSTEM_INSTRUCTION}]},
+        "generationConfig": config
+    }
+
+
+def parse_rest_response(data: dict, model: str) -> dict:
+    """
+    Turn a REST GenerateContentResponse (e.g. from a batch job) into a result
+    in the same shape as generate_healthcare_testcases.
+    """
+    candidates = data.get("candidates") or []
+    parts = (candidates[0].get("content") or {}).get("parts", []) if candidates else []
+    text = "".join(part.get("text", "") for part in parts)
+    usage = data.get("usageMetadata") or {}
+    usage = _usage_from_metadata(SimpleNamespace(
+        prompt_token_count=usage.get("promptTokenCount"),
+        cached_content_token_count=usage.get("cachedContentTokenCount"),
+        candidates_token_count=usage.get("candidatesTokenCount"),
+        total_token_count=usage.get("totalTokenCount")
+    ))
+    if not text:
+        reason = candidates[0].get("finishReason") if candidates else (data.get("promptFeedback") or {}).get("blockReason")
+        return {**_generation_error(ValueError(f"empty response ({reason or 'no candidates'})"), model), "usage": usage}
+    
+    return _structured_result({"text": text, "model": model, "usage": usage, "status": "success"})
+
+
+def generate_healthcare_testcases(pdf_content: str):
+    """
+    Generate comprehensive healthcare test cases from PDF content using Gemini AI.
+    
+    Args:
+        pdf_content: Extracted text content from PDF
+        
+    Returns:
+        dict with generated test cases and solutions
+    """
+    prompt = build_healthcare_prompt(pdf_content)
     
     try:
         # Call Gemini API
         response = client.models.generate_content(
             model=MODEL_NAME,
             contents=prompt,
-            config=GenerateContentConfig(
-                system_instruction="You are an expert healthcare software QA engineer specializing in Clinical Decision Support Systems testing.",
-                temperature=0.7,
-                top_p=0.95,
-                max_output_tokens=8000,
-                response_modalities=["TEXT"],
-            )
+            config=_generation_config()
         )
+        return _parse_generation_response(response)
         
-        # Extract the generated test cases
-        test_cases_text = response.text if hasattr(response, 'text') else ""
+    except Exception as e:
+        return _generation_error(e)
+
+
+async def generate_healthcare_testcases_async(pdf_content: str, model: Optional[str] = None,
+                                              temperature: Optional[float] = None,
+                                              max_output_tokens: Optional[int] = None, use_cache: bool = True,
+                                              depth: str = "standard"):
+    """
+    Async counterpart of generate_healthcare_testcases using the native async Gemini client.
+    
+    Args:
+        pdf_content: Extracted text content from PDF
+        model: Gemini model override (default: routed by route_model)
+        temperature: Sampling temperature override
+        max_output_tokens: Output token limit override (default: the tier's budget)
+        use_cache: Answer identical requests from the LLM response cache
+        depth: Requested analysis depth, one of GENERATION_DEPTHS
         
-        # Get usage metadata if available
-        usage = {}
-        if hasattr(response, 'usage_metadata'):
-            usage = {
-                "prompt_tokens": getattr(response.usage_metadata, 'prompt_token_count', 0),
-                "completion_tokens": getattr(response.usage_metadata, 'candidates_token_count', 0),
-                "total_tokens": getattr(response.usage_metadata, 'total_token_count', 0)
-            }
+    Returns:
+        dict with generated test cases and solutions
+    """
+    return await _generate_content(pdf_content, route_model(len(pdf_content), depth, model), temperature,
+                                   max_output_tokens, use_cache=use_cache)
+
+
+async def generate_healthcare_testcases_streaming(pdf_content: str, on_chunk, model: Optional[str] = None,
+                                                  temperature: Optional[float] = None,
+                                                  max_output_tokens: Optional[int] = None, use_cache: bool = True,
+                                                  depth: str = "standard"):
+    """
+    Generate healthcare test cases with the Gemini streaming API.
+    
+    Markdown is passed to on_chunk as soon as it arrives. With structured
+    output on, the JSON fragments are not forwarded: each test case record is
+    rendered to markdown once it is complete (see MarkdownStreamRenderer).
+    The assembled response is returned in the same shape as
+    generate_healthcare_testcases so callers can persist it unchanged. Model routing and fallbacks work as in
+    generate_healthcare_testcases_async, but only until the first fragment
+    has been sent.
+    
+    Args:
+        pdf_content: Extracted text content from PDF
+        on_chunk: Callback invoked with each markdown fragment
+        model, temperature, max_output_tokens, use_cache, depth: See generate_healthcare_testcases_async
         
-        return {
-            "text": test_cases_text,
-            "model": MODEL_NAME,
-            "usage": usage,
-            "status": "success"
-        }
+    Returns:
+        dict with generated test cases and solutions
+    """
+    routes = route_model(len(pdf_content), depth, model)
+    prompt_tokens = await count_prompt_tokens(build_healthcare_prompt(pdf_content), routes[0]["model"])
+    cache_key = _response_cache_key(pdf_content, routes[0]["model"], temperature,
+                                    max_output_tokens or output_budget(prompt_tokens, routes[0]["max_output_tokens"]))
+    cached = _lookup_response_cache(cache_key, use_cache)
+    if cached is not None:
+        on_chunk(cached["text"])
+        return cached
+    
+    route_index = attempt = 0
+    
+    while True:
+        route = routes[route_index]
+        model = route["model"]
+        budget = max_output_tokens or output_budget(prompt_tokens, route["max_output_tokens"])
+        last = route_index + 1 == len(routes)
+        parts = []
+        contents, config, cache_name = await _prepare_request(pdf_content, model, temperature, budget)
+        started = time.perf_counter()
+        try:
+            usage_metadata = await asyncio.wait_for(
+                _stream_content(model, contents, config, parts, on_chunk, prompt_tokens), TIMEOUT
+            )
+            break
+        except Exception as e:
+            e = _timeout_error(e, model)
+            # Once fragments have reached subscribers the stream cannot be replayed
+            if parts:
+                return {**_generation_error(e, model), "tier": route["tier"]}
+            if cache_name and _is_context_cache_error(e):
+                _invalidate_context_cache(model, cache_name)
+                delay = 0
+            elif isinstance(e, asyncio.TimeoutError) and not last:
+                delay = None
+            else:
+                delay = retry_delay(e, attempt, GEMINI_MAX_RETRIES if last else FALLBACK_AFTER_ATTEMPTS)
+            if delay is None:
+                if last or not _should_fall_back(e):
+                    return {**_generation_error(e, model), "tier": route["tier"]}
+                print(f"Warning: {model} failed ({str(e)}); falling back to {routes[route_index + 1]['model']}")
+                route_index += 1
+                attempt = 0
+                continue
+            await asyncio.sleep(delay)
+            attempt += 1
+    
+    result = _structured_result({
+        "text": "".join(parts),
+        "model": model,
+        "usage": _usage_from_metadata(usage_metadata),
+        "status": "success"
+    })
+    result["latency_ms"] = round((time.perf_counter() - started) * 1000)
+    result["tier"] = route["tier"]
+    result["max_output_tokens"] = budget
+    result["usage"]["preflight_prompt_tokens"] = prompt_tokens
+    record_token_usage(model, result["usage"])
+    if route_index:
+        result["fallback_from"] = routes[0]["model"]
+    # Kept under the routed model's key, the one lookups use
+    store_cached_llm_response(cache_key, result)
+    return result
+
+
+async def _stream_content(model: str, contents: str, config: GenerateContentConfig, parts: List[str], on_chunk,
+                          prompt_tokens: int):
+    """
+    Stream one response into parts (forwarding markdown to on_chunk) and
+    return its usage metadata.
+    """
+    usage_metadata = None
+    renderer = MarkdownStreamRenderer() if STRUCTURED_OUTPUT_ENABLED else None
+    async with gemini_permit(prompt_tokens) as permit:
+        async for chunk in client.aio.models.generate_content_stream(
+            model=model,
+            contents=contents,
+            config=config
+        ):
+            text = chunk.text if hasattr(chunk, 'text') else None
+            if text:
+                parts.append(text)
+                markdown = renderer.feed(text) if renderer else text
+                if markdown:
+                    on_chunk(markdown)
+            # Usage is reported on the final chunk
+            if getattr(chunk, 'usage_metadata', None) is not None:
+                usage_metadata = chunk.usage_metadata
+        permit.record_usage(getattr(usage_metadata, 'total_token_count', None))
+    return usage_metadata
+
+
+class MarkdownStreamRenderer:
+    """
+    Render test case records as markdown while a structured (JSON) response
+    streams in.
+    
+    Fragments are scanned with a small JSON tokenizer; each object in the
+    top-level "test_cases" array is validated and rendered as soon as its
+    closing brace arrives. Records that fail validation are skipped here and
+    reported by the final _structured_result check.
+    """
+    
+    def __init__(self):
+        self.buffer = ""
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.in_test_cases = False
+        self.record_start = None
+        self.rendered = 0
+    
+    def feed(self, fragment: str) -> str:
+        """
+        Add a fragment of the JSON response.
         
-    except Exception as e:
-        error_msg = f"Test case generation failed: {str(e)}"
-        print(f"Gemini API error: {error_msg}")
-        return {
-            "text": f"Error: {error_msg}",
-            "model": MODEL_NAME,
-            "usage": {},
-            "status": "error",
-            "error": error_msg
-        }
+        Returns:
+            Markdown for the test cases completed by this fragment ("" if none)
+        """
+        offset = len(self.buffer)
+        self.buffer += fragment
+        markdown = []
+        for index in range(offset, len(self.buffer)):
+            char = self.buffer[index]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in "{[":
+                if char == "[" and self.depth == 1 and re.search(r'"test_cases"\s*:\s*$', self.buffer[:index]):
+                    self.in_test_cases = True
+                elif char == "{" and self.in_test_cases and self.depth == 2:
+                    self.record_start = index
+                self.depth += 1
+            elif char in "}]":
+                self.depth -= 1
+                if self.record_start is not None and self.depth == 2:
+                    markdown.append(self._render(self.buffer[self.record_start:index + 1]))
+                    self.record_start = None
+                elif self.in_test_cases and self.depth == 1:
+                    self.in_test_cases = False
+        return "".join(markdown)
+    
+    def _render(self, record: str) -> str:
+        try:
+            test_case = TestCase.model_validate_json(record)
+        except ValidationError:
+            return ""
+        self.rendered += 1
+        return ("## Test Cases\n\n" if self.rendered == 1 else "\n\n---\n\n") + test_case.to_markdown()
+
+
+def split_document(pdf_content: str, max_chars: int = PROMPT_CHAR_BUDGET) -> List[str]:
+    """
+    Split extracted text into chunks of at most max_chars for chunked generation.
+    
+    Chunks break on page markers where possible, then on blank lines between
+    sections, and only hard-cut text that has no break at all.
+    
+    Args:
+        pdf_content: Extracted text content from PDF
+        max_chars: Maximum characters per chunk
+        
+    Returns:
+        List of text chunks in document order
+    """
+    pieces = []
+    for page in PAGE_MARKER_PATTERN.split(pdf_content):
+        if len(page) <= max_chars:
+            pieces.append(page)
+            continue
+        for section in SECTION_BREAK_PATTERN.split(page):
+            pieces.extend(section[i:i + max_chars] for i in range(0, len(section), max_chars))
+    
+    chunks = []
+    current = ""
+    for piece in pieces:
+        piece = piece.strip()
+        if not piece:
+            continue
+        if current and len(current) + len(piece) + 2 > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    
+    return chunks
+
+
+def merge_testcase_results(results: List[dict]) -> dict:
+    """
+    Reduce per-chunk generation results into one test suite.
+    
+    Test cases are collected in chunk order, duplicates (same title) are
+    dropped and the remainder is renumbered TC-001, TC-002, ... The suite
+    header and closing notes are taken from the first successful chunk.
+    Structured results are merged record by record; markdown-only results
+    are merged as text.
+    
+    Args:
+        results: Generation results, one per chunk
+        
+    Returns:
+        dict in the same shape as generate_healthcare_testcases, plus
+        'chunks' and, if some chunks failed, 'chunk_errors'
+    """
+    succeeded = [result for result in results if "error" not in result]
+    if not succeeded:
+        return {**results[0], "chunks": len(results)}
+    
+    if all("test_suite" in result for result in succeeded):
+        suite = _merge_test_suites([TestSuite(**result["test_suite"]) for result in succeeded])
+        merged = {"text": suite.to_markdown(), "test_suite": suite.model_dump()}
+    else:
+        merged = {"text": _merge_testcase_markdown([result.get("text", "") for result in succeeded])}
+    
+    usage = {}
+    for result in succeeded:
+        for key, value in (result.get("usage") or {}).items():
+            usage[key] = usage.get(key, 0) + (value or 0)
+    
+    merged.update({
+        "model": succeeded[0].get("model", MODEL_NAME),
+        "usage": usage,
+        "status": "success",
+        "chunks": len(results)
+    })
+    if succeeded[0].get("tier"):
+        merged["tier"] = succeeded[0]["tier"]
+    models = [result.get("model") for result in succeeded]
+    if len(set(models)) > 1:
+        # Some chunks were served by a fallback model
+        merged["chunk_models"] = models
+    latencies = [result["latency_ms"] for result in succeeded if "latency_ms" in result]
+    if latencies:
+        # Chunks run concurrently, so the slowest one bounds the wall-clock time
+        merged["latency_ms"] = max(latencies)
+    budgets = [result["max_output_tokens"] for result in succeeded if "max_output_tokens" in result]
+    if budgets:
+        merged["max_output_tokens"] = max(budgets)
+    chunk_errors = [result["error"] for result in results if "error" in result]
+    if chunk_errors:
+        merged["chunk_errors"] = chunk_errors
+    return merged
+
+
+def _title_key(title: str) -> str:
+    return re.sub(r"[^a-z0-9]+", " ", title.lower()).strip()
+
+
+def _merge_test_suites(suites: List[TestSuite]) -> TestSuite:
+    test_cases = []
+    seen_titles = set()
+    notes = {"key_decision_points": [], "test_data_requirements": [], "compliance_checks": []}
+    for suite in suites:
+        for test_case in suite.test_cases:
+            if _title_key(test_case.title) in seen_titles:
+                continue
+            seen_titles.add(_title_key(test_case.title))
+            test_cases.append(test_case.model_copy(update={"id": f"TC-{len(test_cases) + 1:03d}"}))
+        for field, items in notes.items():
+            items.extend(item for item in getattr(suite, field) if item not in items)
+    
+    return suites[0].model_copy(update={"test_cases": test_cases, **notes})
+
+
+def _merge_testcase_markdown(texts: List[str]) -> str:
+    header = trailer = None
+    testcases = []
+    seen_titles = set()
+    for text in texts:
+        headings = list(TESTCASE_HEADING_PATTERN.finditer(text))
+        if header is None:
+            header = text[:headings[0].start()] if headings else text
+        for index, heading in enumerate(headings):
+            end = headings[index + 1].start() if index + 1 < len(headings) else len(text)
+            block = text[heading.end():end]
+            if index + 1 == len(headings):
+                # The last test case runs into the suite's closing sections
+                notes = re.search(r"(?m)^## ", block)
+                if notes:
+                    if trailer is None:
+                        trailer = block[notes.start():]
+                    block = block[:notes.start()]
+            
+            title_key = _title_key(heading.group(1))
+            if title_key in seen_titles:
+                continue
+            seen_titles.add(title_key)
+            testcases.append((heading.group(1).strip(), re.sub(r"\s*-{3,}$", "", block.rstrip())))
+    
+    body = "\n\n---\n\n".join(
+        f"### TC-{number:03d}: {title}{content}" for number, (title, content) in enumerate(testcases, start=1)
+    )
+    return f"{(header or '').rstrip()}\n\n{body}\n\n{trailer or ''}".strip() + "\n"
+
+
+async def generate_healthcare_testcases_chunked(pdf_content: str, max_chars: int = PROMPT_CHAR_BUDGET,
+                                                concurrency: int = CHUNK_GENERATION_CONCURRENCY, on_chunk=None,
+                                                model: Optional[str] = None, temperature: Optional[float] = None,
+                                                max_output_tokens: Optional[int] = None, use_cache: bool = True,
+                                                depth: str = "standard"):
+    """
+    Generate test cases for a document longer than one prompt (map-reduce).
+    
+    The text is split with split_document (at most MAX_GENERATION_CHUNKS
+    chunks), the chunks are sent to Gemini concurrently with at most
+    `concurrency` calls in flight, and the results are combined with
+    merge_testcase_results. Documents that fit in one prompt are generated
+    with a single call. The model is routed once for the whole document.
+    
+    Args:
+        pdf_content: Extracted text content from PDF
+        max_chars: Maximum characters per chunk
+        concurrency: Maximum concurrent Gemini calls
+        on_chunk: Optional callback; single-prompt documents are streamed, chunked
+            documents pass the merged markdown once it is ready
+        model, temperature, max_output_tokens, use_cache, depth: See generate_healthcare_testcases_async
+        
+    Returns:
+        dict with generated test cases and solutions
+    """
+    chunks = split_document(pdf_content, max_chars)[:MAX_GENERATION_CHUNKS]
+    overrides = {"model": model, "temperature": temperature, "max_output_tokens": max_output_tokens,
+                 "use_cache": use_cache, "depth": depth}
+    if len(chunks) <= 1:
+        if on_chunk is not None:
+            return await generate_healthcare_testcases_streaming(pdf_content, on_chunk, **overrides)
+        return await generate_healthcare_testcases_async(pdf_content, **overrides)
+    
+    routes = route_model(len(pdf_content), depth, model)
+    
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    
+    async def generate_chunk(index: int, chunk: str):
+        async with semaphore:
+            return await _generate_content(chunk, routes, temperature, max_output_tokens, part=(index, len(chunks)),
+                                           use_cache=use_cache)
+    
+    results = await asyncio.gather(*(generate_chunk(index, chunk) for index, chunk in enumerate(chunks, start=1)))
+    merged = merge_testcase_results(results)
+    
+    if on_chunk is not None and "error" not in merged:
+        on_chunk(merged["text"])
+    return merged
+
+
+def select_relevant_context(pdf_content: str, query: str, max_chars: int = PARTIAL_CONTEXT_CHARS) -> str:
+    """
+    Pick the guideline sections that best match a query.
+    
+    The document is split into sections of about PARTIAL_SECTION_CHARS (see
+    split_document) and ranked by how many distinct query terms (words and
+    clinical values) each contains. The best sections that fit in max_chars
+    are returned in document order; if nothing matches, the earliest
+    sections are used.
+    
+    Args:
+        pdf_content: Extracted text content from PDF
+        query: Text describing what the prompt is about
+        max_chars: Maximum characters of context
+        
+    Returns:
+        Selected sections separated by blank lines
+    """
+    sections = split_document(pdf_content, PARTIAL_SECTION_CHARS)
+    terms = set(CONTEXT_TERM_PATTERN.findall(query.lower())) - CONTEXT_STOPWORDS
+    scores = [len(terms & set(CONTEXT_TERM_PATTERN.findall(section.lower()))) for section in sections]
+    
+    selected = []
+    used = 0
+    for index in sorted(range(len(sections)), key=lambda index: (-scores[index], index)):
+        if used + len(sections[index]) <= max_chars:
+            selected.append(index)
+            used += len(sections[index]) + 2
+    return "\n\n".join(sections[index] for index in sorted(selected))
+
+
+def build_partial_prompt(context: str, suite: TestSuite, replaced: List[TestCase], new_ids: List[str],
+                         instructions: Optional[str] = None) -> str:
+    """
+    Build the prompt for rewriting and/or adding individual test cases.
+    
+    Args:
+        context: Relevant guideline sections (see select_relevant_context)
+        suite: The stored test suite
+        replaced: Test cases to rewrite
+        new_ids: IDs for the test cases to add
+        instructions: Optional reviewer guidance
+        
+    Returns:
+        Prompt text
+    """
+    tasks = []
+    if replaced:
+        tasks.append(
+            "Rewrite these test cases, which reviewers rejected. Keep each ID and the decision logic it "
+            "targets, but fix what made it weak (vague values, wrong expectations, overlap with other test "
+            "cases):\n\n" + "\n\n---\n\n".join(test_case.to_markdown() for test_case in replaced)
+        )
+    if new_ids:
+        tasks.append(f"Add {len(new_ids)} new test case(s) covering decision logic that the existing test "
+                     f"cases miss.")
+    if instructions:
+        tasks.append(f"REVIEWER INSTRUCTIONS: {instructions}")
+    
+    existing = "\n".join(f"- {test_case.id}: {test_case.title} [{test_case.priority}, {test_case.type}]"
+                         for test_case in suite.test_cases)
+    target_ids = [test_case.id for test_case in replaced] + new_ids
+    
+    return f"""{PROMPT_PREAMBLE}
+
+You are revising an existing CDSS test suite for "{suite.title}" ({suite.guideline_type or "Clinical Guideline"}). Only the guideline sections relevant to this revision are included.
+
+RELEVANT GUIDELINE SECTIONS:
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+{context}
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+EXISTING TEST CASES (do not duplicate them):
+{existing}
+
+TASK:
+{chr(10).join(tasks)}
+
+REQUIREMENTS:
+- Include specific clinical values (vital signs, lab results, ages, etc.)
+- Base every expected decision on the guideline sections above
+- Return JSON matching the response schema: a test_cases list with exactly {len(target_ids)} test case(s), with IDs {", ".join(target_ids)} in that order
+- Put every input condition, expected decision/action and validation point in its own list item, without markdown bullets or ✓ marks
+"""
+
+
+async def regenerate_testcases_async(pdf_content: str, suite: TestSuite, replace_ids: List[str], add: int = 0,
+                                     instructions: Optional[str] = None, model: Optional[str] = None,
+                                     temperature: Optional[float] = None, use_cache: bool = True,
+                                     depth: str = "standard") -> dict:
+    """
+    Rewrite or add individual test cases without regenerating the suite.
+    
+    Only the guideline sections relevant to the affected test cases (and the
+    reviewer instructions) are sent, together with the IDs and titles of the
+    other test cases, and the output budget is sized for the requested test
+    cases alone. Responses are always schema-constrained JSON. Model routing,
+    fallbacks, hedging and the response cache work as in
+    generate_healthcare_testcases_async.
+    
+    Args:
+        pdf_content: Extracted text content from PDF
+        suite: The stored test suite
+        replace_ids: IDs of test cases to rewrite (must exist in suite)
+        add: Number of test cases to add
+        instructions: Optional reviewer guidance, e.g. 'pediatric edge cases'
+        model, temperature, use_cache, depth: See generate_healthcare_testcases_async
+        
+    Returns:
+        dict with 'test_cases' (records for replace_ids, then the added IDs),
+        model, tier and usage, or 'error'
+    """
+    replaced = [test_case for test_case in suite.test_cases if test_case.id in replace_ids]
+    new_ids = suite.next_testcase_ids(add)
+    target_ids = [test_case.id for test_case in replaced] + new_ids
+    
+    query = [instructions or ""]
+    query += [f"{tc.title} {tc.type} {tc.scenario} {' '.join(tc.inputs)}" for tc in replaced]
+    if new_ids:
+        query += [suite.title] + suite.key_decision_points
+    prompt = build_partial_prompt(select_relevant_context(pdf_content, " ".join(query)), suite, replaced, new_ids,
+                                  instructions)
+    
+    routes = route_model(len(pdf_content), depth, model)
+    routed = routes[0]
+    cache_key = _partial_cache_key(prompt, routed, temperature, len(target_ids))
+    cached = _lookup_response_cache(cache_key, use_cache)
+    if cached is not None:
+        return cached
+    
+    prompt_tokens = await count_prompt_tokens(prompt, routed["model"])
+    for index, route in enumerate(routes):
+        model = route["model"]
+        budget = _partial_budget(route, len(target_ids))
+        config = GenerateContentConfig(
+            system_instruction=SYSTEM_INSTRUCTION,
+            temperature=DEFAULT_TEMPERATURE if temperature is None else temperature,
+            top_p=0.95,
+            max_output_tokens=budget,
+            response_modalities=["TEXT"],
+            response_mime_type="application/json",
+            response_schema=TEST_CASES_SCHEMA,
+        )
+        last = index + 1 == len(routes)
+        started = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(
+                hedged(model, lambda: governed_call(
+                    client.aio.models.generate_content,
+                    model=model,
+                    contents=prompt,
+                    config=config,
+                    estimated_tokens=prompt_tokens,
+                    max_retries=GEMINI_MAX_RETRIES if last else FALLBACK_AFTER_ATTEMPTS
+                )),
+                TIMEOUT
+            )
+        except Exception as e:
+            e = _timeout_error(e, model)
+            if not last and _should_fall_back(e):
+                print(f"Warning: {model} failed ({str(e)}); falling back to {routes[index + 1]['model']}")
+                continue
+            return {**_generation_error(e, model), "tier": route["tier"]}
+        
+        result = _parse_partial_response(response, model, target_ids)
+        result["tier"] = route["tier"]
+        result["max_output_tokens"] = budget
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000)
+        result["usage"]["preflight_prompt_tokens"] = prompt_tokens
+        record_token_usage(model, result["usage"])
+        if "error" in result:
+            return result
+        if index:
+            result["fallback_from"] = routed["model"]
+        # Kept under the routed model's key, the one lookups use
+        store_cached_llm_response(cache_key, result)
+        return result
+
+
+def _partial_budget(route: dict, testcase_count: int) -> int:
+    return min(route["max_output_tokens"], PARTIAL_TOKENS_PER_TESTCASE * (testcase_count + 1))
+
+
+def _partial_cache_key(prompt: str, route: dict, temperature: Optional[float], testcase_count: int) -> str:
+    return llm_response_cache_key(route["model"], prompt, {
+        "system_instruction": SYSTEM_INSTRUCTION,
+        "prompt_version": PARTIAL_PROMPT_VERSION,
+        "temperature": DEFAULT_TEMPERATURE if temperature is None else temperature,
+        "top_p": 0.95,
+        "max_output_tokens": _partial_budget(route, testcase_count)
+    })
+
+
+def _parse_partial_response(response, model: str, target_ids: List[str]) -> dict:
+    """
+    Validate a partial regeneration response into test case records.
+    
+    Test cases are matched to target_ids by position, so the stored IDs are
+    kept whatever the model wrote; extra test cases are dropped.
+    """
+    usage = _usage_from_metadata(getattr(response, 'usage_metadata', None))
+    try:
+        items = json.loads(getattr(response, 'text', None) or "")["test_cases"]
+        if len(items) < len(target_ids):
+            raise ValueError(f"returned {len(items)} of {len(target_ids)} test cases")
+        test_cases = [TestCase(**{**item, "id": testcase_id}).model_dump()
+                      for item, testcase_id in zip(items, target_ids)]
+    except (ValueError, KeyError, TypeError) as e:
+        error = _generation_error(ValueError(f"response did not match the test case schema: {str(e)}"), model)
+        return {**error, "usage": usage}
+    
+    return {
+        "test_cases": test_cases,
+        "model": model,
+        "usage": usage,
+        "status": "success"
+    }
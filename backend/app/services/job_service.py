@@ -0,0 +1,240 @@
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional
+
+# Job configuration
+JOB_TTL_SECONDS = 60 * 60  # Finished jobs are kept for polling for 1 hour
+TERMINAL_STATUSES = ("completed", "failed")
+
+# Job registry shared by every worker process on the host, so polling and
+# the SSE stream work whichever worker a request reaches
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join(tempfile.gettempdir(), "testcaseai-cache", "jobs.sqlite3"))
+
+_initialized = False
+
+
+def _connect() -> sqlite3.Connection:
+    global _initialized
+    connection = sqlite3.connect(JOB_DB_PATH, timeout=5, isolation_level=None)
+    # Jobs are short-lived progress records: skip the fsync on every streamed chunk
+    connection.execute("PRAGMA synchronous=NORMAL")
+    if not _initialized:
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, state TEXT, finished REAL)")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS job_events (seq INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT, event TEXT)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS job_events_by_job ON job_events (job_id, seq)")
+        _initialized = True
+    return connection
+
+
+@contextmanager
+def _transaction(mode: str = "IMMEDIATE"):
+    # Readers use a DEFERRED transaction so polling never takes the write lock
+    connection = _connect()
+    try:
+        connection.execute(f"BEGIN {mode}")
+        yield connection
+        connection.execute("COMMIT")
+    except BaseException:
+        if connection.in_transaction:
+            connection.execute("ROLLBACK")
+        raise
+    finally:
+        connection.close()
+
+
+def _load(connection, job_id: str) -> Optional[dict]:
+    row = connection.execute("SELECT state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def _store(connection, job: dict, event: dict) -> None:
+    finished = time.time() if job["status"] in TERMINAL_STATUSES else None
+    connection.execute(
+        "UPDATE jobs SET state = ?, finished = ? WHERE id = ?",
+        (json.dumps(job, default=str), finished, job["job_id"])
+    )
+    _add_event(connection, job["job_id"], event)
+
+
+def _add_event(connection, job_id: str, event: dict) -> None:
+    connection.execute(
+        "INSERT INTO job_events (job_id, event) VALUES (?, ?)", (job_id, json.dumps(event, default=str))
+    )
+
+
+def _prune_expired_jobs(connection):
+    """
+    Drop finished jobs older than JOB_TTL_SECONDS and their events.
+    """
+    cutoff = time.time() - JOB_TTL_SECONDS
+    connection.execute("DELETE FROM job_events WHERE job_id IN (SELECT id FROM jobs WHERE finished < ?)", (cutoff,))
+    connection.execute("DELETE FROM jobs WHERE finished < ?", (cutoff,))
+
+
+def create_job(filename: str, file_id: Optional[str] = None) -> dict:
+    """
+    Register a new upload job in the 'queued' stage.
+
+    Args:
+        filename: Original filename of the uploaded PDF
+        file_id: Unique file identifier the pipeline will use
+
+    Returns:
+        dict with the public job state
+    """
+    job_id = str(uuid.uuid4())
+    now = datetime.now().isoformat()
+
+    job = {
+        "job_id": job_id,
+        "file_id": file_id,
+        "filename": filename,
+        "status": "queued",
+        "stage": "queued",
+        "created_at": now,
+        "updated_at": now,
+        "result": None,
+        "error": None,
+    }
+
+    with _transaction() as connection:
+        _prune_expired_jobs(connection)
+        connection.execute("INSERT INTO jobs (id, state, finished) VALUES (?, ?, NULL)", (job_id, json.dumps(job)))
+        _add_event(connection, job_id, {"stage": "queued", "timestamp": now})
+
+    return get_job(job_id)
+
+
+def update_job_stage(job_id: str, stage: str, **details) -> None:
+    """
+    Record that a job has reached a pipeline stage.
+
+    Args:
+        job_id: Job identifier
+        stage: Stage name (e.g. 'extracting', 'stored', 'generating', 'persisted')
+        **details: Extra information to attach to the progress event
+    """
+    now = datetime.now().isoformat()
+    with _transaction() as connection:
+        job = _load(connection, job_id)
+        if job is None:
+            return
+        job["status"] = "running"
+        job["stage"] = stage
+        job["updated_at"] = now
+        _store(connection, job, {"stage": stage, "timestamp": now, **details})
+
+
+def append_job_output(job_id: str, text: str) -> None:
+    """
+    Record a fragment of streamed test case output for a running job.
+
+    Fragments are delivered to SSE subscribers as 'chunk' events but are not
+    included in the polled job state.
+
+    Args:
+        job_id: Job identifier
+        text: Markdown fragment as received from the model
+    """
+    with _transaction() as connection:
+        if connection.execute("SELECT 1 FROM jobs WHERE id = ?", (job_id,)).fetchone() is None:
+            return
+        _add_event(connection, job_id, {"stage": "generating", "chunk": text})
+
+
+def complete_job(job_id: str, result: dict) -> None:
+    """
+    Mark a job as completed and store the pipeline result.
+
+    Args:
+        job_id: Job identifier
+        result: Final upload response payload
+    """
+    _finish_job(job_id, "completed", result=result)
+
+
+def fail_job(job_id: str, error: str, status_code: int = 500) -> None:
+    """
+    Mark a job as failed.
+
+    Args:
+        job_id: Job identifier
+        error: Human readable error message
+        status_code: HTTP status the synchronous endpoint would have returned
+    """
+    _finish_job(job_id, "failed", error=error, status_code=status_code)
+
+
+def _finish_job(job_id: str, status: str, result: Optional[dict] = None,
+                error: Optional[str] = None, status_code: Optional[int] = None) -> None:
+    now = datetime.now().isoformat()
+    with _transaction() as connection:
+        job = _load(connection, job_id)
+        if job is None:
+            return
+        job["status"] = status
+        job["stage"] = status
+        job["updated_at"] = now
+        job["result"] = result
+        job["error"] = error
+        event = {"stage": status, "timestamp": now}
+        if error:
+            event["error"] = error
+            event["status_code"] = status_code
+        _store(connection, job, event)
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    """
+    Get the public state of a job.
+
+    Args:
+        job_id: Job identifier
+
+    Returns:
+        dict with job state, or None if the job is unknown or expired
+    """
+    with _transaction("DEFERRED") as connection:
+        job = _load(connection, job_id)
+        if job is None:
+            return None
+        rows = connection.execute("SELECT event FROM job_events WHERE job_id = ? ORDER BY seq", (job_id,))
+        events = (json.loads(row[0]) for row in rows)
+        job["events"] = [event for event in events if "chunk" not in event]
+        return job
+
+
+def get_job_events(job_id: str, start: int = 0) -> Optional[tuple]:
+    """
+    Get progress events recorded after a given index.
+
+    Args:
+        job_id: Job identifier
+        start: Index of the first event to return
+
+    Returns:
+        tuple of (events, finished), or None if the job is unknown
+    """
+    with _transaction("DEFERRED") as connection:
+        job = _load(connection, job_id)
+        if job is None:
+            return None
+        rows = connection.execute(
+            "SELECT event FROM job_events WHERE job_id = ? ORDER BY seq LIMIT -1 OFFSET ?", (job_id, start)
+        )
+        return [json.loads(row[0]) for row in rows], job["status"] in TERMINAL_STATUSES
+
+
+try:
+    os.makedirs(os.path.dirname(JOB_DB_PATH), exist_ok=True)
+except OSError as e:
+    print(f"Warning: Cannot create job registry directory: {str(e)}")
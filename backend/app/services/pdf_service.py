@@ -1,37 +1,124 @@
-from pypdf import PdfReader
+import hashlib
 import io
+import math
+import mmap
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from typing import Optional
+import pypdf
+from pypdf import PdfReader, PasswordType
+from app.services.cache_backends import LRUCache, DiskCache, TieredCache
+from app.services.executors import pdf_executor, run_in_executor
 
-def extract_text_from_pdf(pdf_bytes: bytes) -> dict:
+# Documents with at least this many pages are extracted on the process pool
+PARALLEL_PAGE_THRESHOLD = int(os.getenv("PDF_PARALLEL_PAGE_THRESHOLD", "40"))
+PDF_PROCESS_WORKERS = int(os.getenv("PDF_PROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Smallest page range handed to a single worker task
+MIN_PAGES_PER_TASK = 8
+# Rough characters-per-token ratio used to turn token budgets into character budgets
+CHARS_PER_TOKEN = 4
+
+# Preflight: pages sampled for text operators, how far into the file to look
+# for the header, and the block size when searching backwards for %%EOF
+PREFLIGHT_SAMPLE_PAGES = int(os.getenv("PDF_PREFLIGHT_SAMPLE_PAGES", "3"))
+PREFLIGHT_HEADER_BYTES = 1024
+PREFLIGHT_TRAILER_BYTES = 64 * 1024
+# A literal ")", hex ">" or array "]" string operand followed by a text-showing operator
+TEXT_OPERATOR_PATTERN = re.compile(rb"[)\]>]\s*(?:Tj|TJ|'|\")")
+
+# Per-page extraction cache (memory tier per process, disk tier shared by all)
+PAGE_CACHE_ENABLED = os.getenv("PDF_PAGE_CACHE_ENABLED", "true").lower() == "true"
+PAGE_CACHE_MEMORY_ENTRIES = int(os.getenv("PDF_PAGE_CACHE_MEMORY_ENTRIES", "4096"))
+PAGE_CACHE_MEMORY_BYTES = int(os.getenv("PDF_PAGE_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024)))
+PAGE_CACHE_DIR = os.getenv("PDF_PAGE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "testcaseai-cache", "pdf-pages"))
+PAGE_CACHE_DISK_BYTES = int(os.getenv("PDF_PAGE_CACHE_DISK_BYTES", str(256 * 1024 * 1024)))
+
+_process_pool = None
+
+_page_cache = TieredCache(
+    LRUCache(PAGE_CACHE_MEMORY_ENTRIES, max_bytes=PAGE_CACHE_MEMORY_BYTES),
+    DiskCache(PAGE_CACHE_DIR, PAGE_CACHE_DISK_BYTES),
+    encode=lambda text: text.encode("utf-8"),
+    decode=lambda data: data.decode("utf-8")
+)
+# Page-level totals, including pages extracted by process pool workers
+_page_stats = {"hits": 0, "misses": 0}
+_page_stats_lock = threading.Lock()
+
+
+def extract_text_from_pdf(pdf_bytes, parallel: Optional[bool] = None, max_chars: Optional[int] = None,
+                          max_tokens: Optional[int] = None) -> dict:
     """
     Extract text content from a PDF file.
     
+    Large documents (PARALLEL_PAGE_THRESHOLD pages or more) are split into page
+    ranges that are extracted on a process pool, since pypdf text extraction is
+    CPU-bound pure Python.
+    
+    With a character or token budget, extraction stops as soon as the budget
+    is met and the rest of the document is never parsed for text. Small
+    documents are pulled page by page; documents taking the process pool are
+    extracted in MIN_PAGES_PER_TASK-page ranges, at most PDF_PROCESS_WORKERS
+    in flight at once, consumed in page order until the budget is met.
+    
     Args:
-        pdf_bytes: PDF file content as bytes
+        pdf_bytes: PDF file content as bytes, or a seekable binary file object
+            (read in place without copying it into memory)
+        parallel: Force (True) or disable (False) process-pool extraction;
+            None chooses by page count
+        max_chars: Stop once the extracted text reaches this many characters
+        max_tokens: Stop once the extracted text reaches roughly this many tokens
         
     Returns:
-        dict with 'text' (extracted content) and 'pages' (number of pages)
+        dict with 'text' (extracted content), 'pages' (true number of pages),
+        'pages_extracted' and 'truncated' (whether pages were left unread)
         
     Raises:
         ValueError: If PDF is invalid or cannot be read
     """
     try:
-        # Create a PDF reader from bytes
-        pdf_file = io.BytesIO(pdf_bytes)
+        # Create a PDF reader from bytes or an already open file
+        pdf_file = _as_pdf_stream(pdf_bytes)
         reader = PdfReader(pdf_file)
         
-        # Extract text from all pages
-        text_content = []
         num_pages = len(reader.pages)
+        budget = _char_budget(max_chars, max_tokens)
+        if parallel is None:
+            parallel = num_pages >= PARALLEL_PAGE_THRESHOLD
+        
+        pages_extracted = num_pages
+        text_content = None
+        if parallel and PDF_PROCESS_WORKERS > 1 and num_pages > 1:
+            parallel_result = _extract_pages_parallel(pdf_file, num_pages, budget)
+            if parallel_result is not None:
+                text_content, pages_extracted = parallel_result
         
-        for page_num, page in enumerate(reader.pages, 1):
-            try:
-                page_text = page.extract_text()
-                if page_text.strip():  # Only add non-empty pages
-                    text_content.append(f"--- Page {page_num} ---\n{page_text}")
-            except Exception as page_error:
-                print(f"Warning: Could not extract text from page {page_num}: {str(page_error)}")
-                continue
+        if text_content is None and budget is not None:
+            # Pull pages lazily until the budget is met
+            text_content = []
+            length = 0
+            pages_extracted = 0
+            pages = iter_pdf_pages(reader)
+            for page in pages:
+                pages_extracted = page["page"]
+                if page["text"] is None:
+                    continue
+                text_content.append(page["text"])
+                length += len(page["text"]) + 2
+                if length >= budget:
+                    break
+            pages.close()
+        
+        if text_content is None:
+            text_content, cache_counts = _extract_page_texts(reader, 0, num_pages)
+            _record_page_stats(cache_counts)
         
         full_text = "\n\n".join(text_content)
         
@@ -41,6 +128,8 @@ def extract_text_from_pdf(pdf_bytes: bytes) -> dict:
         return {
             "text": full_text,
             "pages": num_pages,
+            "pages_extracted": pages_extracted,
+            "truncated": pages_extracted < num_pages,
             "success": True
         }
         
@@ -53,6 +142,441 @@ def extract_text_from_pdf(pdf_bytes: bytes) -> dict:
         }
 
 
+def iter_pdf_pages(pdf_bytes, start: int = 0, end: Optional[int] = None):
+    """
+    Lazily extract a PDF page by page.
+    
+    Nothing is extracted until the caller asks for the next page, so stopping
+    early skips the remaining pages entirely.
+    
+    Args:
+        pdf_bytes: PDF bytes, a seekable binary file object, or an open PdfReader
+        start: Index of the first page to extract
+        end: Index after the last page to extract (default: last page)
+        
+    Yields:
+        dict with 'page' (1-based page number) and 'text' (formatted as
+        '--- Page N ---' plus the page text, or None for empty/unreadable pages)
+    """
+    reader = pdf_bytes if isinstance(pdf_bytes, PdfReader) else PdfReader(_as_pdf_stream(pdf_bytes))
+    if end is None:
+        end = len(reader.pages)
+    
+    cache_counts = {"hits": 0, "misses": 0}
+    try:
+        for page_num in range(start + 1, end + 1):
+            yield {"page": page_num, "text": _extract_page_text(reader, page_num, cache_counts)}
+    finally:
+        _record_page_stats(cache_counts)
+
+
+def _extract_page_texts(reader: PdfReader, start: int, end: int, numbered: bool = False) -> tuple:
+    """
+    Extract formatted text for pages [start, end), skipping empty pages.
+    
+    Returns:
+        tuple of (formatted page texts, or (page number, text) pairs when
+        numbered, and {"hits": n, "misses": n})
+    """
+    cache_counts = {"hits": 0, "misses": 0}
+    text_content = []
+    
+    for page_num in range(start + 1, end + 1):
+        page_text = _extract_page_text(reader, page_num, cache_counts)
+        if page_text is not None:
+            text_content.append((page_num, page_text) if numbered else page_text)
+    
+    return text_content, cache_counts
+
+
+def _extract_page_text(reader: PdfReader, page_num: int, cache_counts: dict) -> Optional[str]:
+    """
+    Extract one page's formatted text, or None if it is empty or unreadable.
+    
+    Pages whose content hash is in the page cache skip pypdf text layout.
+    """
+    try:
+        page = reader.pages[page_num - 1]
+        page_key = _page_cache_key(page) if PAGE_CACHE_ENABLED else None
+        page_text = _page_cache.get(page_key) if page_key else None
+        
+        if page_text is None:
+            page_text = page.extract_text()
+            if page_key:
+                cache_counts["misses"] += 1
+                _page_cache.set(page_key, page_text)
+        else:
+            cache_counts["hits"] += 1
+        
+        if page_text.strip():  # Only add non-empty pages
+            return f"--- Page {page_num} ---\n{page_text}"
+    except Exception as page_error:
+        print(f"Warning: Could not extract text from page {page_num}: {str(page_error)}")
+    
+    return None
+
+
+def _char_budget(max_chars: Optional[int], max_tokens: Optional[int]) -> Optional[int]:
+    budgets = [budget for budget in (max_chars, max_tokens * CHARS_PER_TOKEN if max_tokens else None) if budget]
+    return min(budgets) if budgets else None
+
+
+def _page_cache_key(page) -> Optional[str]:
+    """
+    Hash everything that determines a page's extracted text.
+    
+    That is the decoded content stream plus the fonts (and their ToUnicode
+    maps) and form XObjects it references, along with the pypdf version whose
+    layout produced the cached text.
+    
+    Returns:
+        Hex digest, or None if the page cannot be fingerprinted
+    """
+    try:
+        contents = page.get_contents()
+        if contents is None:
+            return None
+        
+        digest = hashlib.sha256(f"pypdf-{pypdf.__version__}".encode("utf-8"))
+        digest.update(contents.get_data())
+        
+        resources = page.get("/Resources")
+        resources = resources.get_object() if resources is not None else {}
+        
+        fonts = resources.get("/Font")
+        fonts = fonts.get_object() if fonts is not None else {}
+        for name in sorted(fonts):
+            font = fonts[name].get_object()
+            digest.update(f"{name}:{font.get('/BaseFont')}:{font.get('/Subtype')}:{font.get('/Encoding')}".encode("utf-8"))
+            to_unicode = font.get("/ToUnicode")
+            if to_unicode is not None:
+                digest.update(to_unicode.get_object().get_data())
+        
+        xobjects = resources.get("/XObject")
+        xobjects = xobjects.get_object() if xobjects is not None else {}
+        for name in sorted(xobjects):
+            xobject = xobjects[name].get_object()
+            if xobject.get("/Subtype") == "/Form":
+                digest.update(name.encode("utf-8"))
+                digest.update(xobject.get_data())
+        
+        return digest.hexdigest()
+        
+    except Exception:
+        return None
+
+
+def _record_page_stats(cache_counts: dict) -> None:
+    with _page_stats_lock:
+        _page_stats["hits"] += cache_counts["hits"]
+        _page_stats["misses"] += cache_counts["misses"]
+
+
+def get_page_cache_stats() -> dict:
+    """
+    Get page extraction cache statistics.
+    
+    Returns:
+        dict with page-level hit/miss totals (including process pool workers)
+        and the memory/disk tier statistics of this process
+    """
+    with _page_stats_lock:
+        hits, misses = _page_stats["hits"], _page_stats["misses"]
+    lookups = hits + misses
+    return {
+        "enabled": PAGE_CACHE_ENABLED,
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        "tiers": _page_cache.stats()
+    }
+
+
+def _extract_page_range_from_file(pdf_path: str, start: int, end: int) -> tuple:
+    """
+    Process pool worker: memory-map the PDF and extract pages [start, end).
+    """
+    with open(pdf_path, "rb") as pdf_file:
+        with mmap.mmap(pdf_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return _extract_page_texts(PdfReader(mapped), start, end, numbered=True)
+
+
+def _extract_pages_parallel(pdf_file, num_pages: int, budget: Optional[int] = None) -> Optional[tuple]:
+    """
+    Extract pages on the process pool, reassembled in page order.
+    
+    The document is shared with workers through a file they memory-map rather
+    than being pickled to each of them. Without a budget every page range is
+    submitted at once. With one, ranges of MIN_PAGES_PER_TASK pages are kept
+    PDF_PROCESS_WORKERS deep and the next is only submitted as the oldest
+    completes, so at most a window's worth of pages past the budget is read.
+    
+    Returns:
+        tuple of (formatted page texts, number of pages read), or None if the
+        pool is unavailable
+    """
+    pdf_path, temporary = _materialize_pdf(pdf_file)
+    in_flight = deque()
+    try:
+        if budget is None:
+            tasks = max(1, min(PDF_PROCESS_WORKERS * 2, num_pages // MIN_PAGES_PER_TASK))
+            pages_per_task = math.ceil(num_pages / tasks)
+        else:
+            pages_per_task = MIN_PAGES_PER_TASK
+        starts = iter(range(0, num_pages, pages_per_task))
+        window = num_pages if budget is None else PDF_PROCESS_WORKERS
+        
+        pool = _get_process_pool()
+        
+        def submit_next():
+            start = next(starts, None)
+            if start is not None:
+                in_flight.append(pool.submit(_extract_page_range_from_file, pdf_path, start,
+                                             min(start + pages_per_task, num_pages)))
+        
+        for _ in range(window):
+            submit_next()
+        
+        text_content = []
+        length = 0
+        while in_flight:
+            page_texts, cache_counts = in_flight.popleft().result()
+            _record_page_stats(cache_counts)
+            for page_num, page_text in page_texts:
+                text_content.append(page_text)
+                length += len(page_text) + 2
+                if budget is not None and length >= budget:
+                    return text_content, page_num
+            submit_next()
+        return text_content, num_pages
+        
+    except BrokenProcessPool as e:
+        print(f"Warning: PDF process pool unavailable, extracting serially: {str(e)}")
+        shutdown_process_pool(wait=False)
+        return None
+    finally:
+        # Ranges past the budget that have not started are dropped
+        for future in in_flight:
+            future.cancel()
+        if temporary:
+            os.unlink(pdf_path)
+
+
+def _materialize_pdf(pdf_file):
+    """
+    Get a filesystem path for the PDF that worker processes can open.
+    
+    Returns:
+        tuple of (path, whether the path is a temporary copy to delete)
+    """
+    name = getattr(pdf_file, "name", None)
+    if isinstance(name, str) and os.path.isfile(name):
+        return name, False
+    
+    pdf_file.seek(0)
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as temp_file:
+        shutil.copyfileobj(pdf_file, temp_file, 1024 * 1024)
+    pdf_file.seek(0)
+    return temp_file.name, True
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        # spawn: forking a process that runs boto3/executor threads is unsafe
+        _process_pool = ProcessPoolExecutor(
+            max_workers=PDF_PROCESS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _process_pool
+
+
+def _worker_ready() -> int:
+    return os.getpid()
+
+
+def warm_process_pool() -> None:
+    """
+    Start the PDF extraction worker processes ahead of the first large document.
+    
+    Spawned workers import this module (and pypdf) on their first task, which
+    otherwise lands on the first upload past PARALLEL_PAGE_THRESHOLD.
+    """
+    pool = _get_process_pool()
+    for future in [pool.submit(_worker_ready) for _ in range(PDF_PROCESS_WORKERS)]:
+        future.result()
+
+
+def shutdown_process_pool(wait: bool = True) -> None:
+    """
+    Shut down the PDF extraction process pool, if it was started.
+    """
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=wait, cancel_futures=True)
+        _process_pool = None
+
+
+def _as_pdf_stream(pdf_bytes):
+    if isinstance(pdf_bytes, (bytes, bytearray, memoryview)):
+        return io.BytesIO(pdf_bytes)
+    pdf_bytes.seek(0)
+    return pdf_bytes
+
+
+def preflight_pdf(pdf_bytes, sample_pages: int = PREFLIGHT_SAMPLE_PAGES) -> dict:
+    """
+    Triage a PDF in milliseconds before full extraction.
+    
+    Checks the %PDF- header, the %%EOF trailer (searched backwards from the
+    end, like pypdf, so trailing data after it is tolerated) and the
+    encryption dictionary, then samples pages spread evenly from the first to
+    the last (first, middle and last by default) for text-showing operators
+    with font resources.
+    Content streams are decoded, but no text layout runs unless no operator
+    is recognised, in which case the first sampled page's text is extracted
+    before the PDF is called scanned.
+    
+    Args:
+        pdf_bytes: PDF file content as bytes, or a seekable binary file object
+        sample_pages: Number of pages to inspect
+        
+    Returns:
+        dict with 'verdict' ('ok', 'encrypted', 'unsupported', 'scanned' or
+        'corrupt'), 'pages' (0 if unreadable) and 'reason' for any verdict
+        but 'ok'
+    """
+    pdf_file = _as_pdf_stream(pdf_bytes)
+    
+    header = pdf_file.read(PREFLIGHT_HEADER_BYTES)
+    if b"%PDF-" not in header:
+        return _preflight_verdict("corrupt", "Missing %PDF- header")
+    
+    if not _has_eof_marker(pdf_file):
+        return _preflight_verdict("corrupt", "Missing %%EOF trailer (file is truncated)")
+    
+    try:
+        pdf_file.seek(0)
+        reader = PdfReader(pdf_file)
+        if reader.is_encrypted and reader.decrypt("") == PasswordType.NOT_DECRYPTED:
+            return _preflight_verdict("encrypted", "PDF is password protected")
+        num_pages = len(reader.pages)
+    except pypdf.errors.DependencyError as e:
+        # AES encryption needs pypdf's optional cryptography dependency
+        print(f"Warning: Cannot decrypt PDF: {str(e)}")
+        return _preflight_verdict("unsupported", f"Unsupported PDF encryption: {str(e)}")
+    except Exception as e:
+        return _preflight_verdict("corrupt", f"Unreadable PDF structure: {str(e)}")
+    
+    if num_pages == 0:
+        return _preflight_verdict("corrupt", "PDF has no pages")
+    
+    sample = _sample_page_indexes(num_pages, sample_pages)
+    for index in sample:
+        try:
+            if _page_has_text(reader.pages[index]):
+                return {"verdict": "ok", "pages": num_pages}
+        except Exception as e:
+            print(f"Warning: Preflight could not inspect page {index + 1}: {str(e)}")
+    
+    # Text drawn in a way the operator scan does not recognise
+    try:
+        if reader.pages[sample[0]].extract_text().strip():
+            return {"verdict": "ok", "pages": num_pages}
+    except Exception as e:
+        print(f"Warning: Preflight could not extract page {sample[0] + 1}: {str(e)}")
+    
+    return _preflight_verdict(
+        "scanned", "No text found on sampled pages. The PDF might be image-based (scanned).", num_pages
+    )
+
+
+def _has_eof_marker(pdf_file) -> bool:
+    """
+    Search for %%EOF from the end of the file backwards, a block at a time.
+    """
+    marker = b"%%EOF"
+    end = pdf_file.seek(0, os.SEEK_END)
+    while end > 0:
+        start = max(0, end - PREFLIGHT_TRAILER_BYTES)
+        pdf_file.seek(start)
+        # Overlap the blocks so a marker split across them is still found
+        if marker in pdf_file.read(end - start + len(marker) - 1):
+            return True
+        end = start
+    return False
+
+
+def _sample_page_indexes(num_pages: int, sample_pages: int) -> list:
+    """
+    Indexes of up to sample_pages pages spread evenly over the document,
+    always including the first and last page.
+    """
+    count = max(1, min(sample_pages, num_pages))
+    if count == 1:
+        return [0]
+    return sorted({round(index * (num_pages - 1) / (count - 1)) for index in range(count)})
+
+
+def _preflight_verdict(verdict: str, reason: str, pages: int = 0) -> dict:
+    return {"verdict": verdict, "pages": pages, "reason": reason}
+
+
+def _page_has_text(page) -> bool:
+    """
+    Whether a page (or a form XObject it draws) shows text with a font resource.
+    """
+    resources = page.get("/Resources")
+    resources = resources.get_object() if resources is not None else {}
+    contents = page.get_contents()
+    if "/Font" in resources and contents is not None and TEXT_OPERATOR_PATTERN.search(contents.get_data()):
+        return True
+    
+    xobjects = resources.get("/XObject")
+    for xobject in (xobjects.get_object().values() if xobjects is not None else ()):
+        xobject = xobject.get_object()
+        if xobject.get("/Subtype") == "/Form" and _page_has_text(_FormPage(xobject)):
+            return True
+    return False
+
+
+class _FormPage:
+    """
+    Adapter giving a form XObject the get/get_contents interface of a page.
+    """
+    
+    def __init__(self, form):
+        self.form = form
+    
+    def get(self, key):
+        return self.form.get(key)
+    
+    def get_contents(self):
+        return self.form
+
+
+async def preflight_pdf_async(pdf_bytes) -> dict:
+    """
+    Run preflight_pdf on the dedicated PDF executor.
+    """
+    return await run_in_executor(pdf_executor, preflight_pdf, pdf_bytes)
+
+
+async def extract_text_from_pdf_async(pdf_bytes, parallel: Optional[bool] = None, max_chars: Optional[int] = None,
+                                      max_tokens: Optional[int] = None) -> dict:
+    """
+    Extract text content from a PDF file on the dedicated PDF executor.
+    
+    Args:
+        pdf_bytes: PDF file content as bytes, or a seekable binary file object
+        parallel, max_chars, max_tokens: See extract_text_from_pdf
+        
+    Returns:
+        Same result as extract_text_from_pdf
+    """
+    return await run_in_executor(pdf_executor, extract_text_from_pdf, pdf_bytes, parallel, max_chars, max_tokens)
+
+
 def validate_pdf_content(text: str, min_length: int = 50) -> bool:
     """
     Validate that extracted PDF text has sufficient content.
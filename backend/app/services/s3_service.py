@@ -1,31 +1,29 @@
-import boto3
-import os
+import gzip
+import io
+from boto3.s3.transfer import TransferConfig
 from datetime import datetime
-from dotenv import load_dotenv
+from app.services.aws_clients import s3_client, S3_TRANSFER_CONCURRENCY, warm_connections
+from app.services.executors import s3_executor, run_in_executor
 
-load_dotenv()
-
-# AWS Configuration
-AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
-AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-AWS_REGION = os.getenv("AWS_REGION")
 S3_BUCKET_NAME = "testcaseai-pdf-storage"
 
-# Initialize S3 client
-s3_client = boto3.client(
-    's3',
-    aws_access_key_id=AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-    region_name=AWS_REGION
+# Files above the threshold are sent as concurrent multipart uploads
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=S3_TRANSFER_CONCURRENCY,
 )
 
 
-def upload_pdf_to_s3(file_bytes: bytes, filename: str, file_id: str) -> dict:
+def upload_pdf_to_s3(file_bytes, filename: str, file_id: str) -> dict:
     """
     Upload PDF file to S3.
     
+    Large files are uploaded in parts (see TRANSFER_CONFIG). File objects are
+    streamed from their start without being read into memory first.
+    
     Args:
-        file_bytes: PDF file content as bytes
+        file_bytes: PDF file content as bytes, or a seekable binary file object
         filename: Original filename
         file_id: Unique file identifier
         
@@ -37,16 +35,25 @@ def upload_pdf_to_s3(file_bytes: bytes, filename: str, file_id: str) -> dict:
         today = datetime.now().strftime("%Y-%m-%d")
         s3_key = f"pdfs/{today}/{file_id}_{filename}"
         
+        if isinstance(file_bytes, (bytes, bytearray, memoryview)):
+            file_obj = io.BytesIO(file_bytes)
+        else:
+            file_obj = file_bytes
+            file_obj.seek(0)
+        
         # Upload to S3
-        s3_client.put_object(
-            Bucket=S3_BUCKET_NAME,
-            Key=s3_key,
-            Body=file_bytes,
-            ContentType='application/pdf',
-            Metadata={
-                'original-filename': filename,
-                'uploaded-at': datetime.now().isoformat()
-            }
+        s3_client.upload_fileobj(
+            file_obj,
+            S3_BUCKET_NAME,
+            s3_key,
+            ExtraArgs={
+                'ContentType': 'application/pdf',
+                'Metadata': {
+                    'original-filename': filename,
+                    'uploaded-at': datetime.now().isoformat()
+                }
+            },
+            Config=TRANSFER_CONFIG
         )
         
         s3_url = f"s3://{S3_BUCKET_NAME}/{s3_key}"
@@ -64,7 +71,8 @@ def upload_pdf_to_s3(file_bytes: bytes, filename: str, file_id: str) -> dict:
         }
 
 
-def upload_testcases_to_s3(testcases_data: dict, original_filename: str, file_id: str, format_type: str = "json") -> dict:
+def upload_testcases_to_s3(testcases_data: dict, original_filename: str, file_id: str, format_type: str = "json",
+                           version: int = None, s3_key: str = None) -> dict:
     """
     Upload generated test cases to S3.
     
@@ -73,23 +81,26 @@ def upload_testcases_to_s3(testcases_data: dict, original_filename: str, file_id
         original_filename: Original PDF filename
         file_id: Unique file identifier
         format_type: Format type ('json' or 'markdown')
+        version: Result version for regenerated test cases (keys get a _v{n} suffix)
+        s3_key: Existing key to overwrite (test cases revised in place)
         
     Returns:
         dict with success status and S3 URL
     """
     try:
         today = datetime.now().strftime("%Y-%m-%d")
+        suffix = f"_v{version}" if version else ""
         
         if format_type == "json":
             # Save as JSON
             import json
-            content = json.dumps(testcases_data, indent=2)
-            s3_key = f"testcases/{today}/{file_id}_testcases.json"
+            content = json.dumps(testcases_data, indent=2, default=str)
+            s3_key = s3_key or f"testcases/{today}/{file_id}_testcases{suffix}.json"
             content_type = "application/json"
         else:  # markdown
             # Save as Markdown
             content = testcases_data.get("text", "No test cases generated")
-            s3_key = f"testcases/{today}/{file_id}_testcases.md"
+            s3_key = s3_key or f"testcases/{today}/{file_id}_testcases{suffix}.md"
             content_type = "text/markdown"
         
         # Upload to S3
@@ -122,6 +133,108 @@ def upload_testcases_to_s3(testcases_data: dict, original_filename: str, file_id
         }
 
 
+def upload_extracted_text_to_s3(text: str, file_id: str) -> dict:
+    """
+    Upload extracted PDF text to S3 as a gzip-compressed artifact.
+    
+    Stored next to the PDF so test cases can be regenerated without
+    re-parsing the document.
+    
+    Args:
+        text: Extracted text content
+        file_id: Unique file identifier
+        
+    Returns:
+        dict with success status and S3 URL
+    """
+    try:
+        today = datetime.now().strftime("%Y-%m-%d")
+        s3_key = f"extracted/{today}/{file_id}_text.txt.gz"
+        
+        s3_client.put_object(
+            Bucket=S3_BUCKET_NAME,
+            Key=s3_key,
+            Body=gzip.compress(text.encode('utf-8')),
+            ContentType="text/plain; charset=utf-8",
+            ContentEncoding="gzip",
+            Metadata={
+                'file-id': file_id,
+                'created-at': datetime.now().isoformat()
+            }
+        )
+        
+        return {
+            "success": True,
+            "s3_url": f"s3://{S3_BUCKET_NAME}/{s3_key}",
+            "s3_key": s3_key
+        }
+        
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"Failed to upload extracted text to S3: {str(e)}"
+        }
+
+
+def get_extracted_text_from_s3(s3_key: str) -> dict:
+    """
+    Download and decompress an extracted text artifact.
+    
+    Args:
+        s3_key: S3 object key
+        
+    Returns:
+        dict with 'text' or error
+    """
+    file_result = get_file_from_s3(s3_key)
+    if not file_result["success"]:
+        return file_result
+    
+    try:
+        return {
+            "success": True,
+            "text": gzip.decompress(file_result["content"]).decode('utf-8')
+        }
+    except (OSError, UnicodeDecodeError) as e:
+        return {
+            "success": False,
+            "error": f"Failed to read extracted text: {str(e)}"
+        }
+
+
+def upload_json_to_s3(data: dict, s3_key: str) -> dict:
+    """
+    Upload a JSON document to S3 under an explicit key.
+    
+    Args:
+        data: JSON-serializable data
+        s3_key: S3 object key
+        
+    Returns:
+        dict with success status and S3 URL
+    """
+    try:
+        import json
+        s3_client.put_object(
+            Bucket=S3_BUCKET_NAME,
+            Key=s3_key,
+            Body=json.dumps(data, default=str).encode('utf-8'),
+            ContentType="application/json"
+        )
+        
+        return {
+            "success": True,
+            "s3_url": f"s3://{S3_BUCKET_NAME}/{s3_key}",
+            "s3_key": s3_key
+        }
+        
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"Failed to upload JSON to S3: {str(e)}"
+        }
+
+
 def get_file_from_s3(s3_key: str) -> dict:
     """
     Download file from S3.
@@ -207,6 +320,13 @@ def test_s3_connection() -> bool:
         return False
 
 
+def warm_s3_connections() -> None:
+    """
+    Open the shared S3 client's pooled connections before the first request.
+    """
+    warm_connections(lambda: s3_client.head_bucket(Bucket=S3_BUCKET_NAME))
+
+
 def delete_file_from_s3(s3_key: str) -> dict:
     """
     Delete a file from S3.
@@ -233,3 +353,62 @@ def delete_file_from_s3(s3_key: str) -> dict:
             "success": False,
             "error": f"Failed to delete file from S3: {str(e)}"
         }
+
+
+async def upload_pdf_to_s3_async(file_bytes, filename: str, file_id: str) -> dict:
+    """
+    Async counterpart of upload_pdf_to_s3, run on the dedicated S3 executor.
+    """
+    return await run_in_executor(s3_executor, upload_pdf_to_s3, file_bytes, filename, file_id)
+
+
+async def upload_testcases_to_s3_async(testcases_data: dict, original_filename: str, file_id: str, format_type: str = "json",
+                                       version: int = None, s3_key: str = None) -> dict:
+    """
+    Async counterpart of upload_testcases_to_s3, run on the dedicated S3 executor.
+    """
+    return await run_in_executor(
+        s3_executor, upload_testcases_to_s3, testcases_data, original_filename, file_id, format_type, version, s3_key
+    )
+
+
+async def upload_extracted_text_to_s3_async(text: str, file_id: str) -> dict:
+    """
+    Async counterpart of upload_extracted_text_to_s3, run on the dedicated S3 executor.
+    """
+    return await run_in_executor(s3_executor, upload_extracted_text_to_s3, text, file_id)
+
+
+async def get_extracted_text_from_s3_async(s3_key: str) -> dict:
+    """
+    Async counterpart of get_extracted_text_from_s3, run on the dedicated S3 executor.
+    """
+    return await run_in_executor(s3_executor, get_extracted_text_from_s3, s3_key)
+
+
+async def upload_json_to_s3_async(data: dict, s3_key: str) -> dict:
+    """
+    Async counterpart of upload_json_to_s3, run on the dedicated S3 executor.
+    """
+    return await run_in_executor(s3_executor, upload_json_to_s3, data, s3_key)
+
+
+async def get_file_from_s3_async(s3_key: str) -> dict:
+    """
+    Async counterpart of get_file_from_s3, run on the dedicated S3 executor.
+    """
+    return await run_in_executor(s3_executor, get_file_from_s3, s3_key)
+
+
+async def list_files_from_s3_async(prefix: str = "") -> dict:
+    """
+    Async counterpart of list_files_from_s3, run on the dedicated S3 executor.
+    """
+    return await run_in_executor(s3_executor, list_files_from_s3, prefix)
+
+
+async def delete_file_from_s3_async(s3_key: str) -> dict:
+    """
+    Async counterpart of delete_file_from_s3, run on the dedicated S3 executor.
+    """
+    return await run_in_executor(s3_executor, delete_file_from_s3, s3_key)
@@ -0,0 +1,106 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from app.services.dynamodb_service import add_token_usage_async, get_token_usage_async
+
+# Roll every Gemini call's token usage up per day and model
+TOKEN_ROLLUPS_ENABLED = os.getenv("TOKEN_ROLLUPS_ENABLED", "true").lower() == "true"
+TOKEN_COUNTERS = ("prompt_tokens", "cached_prompt_tokens", "completion_tokens", "total_tokens")
+# Numeric metadata attributes stored per file
+USAGE_ATTRIBUTES = ("prompt_tokens", "completion_tokens", "total_tokens")
+
+# Rollup writes run in the background; keep references so they are not collected
+_pending_writes = set()
+
+
+def usage_attributes(usage: dict) -> dict:
+    """
+    Numeric token attributes for a file's metadata item.
+
+    Args:
+        usage: Generation result 'usage' dict
+
+    Returns:
+        dict with prompt_tokens, completion_tokens and total_tokens as ints
+    """
+    return {name: int((usage or {}).get(name) or 0) for name in USAGE_ATTRIBUTES}
+
+
+def record_token_usage(model: str, usage: dict) -> None:
+    """
+    Add one Gemini call's usage to today's rollup for its model.
+
+    The DynamoDB write runs in the background; failures are logged and
+    never affect the generation result.
+    """
+    if not TOKEN_ROLLUPS_ENABLED or not usage:
+        return
+
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+
+    counters = {name: int(usage.get(name) or 0) for name in TOKEN_COUNTERS}
+    task = loop.create_task(add_token_usage_async(datetime.now().strftime("%Y-%m-%d"), model, counters))
+    _pending_writes.add(task)
+    task.add_done_callback(_finish_write)
+
+
+def _finish_write(task: asyncio.Task) -> None:
+    _pending_writes.discard(task)
+    if task.cancelled():
+        return
+    if task.exception() is not None:
+        print(f"Warning: Token usage rollup failed: {str(task.exception())}")
+    elif not task.result()["success"]:
+        print(f"Warning: {task.result()['error']}")
+
+
+async def flush_token_usage() -> None:
+    """
+    Wait for background rollup writes (e.g. before shutdown).
+    """
+    if _pending_writes:
+        await asyncio.gather(*list(_pending_writes), return_exceptions=True)
+
+
+async def get_token_rollups(days: int = 7) -> dict:
+    """
+    Get token usage per day and per model for the last `days` days.
+
+    Args:
+        days: Number of days, including today
+
+    Returns:
+        dict with per-day rows, per-model totals (with average prompt and
+        completion tokens per request) and overall totals
+    """
+    today = datetime.now().date()
+    day_keys = [(today - timedelta(days=offset)).isoformat() for offset in range(days)]
+    result = await get_token_usage_async(day_keys)
+    if not result["success"]:
+        return {"error": result["error"], "days": [], "models": {}, "totals": {}}
+
+    counters = ("requests",) + TOKEN_COUNTERS
+    rows = []
+    models = {}
+    totals = dict.fromkeys(counters, 0)
+    for item in result["items"]:
+        row = {"day": item["day"], "model": item["model"], **{name: int(item.get(name, 0)) for name in counters}}
+        rows.append(row)
+        model_totals = models.setdefault(item["model"], dict.fromkeys(counters, 0))
+        for name in counters:
+            model_totals[name] += row[name]
+            totals[name] += row[name]
+
+    for model_totals in models.values():
+        requests = model_totals["requests"] or 1
+        model_totals["avg_prompt_tokens"] = round(model_totals["prompt_tokens"] / requests)
+        model_totals["avg_completion_tokens"] = round(model_totals["completion_tokens"] / requests)
+
+    return {
+        "days": sorted(sorted(rows, key=lambda row: row["model"]), key=lambda row: row["day"], reverse=True),
+        "models": models,
+        "totals": totals
+    }
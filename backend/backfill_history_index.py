@@ -0,0 +1,32 @@
+"""
+Prepare an existing metadata table for the sorted /history endpoint.
+
+Adds the 'entity' key and the test_case_count summary to items written
+before the indexes existed, then creates any missing history index and
+rebuilds any whose projection is out of date. DynamoDB changes one index
+at a time, so this waits for each step; it is safe to interrupt and rerun.
+
+Usage:
+    python backfill_history_index.py
+"""
+from app.services.dynamodb_service import (
+    create_table_if_not_exists, backfill_history_index, update_history_indexes
+)
+
+
+def main():
+    if not create_table_if_not_exists():
+        raise SystemExit(1)
+
+    result = backfill_history_index()
+    if not result["success"]:
+        raise SystemExit(result["error"])
+    print(f"Backfilled {result['updated']} items")
+
+    print("Waiting for the history indexes to be current...")
+    update_history_indexes(wait=True)
+    print("History indexes are current")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Regenerate test cases for many files at once through the Gemini Batch API.
+
+Meant for offline runs (e.g. nightly re-processing of the guideline library):
+batch jobs are slower to finish but cheaper and do not use the interactive
+per-minute quotas. Each updated file gets a new result version.
+
+Usage:
+    python batch_generate.py                      # up to --limit files from the history
+    python batch_generate.py --file-id ID --file-id ID2
+    python batch_generate.py --dry-run            # only write the JSONL request files
+    python batch_generate.py --api-base http://localhost:8081   # local stand-in server
+"""
+import argparse
+import json
+from app.models.testcase import GENERATION_DEPTHS
+from app.services.gemini_batch import (
+    BATCH_API_BASE,
+    BATCH_DIR,
+    BATCH_POLL_INTERVAL,
+    BATCH_TIMEOUT,
+    HttpBatchTransport,
+    prepare_batch_requests,
+    run_batch,
+    write_batch_file,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk test case generation with the Gemini Batch API")
+    parser.add_argument("--file-id", action="append", dest="file_ids", help="File to regenerate (repeatable)")
+    parser.add_argument("--limit", type=int, default=100, help="Files to take from the history without --file-id")
+    parser.add_argument("--depth", choices=GENERATION_DEPTHS, default="standard")
+    parser.add_argument("--model", help="Gemini model (skips model routing)")
+    parser.add_argument("--api-base", default=BATCH_API_BASE, help="Gemini API base URL")
+    parser.add_argument("--batch-dir", default=BATCH_DIR, help="Where request/response files are written")
+    parser.add_argument("--poll-interval", type=float, default=BATCH_POLL_INTERVAL, help="Seconds between polls")
+    parser.add_argument("--timeout", type=float, default=BATCH_TIMEOUT, help="Seconds to wait for each job")
+    parser.add_argument("--dry-run", action="store_true", help="Write request files without submitting them")
+    args = parser.parse_args()
+
+    if args.dry_run:
+        prepared = prepare_batch_requests(args.file_ids, args.limit, args.depth, args.model)
+        if not prepared["success"]:
+            raise SystemExit(prepared["error"])
+        for model, lines in prepared["requests"].items():
+            print(f"{model}: {len(lines)} requests -> {write_batch_file(model, lines, args.batch_dir)}")
+        for file_id, reason in prepared["skipped"].items():
+            print(f"Skipped {file_id}: {reason}")
+        return
+
+    summary = run_batch(
+        args.file_ids,
+        args.limit,
+        args.depth,
+        args.model,
+        transport=HttpBatchTransport(args.api_base),
+        poll_interval=args.poll_interval,
+        timeout=args.timeout,
+        batch_dir=args.batch_dir
+    )
+    print(json.dumps(summary, indent=2, default=str))
+    if not summary["success"] or summary["failed"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
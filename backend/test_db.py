@@ -39,7 +39,7 @@ if result["success"]:
         log("=" * 80)
         log(f"DETAILED INFO FOR FIRST FILE: {first_file_id}")
         log("=" * 80)
-        detailed_result = get_metadata(first_file_id)
+        detailed_result = get_metadata(first_file_id, include_test_cases=True)
         if detailed_result["success"]:
             metadata = detailed_result["metadata"]
             log(f"\nAll metadata keys: {list(metadata.keys())}")
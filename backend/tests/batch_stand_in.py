@@ -0,0 +1,104 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class BatchStandIn:
+    """
+    Local stand-in for the Gemini Files and Batch REST endpoints used by
+    HttpBatchTransport.
+
+    Jobs report BATCH_STATE_RUNNING for `running_polls` polls, then finish in
+    `final_state`. Each request line is answered with respond(request), a
+    GenerateContentResponse dict.
+    """
+
+    def __init__(self, respond, running_polls: int = 1, final_state: str = "BATCH_STATE_SUCCEEDED"):
+        self.respond = respond
+        self.running_polls = running_polls
+        self.final_state = final_state
+        self.files = {}
+        self.batches = {}
+        self.api_keys = set()
+        self.polls = 0
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status: int, body, headers: dict = None, content_type: str = "application/json"):
+                data = body if isinstance(body, bytes) else json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _body(self) -> bytes:
+                return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+            def do_POST(self):
+                stand_in.api_keys.add(self.headers.get("x-goog-api-key"))
+                body = self._body()
+                if self.path == "/upload/v1beta/files":
+                    upload_id = str(len(stand_in.files) + 1)
+                    stand_in.files[f"files/upload-{upload_id}"] = None
+                    return self._reply(200, {}, {"X-Goog-Upload-URL": f"{stand_in.url}/upload/session/{upload_id}"})
+                if self.path.startswith("/upload/session/"):
+                    name = f"files/upload-{self.path.rsplit('/', 1)[1]}"
+                    stand_in.files[name] = body
+                    return self._reply(200, {"file": {"name": name}})
+                if self.path.endswith(":batchGenerateContent"):
+                    model = self.path[len("/v1beta/"):].split(":", 1)[0]
+                    file_name = json.loads(body)["batch"]["input_config"]["file_name"]
+                    name = f"batches/{len(stand_in.batches) + 1}"
+                    stand_in.batches[name] = {"model": model, "file": file_name}
+                    return self._reply(200, {"name": name, "metadata": {"state": "BATCH_STATE_PENDING"}})
+                return self._reply(404, {"error": {"message": "not found"}})
+
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                if path.startswith("/v1beta/batches/"):
+                    name = path[len("/v1beta/"):]
+                    stand_in.polls += 1
+                    batch = stand_in.batches[name]
+                    batch["polls"] = batch.get("polls", 0) + 1
+                    if batch["polls"] <= stand_in.running_polls:
+                        return self._reply(200, {"name": name, "metadata": {"state": "BATCH_STATE_RUNNING"}})
+                    operation = {"name": name, "metadata": {"state": stand_in.final_state}}
+                    if stand_in.final_state == "BATCH_STATE_SUCCEEDED":
+                        output_name = f"files/output-{name.rsplit('/', 1)[1]}"
+                        stand_in.files[output_name] = self._responses(batch["file"])
+                        operation["metadata"]["output"] = {"responsesFile": output_name}
+                    else:
+                        operation["error"] = {"message": "job failed"}
+                    return self._reply(200, operation)
+                if path.startswith("/download/v1beta/") and path.endswith(":download"):
+                    name = path[len("/download/v1beta/"):-len(":download")]
+                    return self._reply(200, stand_in.files[name], content_type="application/jsonl")
+                return self._reply(404, {"error": {"message": "not found"}})
+
+            def _responses(self, file_name: str) -> bytes:
+                lines = []
+                for line in stand_in.files[file_name].decode().splitlines():
+                    entry = json.loads(line)
+                    lines.append(json.dumps({"key": entry["key"], "response": stand_in.respond(entry["request"])}))
+                return ("\n".join(lines) + "\n").encode()
+
+        return Handler
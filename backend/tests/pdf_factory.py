@@ -0,0 +1,42 @@
+import io
+
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+
+def make_pdf(pages: int = 3, text: str = "Sepsis protocol: escalate to ICU when MAP < 65.",
+             hex_strings: bool = False, fonts: bool = True) -> bytes:
+    """
+    Build a PDF with one line of text per page.
+
+    Args:
+        pages: Number of pages
+        text: Line drawn on each page (followed by its page number)
+        hex_strings: Draw the text as a hex string (<48656C6C6F> Tj), as
+            CID/Type0 fonts do, instead of a literal string
+        fonts: Give the pages a /Font resource
+
+    Returns:
+        PDF bytes
+    """
+    writer = PdfWriter()
+    for index in range(pages):
+        page = writer.add_blank_page(612, 792)
+        if fonts:
+            font = DictionaryObject({
+                NameObject("/Type"): NameObject("/Font"),
+                NameObject("/Subtype"): NameObject("/Type1"),
+                NameObject("/BaseFont"): NameObject("/Helvetica"),
+            })
+            page[NameObject("/Resources")] = DictionaryObject({
+                NameObject("/Font"): DictionaryObject({NameObject("/F1"): writer._add_object(font)})
+            })
+        line = f"{text} page {index + 1}"
+        string = f"<{line.encode('latin-1').hex()}>" if hex_strings else f"({line})"
+        stream = DecodedStreamObject()
+        stream.set_data(f"BT /F1 10 Tf 50 700 Td {string} Tj ET".encode("latin-1"))
+        page[NameObject("/Contents")] = writer._add_object(stream)
+
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
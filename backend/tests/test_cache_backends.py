@@ -0,0 +1,52 @@
+from app.services.cache_backends import DiskCache, LRUCache
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_lru_cache_byte_bound_counts_overwrites_once():
+    cache = LRUCache(max_entries=10, max_bytes=10)
+    cache.set("a", "xxxx")
+    cache.set("a", "yyyy")
+    cache.set("b", "zzzz")
+
+    assert cache.stats()["bytes"] == 8
+    assert cache.get("a") == "yyyy"
+
+
+def test_disk_cache_overwrite_does_not_grow_size(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1000)
+    cache.set("aa1", b"x" * 100)
+    for _ in range(20):
+        cache.set("aa2", b"y" * 300)
+
+    assert cache.stats()["bytes"] == 400
+    assert cache.get("aa1") == b"x" * 100
+    assert cache.get("aa2") == b"y" * 300
+
+
+def test_disk_cache_evicts_when_over_limit(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=500)
+    cache.set("aa1", b"x" * 300)
+    cache.set("aa2", b"y" * 300)
+
+    assert cache.stats()["bytes"] <= 450
+    assert cache.get("aa2") == b"y" * 300
+
+
+def test_disk_cache_delete_frees_size(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1000)
+    cache.set("aa1", b"x" * 100)
+    cache.delete("aa1")
+
+    assert cache.get("aa1") is None
+    assert cache.stats()["bytes"] == 0
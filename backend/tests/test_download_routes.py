@@ -0,0 +1,33 @@
+import base64
+
+import pytest
+from fastapi import HTTPException
+
+from app.routes.download import _decode_cursor, _encode_cursor
+
+
+def test_cursor_round_trip():
+    last_key = {"file_id": "abc", "entity": "file", "created_at": "2026-10-17T10:00:00"}
+
+    cursor = _encode_cursor(last_key)
+
+    assert "=" not in cursor
+    assert _decode_cursor(cursor) == last_key
+
+
+def test_encode_cursor_without_more_pages():
+    assert _encode_cursor(None) is None
+    assert _encode_cursor({}) is None
+
+
+@pytest.mark.parametrize("cursor", [
+    "!!!",
+    base64.urlsafe_b64encode(b"not json").decode(),
+    base64.urlsafe_b64encode(b"[1, 2]").decode(),
+    base64.urlsafe_b64encode(b'{"entity": "file"}').decode(),
+])
+def test_decode_cursor_rejects_invalid_cursors(cursor):
+    with pytest.raises(HTTPException) as excinfo:
+        _decode_cursor(cursor)
+
+    assert excinfo.value.status_code == 400
@@ -0,0 +1,244 @@
+import gzip
+import json
+
+from botocore.exceptions import ClientError
+
+from app.services import dynamodb_service
+
+
+class FakeClient:
+    def __init__(self, tables):
+        self.tables = list(tables)
+        self.updates = []
+
+    def describe_table(self, TableName):
+        return {"Table": self.tables.pop(0)}
+
+    def update_table(self, **kwargs):
+        self.updates.append(kwargs["GlobalSecondaryIndexUpdates"][0])
+
+
+class FakeTable:
+    def __init__(self, items):
+        self.items = items
+        self.puts = []
+        self.updates = []
+
+    def scan(self, **kwargs):
+        return {"Items": [dict(item) for item in self.items]}
+
+    def put_item(self, Item):
+        self.puts.append(Item)
+
+    def update_item(self, **kwargs):
+        self.updates.append(kwargs)
+
+
+class FakeHistoryTable:
+    """
+    Table with history indexes: queries return only what an index projects,
+    and scans count Limit against the items read, like DynamoDB.
+    """
+
+    def __init__(self, items, indexes=dynamodb_service.HISTORY_INDEXES):
+        self.items = items
+        self.indexes = {name: dynamodb_service._history_index(name) for name in indexes}
+
+    def query(self, IndexName, Limit, ProjectionExpression, ExpressionAttributeNames, ExclusiveStartKey=None,
+              **kwargs):
+        if IndexName not in self.indexes:
+            raise ClientError({"Error": {"Code": "ValidationException", "Message": "no such index"}}, "Query")
+        index = self.indexes[IndexName]
+        projected = {"file_id"} | {key["AttributeName"] for key in index["KeySchema"]}
+        projected |= set(index["Projection"]["NonKeyAttributes"])
+        if not set(ExpressionAttributeNames.values()) <= projected:
+            raise ClientError({"Error": {"Code": "ValidationException", "Message": "not projected"}}, "Query")
+        partition_key = index["KeySchema"][0]["AttributeName"]
+        items = sorted((item for item in self.items if partition_key in item),
+                       key=lambda item: item["created_at"], reverse=True)
+        return {"Items": [{key: value for key, value in item.items() if key in projected} for item in items[:Limit]]}
+
+    def scan(self, Limit, ExclusiveStartKey=None, **kwargs):
+        start = 0
+        if ExclusiveStartKey:
+            start = [item["file_id"] for item in self.items].index(ExclusiveStartKey["file_id"]) + 1
+        page = self.items[start:start + Limit]
+        response = {"Items": [dict(item) for item in page if "created_at" in item]}
+        if start + Limit < len(self.items):
+            response["LastEvaluatedKey"] = {"file_id": page[-1]["file_id"]}
+        return response
+
+
+def _file(number, status="success"):
+    return {"file_id": f"f{number}", "entity": "file", "status": status, "created_at": f"2026-10-{number:02d}",
+            "filename": f"f{number}.pdf"}
+
+
+def _index(name, status="ACTIVE", attributes=None):
+    projected = dynamodb_service._history_index_attributes(name) if attributes is None else attributes
+    return {"IndexName": name, "IndexStatus": status, "Projection": {"NonKeyAttributes": projected}}
+
+
+def _current_indexes():
+    return {"GlobalSecondaryIndexes": [_index(name) for name in dynamodb_service.HISTORY_INDEXES]}
+
+
+def test_split_testcase_body_counts_structured_suite():
+    metadata = {"file_id": "f", "test_suite": {"test_cases": [{}, {}, {}]}, "test_cases": "## Test Cases"}
+
+    body = dynamodb_service._split_testcase_body(metadata)
+
+    assert metadata == {"file_id": "f", "test_case_count": 3}
+    assert set(body) == {"test_suite", "test_cases"}
+
+
+def test_split_testcase_body_counts_markdown_only_body():
+    markdown = "## Test Cases\n\n### TC-001: First\n\nSteps\n\n---\n\n### TC-002: Second\n\nSteps\n"
+    metadata = {"test_cases": markdown}
+
+    dynamodb_service._split_testcase_body(metadata)
+
+    assert metadata == {"test_case_count": 2}
+
+
+def test_split_testcase_body_without_body_leaves_metadata_alone():
+    metadata = {"file_id": "f", "status": "completed"}
+
+    assert dynamodb_service._split_testcase_body(metadata) is None
+    assert metadata == {"file_id": "f", "status": "completed"}
+
+
+def test_history_projection_includes_test_case_count():
+    projection = dynamodb_service._history_projection()
+
+    assert "test_case_count" in projection["ExpressionAttributeNames"].values()
+
+
+def test_update_history_indexes_creates_missing_index(monkeypatch):
+    client = FakeClient([])
+    monkeypatch.setattr(dynamodb_service, "dynamodb_client", client)
+
+    current = dynamodb_service._update_history_indexes(
+        {"GlobalSecondaryIndexes": [_index(dynamodb_service.HISTORY_INDEX_NAME)]}
+    )
+
+    assert current is False
+    assert client.updates == [{"Create": dynamodb_service._history_index(dynamodb_service.STATUS_INDEX_NAME)}]
+
+
+def test_update_history_indexes_drops_outdated_projection(monkeypatch):
+    client = FakeClient([])
+    monkeypatch.setattr(dynamodb_service, "dynamodb_client", client)
+    outdated = [a for a in dynamodb_service.HISTORY_ATTRIBUTES if a != "test_case_count"]
+
+    current = dynamodb_service._update_history_indexes({"GlobalSecondaryIndexes": [
+        _index(dynamodb_service.HISTORY_INDEX_NAME, attributes=outdated),
+        _index(dynamodb_service.STATUS_INDEX_NAME)
+    ]})
+
+    assert current is False
+    assert client.updates == [{"Delete": {"IndexName": dynamodb_service.HISTORY_INDEX_NAME}}]
+
+
+def test_update_history_indexes_waits_while_an_index_is_changing(monkeypatch):
+    client = FakeClient([])
+    monkeypatch.setattr(dynamodb_service, "dynamodb_client", client)
+
+    current = dynamodb_service._update_history_indexes(
+        {"GlobalSecondaryIndexes": [_index(dynamodb_service.HISTORY_INDEX_NAME, status="DELETING")]}
+    )
+
+    assert current is False
+    assert client.updates == []
+
+
+def test_update_history_indexes_waits_until_rebuilt(monkeypatch):
+    outdated = {"GlobalSecondaryIndexes": [
+        _index(dynamodb_service.HISTORY_INDEX_NAME, attributes=["filename"]),
+        _index(dynamodb_service.STATUS_INDEX_NAME)
+    ]}
+    deleting = {"GlobalSecondaryIndexes": [
+        _index(dynamodb_service.HISTORY_INDEX_NAME, status="DELETING"),
+        _index(dynamodb_service.STATUS_INDEX_NAME)
+    ]}
+    missing = {"GlobalSecondaryIndexes": [_index(dynamodb_service.STATUS_INDEX_NAME)]}
+    client = FakeClient([outdated, deleting, missing, _current_indexes()])
+    monkeypatch.setattr(dynamodb_service, "dynamodb_client", client)
+
+    assert dynamodb_service.update_history_indexes(wait=True, poll_interval=0) is True
+    assert [next(iter(update)) for update in client.updates] == ["Delete", "Create"]
+
+
+def test_backfill_moves_inline_test_cases_out_of_the_item(monkeypatch):
+    table = FakeTable([
+        {"file_id": "old", "test_suite": {"test_cases": [{}, {}]}},
+        {"file_id": "bare"}
+    ])
+    monkeypatch.setattr(dynamodb_service.dynamodb, "Table", lambda name: table)
+
+    result = dynamodb_service.backfill_history_index()
+
+    assert result == {"success": True, "updated": 2}
+    assert table.puts[0]["file_id"] == "old" + dynamodb_service.TESTCASE_BODY_SUFFIX
+    assert json.loads(gzip.decompress(table.puts[0]["body"])) == {"test_suite": {"test_cases": [{}, {}]}}
+    migrated, bare = table.updates
+    assert migrated["ExpressionAttributeValues"] == {":entity": "file", ":test_case_count": 2}
+    assert "REMOVE test_cases, test_suite" in migrated["UpdateExpression"]
+    assert bare["UpdateExpression"] == "SET #entity = :entity"
+
+
+def test_history_indexes_project_status():
+    entity_index = dynamodb_service._history_index(dynamodb_service.HISTORY_INDEX_NAME)
+    status_index = dynamodb_service._history_index(dynamodb_service.STATUS_INDEX_NAME)
+
+    assert "status" in entity_index["Projection"]["NonKeyAttributes"]
+    assert "status" not in status_index["Projection"]["NonKeyAttributes"]
+
+
+def test_update_history_indexes_rebuilds_index_without_status(monkeypatch):
+    client = FakeClient([])
+    monkeypatch.setattr(dynamodb_service, "dynamodb_client", client)
+    without_status = [a for a in dynamodb_service.HISTORY_ATTRIBUTES if a != "status"]
+
+    dynamodb_service._update_history_indexes({"GlobalSecondaryIndexes": [
+        _index(dynamodb_service.HISTORY_INDEX_NAME, attributes=without_status),
+        _index(dynamodb_service.STATUS_INDEX_NAME, attributes=without_status)
+    ]})
+
+    assert client.updates == [{"Delete": {"IndexName": dynamodb_service.HISTORY_INDEX_NAME}}]
+
+
+def test_list_all_files_keeps_status(monkeypatch):
+    table = FakeHistoryTable([_file(1), _file(2, status="partial_success")])
+    monkeypatch.setattr(dynamodb_service.dynamodb, "Table", lambda name: table)
+
+    listed = dynamodb_service.list_all_files(10)
+    filtered = dynamodb_service.list_all_files(10, status="success")
+
+    assert [(item["file_id"], item["status"]) for item in listed["files"]] == [
+        ("f2", "partial_success"), ("f1", "success")
+    ]
+    assert filtered["success"]
+
+
+def test_list_all_files_fallback_scan_pages_with_a_cursor(monkeypatch):
+    items = [_file(1), {"file_id": "f1#testcases"}, _file(2), _file(3), {"file_id": "f3#testcases"}, _file(4)]
+    table = FakeHistoryTable(items, indexes=[])
+    monkeypatch.setattr(dynamodb_service.dynamodb, "Table", lambda name: table)
+
+    first = dynamodb_service.list_all_files(2)
+    second = dynamodb_service.list_all_files(2, first["last_key"])
+
+    assert [item["file_id"] for item in first["files"]] == ["f2", "f1"]
+    assert first["last_key"] == {"file_id": "f2"}
+    assert [item["file_id"] for item in second["files"]] == ["f4", "f3"]
+    assert second["last_key"] is None
+
+
+def test_list_all_files_rejects_index_cursor_while_index_is_missing(monkeypatch):
+    monkeypatch.setattr(dynamodb_service.dynamodb, "Table", lambda name: FakeHistoryTable([_file(1)], indexes=[]))
+
+    result = dynamodb_service.list_all_files(2, {"file_id": "f1", "entity": "file", "created_at": "2026-10-01"})
+
+    assert result["success"] is False
+    assert "backfill_history_index.py" in result["error"]
@@ -0,0 +1,122 @@
+import json
+
+import pytest
+
+from app.services import gemini_batch, gemini_service
+from app.services.gemini_batch import BatchTransport, HttpBatchTransport, run_batch
+from batch_stand_in import BatchStandIn
+
+SUITE = {
+    "title": "Sepsis",
+    "test_cases": [
+        {"id": "TC-001", "title": "Lactate", "type": "Threshold Validation", "scenario": "Lactate > 2"},
+    ],
+}
+
+
+def _respond(request: dict) -> dict:
+    assert request["contents"][0]["parts"][0]["text"]
+    return {
+        "candidates": [{"content": {"parts": [{"text": json.dumps(SUITE)}]}, "finishReason": "STOP"}],
+        "usageMetadata": {"promptTokenCount": 100, "candidatesTokenCount": 50, "totalTokenCount": 150},
+    }
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    """Metadata, S3 and token usage calls of gemini_batch, backed by dicts."""
+    state = {
+        "metadata": {
+            "f1": {"file_id": "f1", "filename": "a.pdf", "extracted_text_url": "s3://bucket/text/f1.txt.gz",
+                   "testcases_json_url": "s3://bucket/testcases/f1.json", "result_version": 1,
+                   "cache_key": "ck1"},
+            "f2": {"file_id": "f2", "filename": "b.pdf"},
+        },
+        "updates": {},
+        "uploads": [],
+        "deleted": [],
+        "usage": [],
+    }
+
+    def get_metadata(file_id, include_test_cases=False):
+        if file_id in state["metadata"]:
+            return {"success": True, "metadata": dict(state["metadata"][file_id])}
+        return {"success": False, "error": "File not found"}
+
+    def update_metadata(file_id, updates, expected=None):
+        state["updates"][file_id] = updates
+        return {"success": True}
+
+    def upload_testcases_to_s3(data, filename, file_id, format_type="json", version=None, s3_key=None):
+        state["uploads"].append((file_id, format_type, version))
+        return {"success": True, "s3_url": f"s3://bucket/testcases/{file_id}_v{version}.{format_type}"}
+
+    def add_token_usage(day, model, counters):
+        state["usage"].append((model, counters))
+        return {"success": True}
+
+    monkeypatch.setattr(gemini_batch, "get_metadata", get_metadata)
+    monkeypatch.setattr(gemini_batch, "update_metadata", update_metadata)
+    monkeypatch.setattr(gemini_batch, "get_extracted_text_from_s3",
+                        lambda key: {"success": True, "text": "--- Page 1 ---\nIf lactate > 2 mmol/L escalate."})
+    monkeypatch.setattr(gemini_batch, "upload_testcases_to_s3", upload_testcases_to_s3)
+    monkeypatch.setattr(gemini_batch, "delete_file_from_s3",
+                        lambda key: state["deleted"].append(key) or {"success": True})
+    monkeypatch.setattr(gemini_batch, "add_token_usage", add_token_usage)
+    monkeypatch.setattr(gemini_service, "STRUCTURED_OUTPUT_ENABLED", True)
+    return state
+
+
+def test_batch_transport_is_abstract():
+    with pytest.raises(TypeError):
+        BatchTransport()
+
+
+def test_run_batch_against_stand_in_server(storage, tmp_path):
+    with BatchStandIn(_respond, running_polls=2) as server:
+        summary = run_batch(["f1", "f2", "missing"], transport=HttpBatchTransport(server.url, api_key="test-key"),
+                            poll_interval=0, batch_dir=str(tmp_path))
+
+    assert summary["succeeded"] == ["f1"]
+    assert summary["failed"] == {"f2": "no stored extracted text", "missing": "file not found"}
+    assert server.api_keys == {"test-key"}
+    assert server.polls == 3
+    assert [job["state"] for job in summary["jobs"]] == ["BATCH_STATE_SUCCEEDED"]
+
+    update = storage["updates"]["f1"]
+    assert update["result_version"] == 2
+    assert update["test_suite"]["test_cases"][0]["id"] == "TC-001"
+    assert update["result_versions"][0]["testcases_json_url"] == "s3://bucket/testcases/f1.json"
+    assert update["generation_config"]["mode"] == "batch"
+    assert update["testcase_revision"] == 1
+    assert storage["uploads"] == [("f1", "json", 2), ("f1", "markdown", 2)]
+    assert storage["deleted"] == ["cache/results/ck1.json"]
+    assert storage["usage"][0][1]["total_tokens"] == 150
+    # Request and response files are kept next to each other
+    assert len(list(tmp_path.glob("requests-*.jsonl"))) == 1
+    assert len(list(tmp_path.glob("responses-*.jsonl"))) == 1
+
+
+def test_failed_batch_job_is_reported_per_file(storage, tmp_path):
+    with BatchStandIn(_respond, running_polls=0, final_state="BATCH_STATE_FAILED") as server:
+        summary = run_batch(["f1"], transport=HttpBatchTransport(server.url, api_key="test-key"),
+                            poll_interval=0, batch_dir=str(tmp_path))
+
+    assert summary["succeeded"] == []
+    assert "job failed" in summary["failed"]["f1"]
+    assert "error" in summary["jobs"][0]
+    assert storage["updates"] == {}
+
+
+def test_model_resource_names_stay_in_the_batch_directory(storage, tmp_path):
+    batch_dir = tmp_path / "requests-batches"
+    with BatchStandIn(_respond, running_polls=0) as server:
+        summary = run_batch(["f1"], model="tunedModels/sepsis-v1",
+                            transport=HttpBatchTransport(server.url, api_key="test-key"),
+                            poll_interval=0, batch_dir=str(batch_dir))
+
+    assert summary["succeeded"] == ["f1"]
+    assert [batch["model"] for batch in server.batches.values()] == ["tunedModels/sepsis-v1"]
+    assert sorted(path.name.rsplit("-", 1)[0] for path in batch_dir.iterdir()) == [
+        "requests-tunedModels_sepsis-v1", "responses-tunedModels_sepsis-v1"
+    ]
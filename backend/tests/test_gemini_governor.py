@@ -0,0 +1,123 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services import gemini_governor
+from app.services.gemini_governor import GeminiGovernor, gemini_permit
+
+
+@pytest.fixture
+def governor(tmp_path, monkeypatch):
+    node_governor = GeminiGovernor(str(tmp_path / "governor.sqlite3"), rpm=60, tpm=1000, max_concurrency=2)
+    monkeypatch.setattr(gemini_governor, "governor", node_governor)
+    return node_governor
+
+
+def test_permit_releases_lease(governor):
+    async def call():
+        async with gemini_permit(100):
+            assert governor.stats()["in_flight"] == 1
+
+    asyncio.run(call())
+
+    assert governor.stats()["in_flight"] == 0
+
+
+def test_cancelled_acquire_releases_granted_lease(governor, monkeypatch):
+    slow_acquire = governor.try_acquire
+
+    def try_acquire(lease_id, tokens):
+        time.sleep(0.2)
+        return slow_acquire(lease_id, tokens)
+
+    monkeypatch.setattr(governor, "try_acquire", try_acquire)
+
+    async def cancel_while_acquiring():
+        task = asyncio.create_task(_hold_permit())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # Let the acquire thread finish and the abandoned lease be released
+        await asyncio.sleep(0.5)
+
+    asyncio.run(cancel_while_acquiring())
+
+    assert governor.stats()["in_flight"] == 0
+
+
+async def _hold_permit():
+    async with gemini_permit(100):
+        await asyncio.sleep(10)
+
+
+def test_request_bucket_limits_requests_per_minute(tmp_path):
+    governor = GeminiGovernor(str(tmp_path / "governor.sqlite3"), rpm=2, tpm=1000, max_concurrency=10)
+
+    assert governor.try_acquire("a", 10) == 0
+    assert governor.try_acquire("b", 10) == 0
+    wait = governor.try_acquire("c", 10)
+
+    assert 0 < wait <= 30
+    assert governor.stats()["in_flight"] == 2
+
+
+def test_token_bucket_limits_tokens_per_minute(tmp_path):
+    governor = GeminiGovernor(str(tmp_path / "governor.sqlite3"), rpm=100, tpm=1000, max_concurrency=10)
+
+    assert governor.try_acquire("a", 800) == 0
+    wait = governor.try_acquire("b", 400)
+
+    # 200 tokens short at 1000 tokens/min
+    assert 11 < wait <= 12
+    governor.release("a", token_adjustment=-500)
+    assert governor.try_acquire("b", 400) == 0
+
+
+def test_concurrency_limit_and_release(tmp_path):
+    governor = GeminiGovernor(str(tmp_path / "governor.sqlite3"), rpm=100, tpm=1000, max_concurrency=1)
+
+    assert governor.try_acquire("a", 10) == 0
+    assert governor.try_acquire("b", 10) > 0
+    governor.release("a")
+    assert governor.try_acquire("b", 10) == 0
+
+
+def test_cool_down_blocks_acquire(tmp_path):
+    governor = GeminiGovernor(str(tmp_path / "governor.sqlite3"), rpm=100, tpm=1000, max_concurrency=10)
+
+    governor.cool_down(30)
+
+    assert 29 < governor.try_acquire("a", 10) <= 30
+    assert governor.stats()["in_flight"] == 0
+
+
+class _ApiError(Exception):
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code
+
+
+def test_retry_delay_skips_client_errors(governor):
+    assert gemini_governor.retry_delay(_ApiError("INVALID_ARGUMENT", code=400), attempt=0) is None
+
+
+def test_retry_delay_stops_when_retries_are_exhausted(governor):
+    assert gemini_governor.retry_delay(_ApiError("UNAVAILABLE", code=503), attempt=2, max_retries=3) is None
+
+
+def test_retry_delay_backs_off_on_transient_errors(governor):
+    delay = gemini_governor.retry_delay(_ApiError("UNAVAILABLE", code=503), attempt=2, max_retries=5)
+
+    assert 0 <= delay <= gemini_governor.BACKOFF_BASE_DELAY * 4
+    assert governor.stats()["cooldown_seconds"] == 0
+
+
+def test_retry_delay_uses_rate_limit_hint_and_cools_down(governor):
+    error = _ApiError("429 RESOURCE_EXHAUSTED. {'retryDelay': '7s'}", code=429)
+
+    delay = gemini_governor.retry_delay(error, attempt=0)
+
+    assert 7 <= delay <= 8
+    assert 6 < governor.stats()["cooldown_seconds"] <= 8
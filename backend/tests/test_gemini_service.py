@@ -0,0 +1,202 @@
+import asyncio
+import json
+
+import pytest
+
+from app.services import gemini_service
+from app.services.gemini_service import MarkdownStreamRenderer, merge_testcase_results, split_document
+
+
+def _suite_json() -> str:
+    return json.dumps({
+        "title": 'Sepsis "bundle" [v2] {draft}',
+        "test_cases": [
+            {"id": "TC-001", "title": "Lactate {high}", "priority": "P0-Critical", "type": "Threshold Validation",
+             "scenario": 'Lactate > 2 with "quoted" ] text', "inputs": ["lactate 3"]},
+            {"id": "not-an-id", "title": "Invalid", "type": "x", "scenario": "y"},
+            {"id": "TC-002", "title": "MAP", "type": "Decision Path Validation", "scenario": "MAP < 65"},
+        ],
+        "compliance_checks": ["Audit trail"],
+    })
+
+
+def _feed_in_pieces(renderer: MarkdownStreamRenderer, text: str, size: int) -> list:
+    return [renderer.feed(text[index:index + size]) for index in range(0, len(text), size)]
+
+
+def test_stream_renderer_emits_markdown_per_completed_record():
+    renderer = MarkdownStreamRenderer()
+
+    emitted = [markdown for markdown in _feed_in_pieces(renderer, _suite_json(), 5) if markdown]
+
+    assert len(emitted) == 2
+    assert emitted[0].startswith("## Test Cases\n\n### TC-001: Lactate {high}")
+    assert emitted[1].startswith("\n\n---\n\n### TC-002: MAP")
+    assert not any("{" in markdown and '"id"' in markdown for markdown in emitted)
+
+
+def test_stream_renderer_is_independent_of_fragment_size():
+    whole = MarkdownStreamRenderer().feed(_suite_json())
+    single_chars = "".join(_feed_in_pieces(MarkdownStreamRenderer(), _suite_json(), 1))
+
+    assert whole == single_chars
+
+
+def test_stream_renderer_ignores_other_arrays():
+    renderer = MarkdownStreamRenderer()
+
+    assert renderer.feed(json.dumps({"title": "x", "compliance_checks": [{"id": "TC-001"}]})) == ""
+
+
+def test_split_document_breaks_on_page_markers():
+    pages = [f"--- Page {number} ---\n" + "x" * 30 for number in range(1, 5)]
+
+    chunks = split_document("\n".join(pages), max_chars=100)
+
+    assert len(chunks) == 2
+    assert chunks[0].startswith("--- Page 1 ---") and "--- Page 2 ---" in chunks[0]
+    assert chunks[1].startswith("--- Page 3 ---")
+    assert all(len(chunk) <= 100 for chunk in chunks)
+
+
+def test_split_document_breaks_long_pages_on_sections_then_hard_cuts():
+    text = "--- Page 1 ---\n" + "a" * 60 + "\n\n" + "b" * 250
+
+    chunks = split_document(text, max_chars=100)
+
+    assert chunks[0] == "--- Page 1 ---\n" + "a" * 60
+    assert "".join(chunks[1:]) == "b" * 250
+    assert all(len(chunk) <= 100 for chunk in chunks)
+
+
+def test_split_document_keeps_short_text_in_one_chunk():
+    assert split_document("--- Page 1 ---\nshort", max_chars=100) == ["--- Page 1 ---\nshort"]
+
+
+def _chunk_result(titles, **extra):
+    return {
+        "test_suite": {
+            "title": "Sepsis",
+            "test_cases": [{"id": f"TC-{number:03d}", "title": title, "type": "t", "scenario": "s"}
+                           for number, title in enumerate(titles, start=1)],
+            "compliance_checks": ["Audit trail"],
+        },
+        "model": "gemini-test",
+        "usage": {"total_tokens": 10},
+        **extra,
+    }
+
+
+def test_merge_testcase_results_dedupes_and_renumbers():
+    merged = merge_testcase_results([
+        _chunk_result(["Lactate high", "MAP low"], latency_ms=100),
+        {"error": "chunk failed"},
+        _chunk_result(["lactate  HIGH!", "Fluids"], latency_ms=300),
+    ])
+
+    test_cases = merged["test_suite"]["test_cases"]
+    assert [(tc["id"], tc["title"]) for tc in test_cases] == [
+        ("TC-001", "Lactate high"), ("TC-002", "MAP low"), ("TC-003", "Fluids")
+    ]
+    assert merged["test_suite"]["compliance_checks"] == ["Audit trail"]
+    assert merged["usage"] == {"total_tokens": 20}
+    assert merged["latency_ms"] == 300
+    assert merged["chunks"] == 3
+    assert merged["chunk_errors"] == ["chunk failed"]
+    assert "### TC-003: Fluids" in merged["text"]
+
+
+def test_merge_testcase_results_merges_markdown_text():
+    first = "# Test Suite: Sepsis\n\n## Test Cases\n\n### TC-001: Lactate\nBody A\n\n---\n\n" \
+            "### TC-002: MAP\nBody B\n\n## Implementation Notes\nNotes"
+    second = "# Test Suite: Sepsis\n\n### TC-001: MAP\nDuplicate\n\n### TC-002: Fluids\nBody C"
+
+    merged = merge_testcase_results([{"text": first}, {"text": second}])
+
+    text = merged["text"]
+    assert "test_suite" not in merged
+    assert text.count("# Test Suite: Sepsis") == 1
+    assert "### TC-003: Fluids\nBody C" in text
+    assert "Duplicate" not in text
+    assert text.rstrip().endswith("## Implementation Notes\nNotes")
+
+
+def test_merge_testcase_results_returns_error_when_every_chunk_failed():
+    merged = merge_testcase_results([{"error": "first"}, {"error": "second"}])
+
+    assert merged == {"error": "first", "chunks": 2}
+
+
+@pytest.fixture
+def generation_stubs(monkeypatch):
+    """
+    Stand-ins for the Gemini call path of _generate_content: an in-memory LLM
+    cache and a model that records the budget it was sent.
+    """
+    cache, calls = {}, []
+
+    async def count_prompt_tokens(prompt, model):
+        return 1000
+
+    async def call_model(pdf_content, model, temperature, budget, part, prompt_tokens, max_retries):
+        calls.append((model, budget))
+        return {"text": "### TC-001: A", "model": model, "usage": {"total_tokens": 1}, "status": "success"}
+
+    async def hedged(model, call):
+        return await call()
+
+    monkeypatch.setattr(gemini_service, "count_prompt_tokens", count_prompt_tokens)
+    monkeypatch.setattr(gemini_service, "_call_model", call_model)
+    monkeypatch.setattr(gemini_service, "hedged", hedged)
+    monkeypatch.setattr(gemini_service, "record_token_usage", lambda model, usage: None)
+    monkeypatch.setattr(gemini_service, "get_cached_llm_response", cache.get)
+    monkeypatch.setattr(gemini_service, "store_cached_llm_response", cache.__setitem__)
+    return cache, calls
+
+
+def test_response_cache_key_uses_the_budget_sent(generation_stubs, monkeypatch):
+    cache, calls = generation_stubs
+    routes = [{"tier": "standard", "model": "gemini-test", "max_output_tokens": 16000}]
+
+    first = asyncio.run(gemini_service._generate_content("guideline", routes, None, None))
+    monkeypatch.setattr(gemini_service, "OUTPUT_BUDGET_BASE", 2000)
+    second = asyncio.run(gemini_service._generate_content("guideline", routes, None, None))
+    third = asyncio.run(gemini_service._generate_content("guideline", routes, None, None))
+
+    assert calls == [("gemini-test", 4500), ("gemini-test", 2500)]
+    assert first["max_output_tokens"] == 4500 and second["max_output_tokens"] == 2500
+    assert third["cached_response"] is True
+    assert set(cache) == {
+        gemini_service._response_cache_key("guideline", "gemini-test", None, 4500),
+        gemini_service._response_cache_key("guideline", "gemini-test", None, 2500),
+    }
+
+
+def test_model_route_key_changes_with_output_budget(monkeypatch):
+    before = gemini_service.model_route_key("standard")
+    monkeypatch.setattr(gemini_service, "OUTPUT_BUDGET_PER_PROMPT_TOKEN", 0.25)
+
+    assert gemini_service.model_route_key("standard") != before
+
+
+def test_fallback_result_is_cached_under_the_routed_key(generation_stubs, monkeypatch):
+    cache, calls = generation_stubs
+    routes = [{"tier": "fast", "model": "gemini-fast", "max_output_tokens": 16000},
+              {"tier": "standard", "model": "gemini-standard", "max_output_tokens": 16000}]
+    serve = gemini_service._call_model
+
+    async def call_model(pdf_content, model, *args):
+        if model == "gemini-fast":
+            raise RuntimeError("503 UNAVAILABLE")
+        return await serve(pdf_content, model, *args)
+
+    monkeypatch.setattr(gemini_service, "_call_model", call_model)
+
+    first = asyncio.run(gemini_service._generate_content("guideline", routes, None, None))
+    second = asyncio.run(gemini_service._generate_content("guideline", routes, None, None))
+
+    assert first["fallback_from"] == "gemini-fast"
+    assert list(cache) == [gemini_service._response_cache_key("guideline", "gemini-fast", None, 4500)]
+    assert second["cached_response"] is True
+    assert second["model"] == "gemini-standard"
+    assert calls == [("gemini-standard", 4500)]
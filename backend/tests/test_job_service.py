@@ -0,0 +1,67 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from app.services import job_service
+
+
+@pytest.fixture
+def job_db(tmp_path, monkeypatch):
+    path = str(tmp_path / "jobs.sqlite3")
+    monkeypatch.setattr(job_service, "JOB_DB_PATH", path)
+    monkeypatch.setattr(job_service, "_initialized", False)
+    return path
+
+
+def test_job_lifecycle(job_db):
+    job = job_service.create_job("a.pdf", "file-1")
+    job_service.update_job_stage(job["job_id"], "extracting", pages=3)
+    job_service.append_job_output(job["job_id"], "## Test Cases")
+    job_service.complete_job(job["job_id"], {"file_id": "file-1"})
+
+    state = job_service.get_job(job["job_id"])
+    events, finished = job_service.get_job_events(job["job_id"], start=1)
+
+    assert state["status"] == "completed"
+    assert state["result"] == {"file_id": "file-1"}
+    assert [event["stage"] for event in state["events"]] == ["queued", "extracting", "completed"]
+    assert finished
+    assert [event.get("chunk") for event in events] == [None, "## Test Cases", None]
+    assert events[0]["pages"] == 3
+
+
+def test_unknown_job(job_db):
+    assert job_service.get_job("missing") is None
+    assert job_service.get_job_events("missing") is None
+    job_service.update_job_stage("missing", "extracting")
+
+
+def test_expired_jobs_are_pruned(job_db, monkeypatch):
+    job = job_service.create_job("a.pdf")
+    job_service.fail_job(job["job_id"], "boom", status_code=422)
+    monkeypatch.setattr(job_service, "JOB_TTL_SECONDS", -1)
+
+    job_service.create_job("b.pdf")
+
+    assert job_service.get_job(job["job_id"]) is None
+
+
+def test_jobs_are_visible_to_other_worker_processes(job_db):
+    job = job_service.create_job("a.pdf", "file-1")
+    job_service.update_job_stage(job["job_id"], "generating")
+
+    # Another uvicorn worker: a separate process with its own module state
+    script = (
+        "import json, sys; from app.services import job_service; "
+        "job_service.JOB_DB_PATH = sys.argv[1]; "
+        "print(json.dumps(job_service.get_job(sys.argv[2])))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", script, job_db, job["job_id"]], capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    ).stdout
+
+    assert json.loads(output.strip().splitlines()[-1])["stage"] == "generating"
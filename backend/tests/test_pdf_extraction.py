@@ -0,0 +1,71 @@
+from concurrent.futures import Future
+
+import pytest
+
+from app.services import pdf_service
+from app.services.pdf_service import extract_text_from_pdf, shutdown_process_pool
+from pdf_factory import make_pdf
+
+
+@pytest.fixture(scope="module", autouse=True)
+def process_pool():
+    yield
+    shutdown_process_pool()
+
+
+@pytest.fixture
+def two_workers(monkeypatch):
+    monkeypatch.setattr(pdf_service, "PDF_PROCESS_WORKERS", 2)
+    monkeypatch.setattr(pdf_service, "PAGE_CACHE_ENABLED", False)
+
+
+def test_full_extraction_keeps_page_order(two_workers):
+    pdf = make_pdf(pages=40)
+
+    serial = extract_text_from_pdf(pdf, parallel=False)
+    parallel = extract_text_from_pdf(pdf, parallel=True)
+
+    assert parallel["text"] == serial["text"]
+    assert parallel["pages_extracted"] == 40
+    assert not parallel["truncated"]
+
+
+def test_budget_extraction_uses_process_pool(two_workers, monkeypatch):
+    pdf = make_pdf(pages=200)
+    submitted = []
+    original = pdf_service._extract_page_range_from_file
+
+    def record(*args):
+        submitted.append(args[1:])
+        return original(*args)
+
+    monkeypatch.setattr(pdf_service, "_extract_page_range_from_file", record)
+    pool = pdf_service._get_process_pool()
+    monkeypatch.setattr(pool, "submit", lambda func, *args: _done(func(*args)))
+
+    serial = extract_text_from_pdf(pdf, parallel=False, max_chars=2000)
+    parallel = extract_text_from_pdf(pdf, parallel=True, max_chars=2000)
+
+    assert parallel["text"] == serial["text"]
+    assert parallel["pages_extracted"] == serial["pages_extracted"] < 200
+    assert parallel["truncated"]
+    # Ranges are submitted a window at a time, not for the whole document
+    assert submitted[0] == (0, pdf_service.MIN_PAGES_PER_TASK)
+    assert len(submitted) < 200 // pdf_service.MIN_PAGES_PER_TASK
+
+
+def test_budget_extraction_on_real_pool(two_workers):
+    pdf = make_pdf(pages=120)
+
+    result = extract_text_from_pdf(pdf, parallel=True, max_chars=3000)
+
+    assert result["success"]
+    assert result["truncated"]
+    assert result["text"].startswith("--- Page 1 ---")
+    assert f"--- Page {result['pages_extracted']} ---" in result["text"]
+
+
+def _done(value):
+    future = Future()
+    future.set_result(value)
+    return future
@@ -0,0 +1,125 @@
+import io
+
+from pypdf import PdfReader, PdfWriter
+from pypdf.errors import DependencyError
+
+from app.services import pdf_service
+from app.services.pdf_service import TEXT_OPERATOR_PATTERN, _has_eof_marker, _sample_page_indexes, preflight_pdf
+from pdf_factory import make_pdf
+
+
+def _blank_pdf(pages: int = 2) -> bytes:
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(612, 792)
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def test_literal_string_text_is_ok():
+    assert preflight_pdf(make_pdf(pages=5)) == {"verdict": "ok", "pages": 5}
+
+
+def test_hex_string_text_is_ok():
+    pdf = make_pdf(pages=1, text="Hello world", hex_strings=True)
+
+    assert "Hello world" in PdfReader(io.BytesIO(pdf)).pages[0].extract_text()
+    assert preflight_pdf(pdf) == {"verdict": "ok", "pages": 1}
+
+
+def test_text_operator_pattern_string_forms():
+    for operand in (b"(Hi) Tj", b"<4869>Tj", b"[(H) 20 (i)] TJ", b"(Hi) '"):
+        assert TEXT_OPERATOR_PATTERN.search(operand)
+    assert not TEXT_OPERATOR_PATTERN.search(b"0 0 612 792 re f")
+
+
+def test_text_without_font_resource_falls_back_to_extraction():
+    # The operator scan requires a /Font resource; pypdf still extracts the text
+    assert preflight_pdf(make_pdf(pages=1, fonts=False))["verdict"] == "ok"
+
+
+def test_pages_without_text_are_scanned():
+    result = preflight_pdf(_blank_pdf(3))
+
+    assert result["verdict"] == "scanned"
+    assert result["pages"] == 3
+
+
+def test_missing_header_is_corrupt():
+    assert preflight_pdf(b"not a pdf at all")["verdict"] == "corrupt"
+
+
+def test_truncated_file_is_corrupt():
+    pdf = make_pdf(pages=2)
+
+    assert preflight_pdf(pdf[:len(pdf) // 2])["verdict"] == "corrupt"
+
+
+def test_trailing_data_after_eof_is_ok():
+    pdf = make_pdf(pages=2) + b"\n" + b"x" * (3 * pdf_service.PREFLIGHT_TRAILER_BYTES)
+
+    assert preflight_pdf(pdf) == {"verdict": "ok", "pages": 2}
+
+
+def test_eof_marker_split_across_blocks(monkeypatch):
+    monkeypatch.setattr(pdf_service, "PREFLIGHT_TRAILER_BYTES", 8)
+
+    assert _has_eof_marker(io.BytesIO(b"%PDF-1.4 body %%EOF" + b"\n" * 12))
+    assert _has_eof_marker(io.BytesIO(b"%PDF-1.4 body %%EOF" + b"\n" * 14))
+    assert not _has_eof_marker(io.BytesIO(b"%PDF-1.4 body %%EO" + b"\n" * 14))
+
+
+def _encrypted_pdf(**encrypt) -> bytes:
+    writer = PdfWriter(clone_from=PdfReader(io.BytesIO(make_pdf(pages=1))))
+    writer.encrypt(**encrypt)
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def test_aes_without_crypto_dependency_is_unsupported(monkeypatch):
+    pdf = _encrypted_pdf(user_password="", owner_password="owner", algorithm="AES-256")
+
+    def decrypt(self, password):
+        raise DependencyError("cryptography>=3.1 is required for AES algorithm")
+
+    monkeypatch.setattr(PdfReader, "decrypt", decrypt)
+    result = preflight_pdf(pdf)
+
+    assert result["verdict"] == "unsupported"
+    assert "cryptography" in result["reason"]
+
+
+def test_password_protected_is_encrypted():
+    writer = PdfWriter(clone_from=PdfReader(io.BytesIO(make_pdf(pages=1))))
+    writer.encrypt(user_password="secret", owner_password="owner")
+    output = io.BytesIO()
+    writer.write(output)
+
+    assert preflight_pdf(output.getvalue())["verdict"] == "encrypted"
+
+
+def test_sample_pages_spread_evenly():
+    assert _sample_page_indexes(100, 3) == [0, 50, 99]
+    assert _sample_page_indexes(100, 5) == [0, 25, 50, 74, 99]
+    assert _sample_page_indexes(3, 10) == [0, 1, 2]
+    assert _sample_page_indexes(1, 3) == [0]
+    assert _sample_page_indexes(10, 1) == [0]
+
+
+def test_more_sample_pages_find_text_between_defaults():
+    # Text only on page 3 of 9: missed by first/middle/last, found with 9 samples
+    writer = PdfWriter()
+    text_page = PdfReader(io.BytesIO(make_pdf(pages=1))).pages[0]
+    for index in range(9):
+        if index == 2:
+            writer.add_page(text_page)
+        else:
+            writer.add_blank_page(612, 792)
+    output = io.BytesIO()
+    writer.write(output)
+    pdf = output.getvalue()
+
+    assert preflight_pdf(pdf, sample_pages=3)["verdict"] == "scanned"
+    assert preflight_pdf(pdf, sample_pages=9)["verdict"] == "ok"
@@ -0,0 +1,109 @@
+import pytest
+from pydantic import ValidationError
+
+from app.models import testcase
+
+SUITE_MARKDOWN = """# Test Suite: Sepsis Bundle
+
+## Overview
+**Guideline Type**: Treatment Protocol
+**Criticality**: Critical
+**Focus**: CDSS Decision Logic Validation
+
+---
+
+## Test Cases
+
+### TC-001: Lactate above threshold
+**Priority**: P0 - Critical
+**Type**: Threshold Validation
+
+**Scenario**: Lactate of 4 mmol/L triggers the bundle
+
+**Input Conditions**:
+- Lactate: 4 mmol/L
+- MAP: 70 mmHg
+
+**Expected Decision/Action**:
+- Start sepsis bundle
+
+**Validation Points**:
+- ✓ Alert fires within 1 minute
+
+---
+
+### TC-7: Hypotension
+**Priority**: p1 (High)
+**Type**: Decision Path Validation
+
+**Scenario**: MAP below 65
+
+---
+
+## Implementation Notes
+
+**Key Decision Points from Guideline**:
+1. Lactate > 2
+2. MAP < 65
+
+**Compliance Checks**:
+- Audit trail
+"""
+
+
+def _case(case_id: str, title: str) -> "testcase.TestCase":
+    return testcase.TestCase(id=case_id, title=title, type="Functional Test", scenario="")
+
+
+def test_from_markdown_parses_cases_and_notes():
+    suite = testcase.TestSuite.from_markdown(SUITE_MARKDOWN)
+
+    assert suite.title == "Sepsis Bundle"
+    assert suite.guideline_type == "Treatment Protocol"
+    assert [case.id for case in suite.test_cases] == ["TC-001", "TC-007"]
+    first, second = suite.test_cases
+    assert first.priority == "P0-Critical"
+    assert first.type == "Threshold Validation"
+    assert first.inputs == ["Lactate: 4 mmol/L", "MAP: 70 mmHg"]
+    assert first.expected_action == ["Start sepsis bundle"]
+    assert first.validation_points == ["Alert fires within 1 minute"]
+    assert second.priority == "P1-High"
+    assert second.scenario == "MAP below 65"
+    assert suite.key_decision_points == ["Lactate > 2", "MAP < 65"]
+    assert suite.compliance_checks == ["Audit trail"]
+
+
+def test_from_markdown_round_trips_to_markdown():
+    suite = testcase.TestSuite.from_markdown(SUITE_MARKDOWN)
+
+    assert testcase.TestSuite.from_markdown(suite.to_markdown()) == suite
+
+
+def test_from_markdown_without_test_cases():
+    suite = testcase.TestSuite.from_markdown("Nothing recognisable here")
+
+    assert suite.title == "Test Suite"
+    assert suite.test_cases == []
+
+
+def test_next_testcase_ids_continue_after_highest_id():
+    suite = testcase.TestSuite(title="t", test_cases=[_case("TC-002", "a"), _case("TC-010", "b")])
+
+    assert suite.next_testcase_ids(2) == ["TC-011", "TC-012"]
+    assert testcase.TestSuite(title="t").next_testcase_ids(1) == ["TC-001"]
+
+
+def test_revise_replaces_in_place_and_appends():
+    suite = testcase.TestSuite(title="t", test_cases=[_case("TC-001", "a"), _case("TC-002", "b")])
+
+    revised = suite.revise([_case("TC-001", "a2")], [_case("TC-003", "c")])
+
+    assert [(case.id, case.title) for case in revised.test_cases] == [
+        ("TC-001", "a2"), ("TC-002", "b"), ("TC-003", "c")
+    ]
+    assert [case.title for case in suite.test_cases] == ["a", "b"]
+
+
+def test_testcase_rejects_malformed_id():
+    with pytest.raises(ValidationError):
+        _case("TC-1", "a")
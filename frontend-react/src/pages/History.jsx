@@ -8,6 +8,8 @@ function History() {
     const [filteredFiles, setFilteredFiles] = useState([]);
     const [loading, setLoading] = useState(true);
     const [searchTerm, setSearchTerm] = useState('');
+    const [nextCursor, setNextCursor] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
 
     useEffect(() => {
         loadHistory();
@@ -29,6 +31,7 @@ function History() {
             const data = await api.getHistory(100);
             setFiles(data.files || []);
             setFilteredFiles(data.files || []);
+            setNextCursor(data.next_cursor || null);
             setLoading(false);
         } catch (error) {
             console.error('Error loading history:', error);
@@ -36,6 +39,19 @@ function History() {
         }
     };
 
+    const loadMore = async () => {
+        setLoadingMore(true);
+        try {
+            const data = await api.getHistory(100, { cursor: nextCursor });
+            setFiles((previous) => [...previous, ...(data.files || [])]);
+            setNextCursor(data.next_cursor || null);
+        } catch (error) {
+            console.error('Error loading more history:', error);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     const handleDelete = async (fileId, filename) => {
         if (window.confirm(`Delete "${filename}"? This cannot be undone.`)) {
             try {
@@ -174,6 +190,14 @@ function History() {
                     </div>
                 ))
             )}
+
+            {nextCursor && (
+                <div style={{ textAlign: 'center', marginTop: '1rem' }}>
+                    <button className="btn btn-secondary" onClick={loadMore} disabled={loadingMore}>
+                        {loadingMore ? 'Loading...' : 'Load more'}
+                    </button>
+                </div>
+            )}
         </div>
     );
 }
@@ -83,6 +83,14 @@ function TestCases() {
         return testCases;
     };
 
+    // Structured records are used as-is; older files only have markdown
+    const getTestCases = (result) => {
+        if (result?.test_suite?.test_cases) {
+            return result.test_suite.test_cases;
+        }
+        return parseTestCases(result?.test_cases);
+    };
+
     const getPriorityColor = (priority) => {
         if (priority.includes('P0') || priority.includes('Critical')) return '#ef4444';
         if (priority.includes('P1') || priority.includes('High')) return '#f97316';
@@ -121,6 +129,34 @@ function TestCases() {
         });
     };
 
+    const renderTestCaseRecord = (tc) => {
+        const sections = [
+            ['Input Conditions', tc.inputs],
+            ['Expected Decision/Action', tc.expected_action],
+            ['Validation Points', tc.validation_points],
+        ].filter(([, items]) => items && items.length > 0);
+
+        return (
+            <>
+                <p>
+                    <strong>Scenario</strong>: {tc.scenario}
+                </p>
+                {sections.map(([label, items]) => (
+                    <div key={label}>
+                        <p>
+                            <strong>{label}</strong>:
+                        </p>
+                        {items.map((item, index) => (
+                            <li key={index} className="testcase-list-item">
+                                {item}
+                            </li>
+                        ))}
+                    </div>
+                ))}
+            </>
+        );
+    };
+
     if (loading) {
         return (
             <div className="container">
@@ -144,7 +180,7 @@ function TestCases() {
         );
     }
 
-    const testCases = parseTestCases(data?.test_cases);
+    const testCases = getTestCases(data);
 
     return (
         <div className="container">
@@ -191,7 +227,7 @@ function TestCases() {
                                 </div>
                             </div>
                             <div className="testcase-card-content">
-                                {renderTestCaseContent(tc.content)}
+                                {tc.content ? renderTestCaseContent(tc.content) : renderTestCaseRecord(tc)}
                             </div>
                         </div>
                     ))}
@@ -9,6 +9,7 @@ function Upload() {
     const [progress, setProgress] = useState(0);
     const [statusText, setStatusText] = useState('');
     const [dragOver, setDragOver] = useState(false);
+    const [preview, setPreview] = useState('');
     const navigate = useNavigate();
 
     const handleFileSelect = (file) => {
@@ -34,34 +35,55 @@ function Upload() {
         }
     };
 
+    const STAGE_PROGRESS = {
+        queued: [15, 'Queued for processing...'],
+        extracting: [30, 'Extracting text...'],
+        generating: [50, 'Generating test cases...'],
+        stored: [70, 'PDF stored. Generating test cases...'],
+        persisted: [95, 'Saving results...'],
+    };
+
     const handleUpload = async () => {
         if (!selectedFile) return;
 
         setUploading(true);
+        setPreview('');
         setProgress(10);
         setStatusText('Uploading PDF...');
 
-        try {
-            await new Promise((resolve) => setTimeout(resolve, 500));
-            setProgress(40);
-            setStatusText('Extracting text...');
-
-            const data = await api.uploadPDF(selectedFile);
-
-            setProgress(70);
-            setStatusText('Generating test cases...');
-            await new Promise((resolve) => setTimeout(resolve, 2000));
-
-            setProgress(100);
-            setStatusText('Complete!');
-
-            setTimeout(() => {
-                navigate(`/testcases?id=${data.file_id}`);
-            }, 1000);
-        } catch (error) {
+        const handleError = (error) => {
             alert('Error: ' + error.message);
             setUploading(false);
             setProgress(0);
+        };
+
+        try {
+            const job = await api.uploadPDFAsync(selectedFile);
+            setProgress(STAGE_PROGRESS.queued[0]);
+            setStatusText(STAGE_PROGRESS.queued[1]);
+
+            api.subscribeToJob(job.job_id, {
+                onProgress: (event) => {
+                    // Stages can finish out of order (the PDF is stored while generation runs)
+                    const stage = STAGE_PROGRESS[event.stage];
+                    if (stage) {
+                        setProgress((current) => Math.max(current, stage[0]));
+                        setStatusText(stage[1]);
+                    }
+                },
+                onChunk: (text) => setPreview((current) => current + text),
+                onComplete: (finishedJob) => {
+                    setProgress(100);
+                    setStatusText('Complete!');
+
+                    setTimeout(() => {
+                        navigate(`/testcases?id=${finishedJob.file_id}`);
+                    }, 1000);
+                },
+                onError: handleError,
+            });
+        } catch (error) {
+            handleError(error);
         }
     };
 
@@ -145,6 +167,22 @@ function Upload() {
                                 <div className="progress-bar">
                                     <div className="progress-fill" style={{ width: `${progress}%` }}></div>
                                 </div>
+                                {preview && (
+                                    <pre
+                                        style={{
+                                            marginTop: '1rem',
+                                            padding: '1rem',
+                                            maxHeight: '300px',
+                                            overflowY: 'auto',
+                                            whiteSpace: 'pre-wrap',
+                                            fontSize: '0.8rem',
+                                            background: 'var(--bg-primary)',
+                                            borderRadius: 'var(--radius-md)',
+                                        }}
+                                    >
+                                        {preview}
+                                    </pre>
+                                )}
                             </div>
                         )}
                     </div>
@@ -2,9 +2,15 @@
 const API_BASE = 'http://127.0.0.1:8000';
 
 export const api = {
-    // Get upload history
-    getHistory: async (limit = 100) => {
-        const response = await fetch(`${API_BASE}/history?limit=${limit}`);
+    // Get upload history, newest first (pass next_cursor to get the next page)
+    getHistory: async (limit = 100, { cursor, status, createdFrom, createdTo, filenamePrefix } = {}) => {
+        const params = new URLSearchParams({ limit });
+        if (cursor) params.set('cursor', cursor);
+        if (status) params.set('status', status);
+        if (createdFrom) params.set('created_from', createdFrom);
+        if (createdTo) params.set('created_to', createdTo);
+        if (filenamePrefix) params.set('filename_prefix', filenamePrefix);
+        const response = await fetch(`${API_BASE}/history?${params}`);
         return response.json();
     },
 
@@ -14,6 +20,31 @@ export const api = {
         return response.json();
     },
 
+    // Get a page of test case records, optionally filtered by priority/type
+    getTestCases: async (fileId, { priority, type, offset = 0, limit = 20 } = {}) => {
+        const params = new URLSearchParams({ offset, limit });
+        if (priority) params.set('priority', priority);
+        if (type) params.set('type', type);
+        const response = await fetch(`${API_BASE}/file/${fileId}/testcases?${params}`);
+        return response.json();
+    },
+
+    // Rewrite selected test cases and/or add new ones, keeping the rest of the suite
+    regenerateTestCases: async (fileId, { replace = [], add = 0, instructions } = {}) => {
+        const response = await fetch(`${API_BASE}/file/${fileId}/testcases/regenerate`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ replace, add, instructions }),
+        });
+
+        if (!response.ok) {
+            const error = await response.json();
+            throw new Error(typeof error.detail === 'string' ? error.detail : 'Regeneration failed');
+        }
+
+        return response.json();
+    },
+
     // Upload PDF
     uploadPDF: async (file, onProgress) => {
         const formData = new FormData();
@@ -32,6 +63,65 @@ export const api = {
         return response.json();
     },
 
+    // Upload PDF as a background job (returns job_id immediately)
+    uploadPDFAsync: async (file) => {
+        const formData = new FormData();
+        formData.append('file', file);
+
+        const response = await fetch(`${API_BASE}/upload-pdf?async_mode=true`, {
+            method: 'POST',
+            body: formData,
+        });
+
+        if (!response.ok) {
+            const error = await response.json();
+            throw new Error(error.detail || 'Upload failed');
+        }
+
+        return response.json();
+    },
+
+    // Get upload job status
+    getJob: async (jobId) => {
+        const response = await fetch(`${API_BASE}/jobs/${jobId}`);
+
+        if (!response.ok) {
+            const error = await response.json();
+            throw new Error(error.detail || 'Job not found');
+        }
+
+        return response.json();
+    },
+
+    // Subscribe to upload job progress events (Server-Sent Events)
+    subscribeToJob: (jobId, { onProgress, onChunk, onComplete, onError }) => {
+        const source = new EventSource(`${API_BASE}/jobs/${jobId}/events`);
+
+        source.addEventListener('progress', (e) => onProgress && onProgress(JSON.parse(e.data)));
+        source.addEventListener('chunk', (e) => onChunk && onChunk(JSON.parse(e.data).chunk));
+        source.addEventListener('completed', (e) => {
+            source.close();
+            onComplete && onComplete(JSON.parse(e.data).job);
+        });
+        source.addEventListener('failed', (e) => {
+            source.close();
+            onError && onError(new Error(JSON.parse(e.data).error || 'Processing failed'));
+        });
+        source.onerror = () => {
+            // Connection dropped: fall back to polling the job status once
+            source.close();
+            api.getJob(jobId)
+                .then((job) => {
+                    if (job.status === 'completed') onComplete && onComplete(job);
+                    else if (job.status === 'failed') onError && onError(new Error(job.error || 'Processing failed'));
+                    else onError && onError(new Error('Lost connection to progress stream'));
+                })
+                .catch((err) => onError && onError(err));
+        };
+
+        return () => source.close();
+    },
+
     // Delete file
     deleteFile: async (fileId) => {
         const response = await fetch(`${API_BASE}/file/${fileId}`, {